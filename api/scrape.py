@@ -2,10 +2,13 @@
 """
 Red Deer Toyota Used Inventory Scraper - Enhanced Sale Price Extraction
 Now with multiple extraction strategies and detailed debugging
+
+Run directly it writes public/data/inventory.csv; deployed on Vercel, `handler`
+serves cached inventory JSON at /api/scrape.
 """
 
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, Tag
 import csv
 import time
 import re
@@ -13,14 +16,158 @@ import logging
 from datetime import datetime
 import os
 import json
+import hashlib
+import threading
+import sys
+import tracemalloc
+try:
+    import resource
+except ImportError:  # not on Windows
+    resource = None
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Price node classification (extract_prices_enhanced)
+PRICE_ATTR_RE = re.compile(r'(price|cost|amount)', re.I)
+PRICE_TEXT_RE = re.compile(r'\$?\s*([0-9]{1,3}(?:,\d{3})*)\s*(?:\$|dollars?)?')
+SALE_KEYWORDS = ('sale', 'special', 'internet', 'now', 'reduced',
+                 'discount', 'offer', 'savings', 'you save', 'clearance')
+MSRP_KEYWORDS = ('msrp', 'was', 'original', 'regular', 'list',
+                 'retail', 'before', 'strikethrough')
+DATA_PRICE_TAGS = frozenset(['span', 'div', 'p', 'strong'])
+STRIKE_TAGS = frozenset(['s', 'strike', 'del'])
+
+
+class _NoProfiler:
+    """Stand-in when profiling is off or src/script/profiling.py is not on disk (deployed function)."""
+    class _Stage:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+    _stage = _Stage()
+
+    def stage(self, name, cpu=True):
+        return self._stage
+
+    def start(self):
+        pass
+
+    def stop(self):
+        return None
+
+
+def load_profiler(modes):
+    """
+    TOYOTA_PROFILE / --profile: reuse the stage profiler from the repo checkout
+    (src/script/profiling.py) when it is there; see that module for the modes.
+    """
+    if not modes or modes.lower() == 'off':
+        return _NoProfiler()
+    script_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'script')
+    sys.path.insert(0, os.path.abspath(script_dir))
+    try:
+        from profiling import StageProfiler
+    except ImportError:
+        logger.warning("Profiling requested but src/script/profiling.py is not available")
+        return _NoProfiler()
+    profiler = StageProfiler.from_env()
+    profiler.set_modes(modes)
+    return profiler
+
+
+class _NoArtifacts:
+    """Stand-in when capture is off or src/script/debug_artifacts.py is not on disk (deployed function)."""
+    enabled = False
+
+    def begin_run(self):
+        pass
+
+    def capture(self, name, producer, failure=False):
+        return False
+
+    def end_run(self, ok, **meta):
+        pass
+
+
+def load_artifacts(mode):
+    """
+    TOYOTA_DEBUG_CAPTURE: reuse the artifact recorder from the repo checkout
+    (src/script/debug_artifacts.py) so both scrapers read the modes the same way.
+    """
+    if not mode or mode.lower() == 'off':
+        return _NoArtifacts()
+    script_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'script')
+    sys.path.insert(0, os.path.abspath(script_dir))
+    try:
+        from debug_artifacts import ArtifactRecorder
+    except ImportError:
+        logger.warning("Debug capture requested but src/script/debug_artifacts.py is not available")
+        return _NoArtifacts()
+    return ArtifactRecorder.from_env()
+
+
+def peak_rss_mb():
+    """The process's peak resident set size so far in MB, or None where getrusage is missing."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1048576.0 if sys.platform == 'darwin' else 1024.0)  # bytes on macOS, KB elsewhere
+
+
+class PeakMemory:
+    """
+    Memory report for each scrape_inventory() run, logged at the end. The process's
+    peak RSS is always reported (one getrusage call). Peak traced Python memory for
+    the run itself is opt-in (TOYOTA_MEMORY_PEAK=on), since tracing roughly doubles
+    parse CPU. Sized for memory-capped serverless functions: with pages parsed one
+    at a time the peak is about one DOM plus the extracted rows, not every page at once.
+    """
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.peak = 0
+        self.owner = False
+
+    def start(self):
+        self.peak = 0
+        if not self.enabled:
+            return
+        # If the profiler's mem mode is already tracing, share it rather than restart it
+        self.owner = not tracemalloc.is_tracing()
+        if self.owner:
+            tracemalloc.start(1)
+        else:
+            self.peak = tracemalloc.get_traced_memory()[1]
+
+    def sample(self):
+        if self.enabled and tracemalloc.is_tracing():
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+
+    def stop(self):
+        rss = peak_rss_mb()
+        if rss is not None:
+            logger.info("Peak RSS: {:.1f} MB".format(rss))
+        if not self.enabled:
+            return None
+        self.sample()
+        if self.owner and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.owner = False
+        logger.info("Peak traced memory: {:.1f} MB".format(self.peak / 1048576.0))
+        return self.peak
+
+
 class UniversalRedDeerToyotaScraper:
     def __init__(self):
-        self.base_url = "https://www.reddeertoyota.com"
-        self.target_url = "https://www.reddeertoyota.com/inventory/used/"
+        # TOYOTA_BASE_URL points the scraper elsewhere, e.g. at src/script/mock_dealer.py
+        self.base_url = os.environ.get('TOYOTA_BASE_URL', "https://www.reddeertoyota.com").rstrip('/')
+        self.target_url = self.base_url + "/inventory/used/"
         self.session = requests.Session()
         
         self.session.headers.update({
@@ -38,7 +185,12 @@ class UniversalRedDeerToyotaScraper:
         self.vehicles = []
         self.timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         self.car_makes = self._build_car_makes()
-        self.debug_mode = True
+        # Opt-in: TOYOTA_DEBUG_CAPTURE keeps page 1 on sampled or failed runs and logs price details
+        self.artifacts = load_artifacts(os.environ.get('TOYOTA_DEBUG_CAPTURE', 'off'))
+        self.debug_mode = self.artifacts.enabled
+        self._page1 = None
+        self.profiler = _NoProfiler()
+        self.memory = PeakMemory(os.environ.get('TOYOTA_MEMORY_PEAK', 'off').lower() in ('1', 'on', 'true', 'yes'))
 
     def _build_car_makes(self):
         return {
@@ -98,53 +250,69 @@ class UniversalRedDeerToyotaScraper:
             'Essential': r'\bEssential\b', '2 DOOR': r'\b2\s+DOOR\b', 'IVT': r'\bIVT\b',
         }
 
-    def fetch_all_pages(self):
-        all_soups = []
+    def iter_pages(self):
+        """
+        Yield (page_num, soup) one results page at a time. The caller parses the
+        page and decompose()s the tree before the next one is fetched, so only one
+        DOM is alive at a time.
+        """
         page_num = 1
         max_pages = 10
+        fetched = 0
         
-        while page_num <= max_pages:
-            url = "{}?page={}".format(self.target_url.rstrip('/'), page_num)
-            
-            try:
-                logger.info("Fetching page {}: {}".format(page_num, url))
-                response = self.session.get(url, timeout=30)
-                response.raise_for_status()
-                
-                soup = BeautifulSoup(response.content, 'html.parser')
-                
-                # Save first page HTML for debugging
-                if page_num == 1 and self.debug_mode:
-                    debug_file = 'debug_page1.html'
-                    with open(debug_file, 'w', encoding='utf-8') as f:
-                        f.write(soup.prettify())
-                    logger.info("Saved page 1 HTML to {}".format(debug_file))
-                
-                page_text = soup.get_text()
-                
-                has_vehicles = bool(re.search(r'\b(19[89]\d|20[0-2]\d)\b', page_text))
-                no_results = 'no vehicles found' in page_text.lower() or 'no results' in page_text.lower()
+        try:
+            while page_num <= max_pages:
+                url = "{}?page={}".format(self.target_url.rstrip('/'), page_num)
                 
-                if not has_vehicles or no_results:
-                    logger.info("Page {} has no vehicles, stopping".format(page_num))
+                try:
+                    logger.info("Fetching page {}: {}".format(page_num, url))
+                    with self.profiler.stage('fetch', cpu=False):
+                        response = self.session.get(url, timeout=30)
+                    response.raise_for_status()
+                    
+                    # Keep the first page's raw bytes until the run's outcome decides whether to save them
+                    if page_num == 1 and self.debug_mode:
+                        self._page1 = response.content
+                    
+                    with self.profiler.stage('parse'):
+                        soup = BeautifulSoup(response.content, 'html.parser')
+                        response = None  # the raw body is not needed once parsed
+                        page_text = soup.get_text()
+                    
+                    has_vehicles = bool(re.search(r'\b(19[89]\d|20[0-2]\d)\b', page_text))
+                    no_results = 'no vehicles found' in page_text.lower() or 'no results' in page_text.lower()
+                    page_text = None
+                    
+                    if not has_vehicles or no_results:
+                        logger.info("Page {} has no vehicles, stopping".format(page_num))
+                        soup.decompose()
+                        break
+                    
+                except requests.exceptions.HTTPError as e:
+                    if e.response.status_code == 404:
+                        logger.info("Page {} returned 404".format(page_num))
+                        break
+                    logger.error("HTTP error on page {}: {}".format(page_num, str(e)))
+                    break
+                except Exception as e:
+                    logger.error("Failed to fetch page {}: {}".format(page_num, str(e)))
                     break
                 
-                all_soups.append((page_num, soup))
+                fetched += 1
+                yield page_num, soup
+                soup = None
+                self.memory.sample()
                 page_num += 1
                 time.sleep(0.5)
-                
-            except requests.exceptions.HTTPError as e:
-                if e.response.status_code == 404:
-                    logger.info("Page {} returned 404".format(page_num))
-                    break
-                logger.error("HTTP error on page {}: {}".format(page_num, str(e)))
-                break
-            except Exception as e:
-                logger.error("Failed to fetch page {}: {}".format(page_num, str(e)))
-                break
-        
-        logger.info("Fetched {} pages".format(len(all_soups)))
-        return all_soups
+        finally:
+            logger.info("Fetched {} pages".format(fetched))
+
+    def end_debug_run(self, vehicles):
+        """Save page 1 if this run is sampled, or if it found no vehicles, then flush and prune."""
+        page1, self._page1 = self._page1, None
+        if page1 is not None:
+            self.artifacts.capture('page1.html', lambda: page1, failure=not vehicles)
+        self.artifacts.end_run(ok=bool(vehicles), vehicles=len(vehicles))
 
     def extract_make_and_model(self, text):
         text = re.sub(r'\s+', ' ', text.strip())
@@ -172,6 +340,37 @@ class UniversalRedDeerToyotaScraper:
                     return trim_name
         return ''
 
+    def collect_price_nodes(self, element):
+        """
+        Single pass over the descendants of a card. Returns (class_nodes, id_nodes,
+        data_nodes, ld_scripts, struck): nodes whose class / id mentions
+        price|cost|amount, span/div/p/strong nodes with data-price, JSON-LD
+        scripts, and the ids of nodes that contain an <s>, <strike> or <del>.
+        """
+        class_nodes, id_nodes, data_nodes, ld_scripts = [], [], [], []
+        struck = set()
+        for node in element.descendants:
+            if not isinstance(node, Tag):
+                continue
+            attrs = node.attrs
+            classes = attrs.get('class')
+            if classes and PRICE_ATTR_RE.search(' '.join(classes) if isinstance(classes, list) else classes):
+                class_nodes.append(node)
+            node_id = attrs.get('id')
+            if node_id and PRICE_ATTR_RE.search(node_id):
+                id_nodes.append(node)
+            name = node.name
+            if 'data-price' in attrs and name in DATA_PRICE_TAGS:
+                data_nodes.append(node)
+            elif name == 'script' and attrs.get('type') == 'application/ld+json':
+                ld_scripts.append(node)
+            elif name in STRIKE_TAGS:
+                parent = node.parent
+                while parent is not None and parent is not element and id(parent) not in struck:
+                    struck.add(id(parent))
+                    parent = parent.parent
+        return class_nodes, id_nodes, data_nodes, ld_scripts, struck
+
     def extract_prices_enhanced(self, element, vehicle_id="unknown"):
         """
         Enhanced price extraction with multiple strategies
@@ -195,9 +394,11 @@ class UniversalRedDeerToyotaScraper:
                         elif not regular_price:
                             regular_price = price
         
+        # One walk over the card collects every price-bearing node
+        class_nodes, id_nodes, data_nodes, ld_scripts, struck = self.collect_price_nodes(element)
+        
         # Strategy 2: Look for JSON-LD structured data
-        scripts = element.find_all('script', type='application/ld+json')
-        for script in scripts:
+        for script in ld_scripts:
             try:
                 data = json.loads(script.string)
                 if isinstance(data, dict):
@@ -217,60 +418,37 @@ class UniversalRedDeerToyotaScraper:
             except:
                 pass
         
-        # Strategy 3: Look for specific price classes and elements
-        price_searches = [
-            # Common class patterns for prices
-            (element.find_all(class_=re.compile(r'(price|cost|amount)', re.I)), 'class'),
-            # ID patterns
-            (element.find_all(id=re.compile(r'(price|cost|amount)', re.I)), 'id'),
-            # Common pricing element types
-            (element.find_all(['span', 'div', 'p', 'strong'], attrs={'data-price': True}), 'data-price'),
-        ]
-        
+        # Strategy 3: Price classes, ids and data-price elements (same order as separate searches)
         all_found_prices = []
+        texts = {}  # a node matching both class and id is read once
         
-        for elements, source in price_searches:
-            for el in elements:
-                el_text = el.get_text(strip=True)
-                el_classes = ' '.join(el.get('class', [])).lower()
-                el_id = (el.get('id') or '').lower()
-                parent_classes = ' '.join(el.parent.get('class', [])).lower() if el.parent else ''
+        for nodes, source in ((class_nodes, 'class'), (id_nodes, 'id'), (data_nodes, 'data-price')):
+            for el in nodes:
+                el_text = texts.get(id(el))
+                if el_text is None:
+                    el_text = texts[id(el)] = el.get_text(strip=True)
+                prices = [int(p.replace(',', '')) for p in PRICE_TEXT_RE.findall(el_text)]
+                prices = [p for p in prices if 3000 <= p <= 300000]
+                if not prices:
+                    continue
                 
-                # Extract price from text
-                price_matches = re.findall(r'\$?\s*([0-9]{1,3}(?:,\d{3})*)\s*(?:\$|dollars?)?', el_text)
+                # Determine type based on context
+                context = ' '.join((el_text, ' '.join(el.get('class', [])), el.get('id') or '',
+                                    ' '.join(el.parent.get('class', [])) if el.parent else '')).lower()
+                is_sale = any(kw in context for kw in SALE_KEYWORDS)
+                is_msrp = any(kw in context for kw in MSRP_KEYWORDS)
+                # Strikethrough styling, on the node or a <s>/<strike>/<del> inside it
+                has_strikethrough = 'line-through' in el.get('style', '') or id(el) in struck
                 
-                for price_str in price_matches:
-                    try:
-                        price = int(price_str.replace(',', ''))
-                        if 3000 <= price <= 300000:
-                            # Determine type based on context
-                            context = (el_text + ' ' + el_classes + ' ' + el_id + ' ' + parent_classes).lower()
-                            
-                            is_sale = any(kw in context for kw in [
-                                'sale', 'special', 'internet', 'now', 'reduced', 
-                                'discount', 'offer', 'savings', 'you save', 'clearance'
-                            ])
-                            
-                            is_msrp = any(kw in context for kw in [
-                                'msrp', 'was', 'original', 'regular', 'list', 
-                                'retail', 'before', 'strikethrough'
-                            ])
-                            
-                            # Check for strikethrough styling
-                            style = el.get('style', '')
-                            has_strikethrough = ('line-through' in style or 
-                                               el.find(['s', 'strike', 'del']) is not None)
-                            
-                            all_found_prices.append({
-                                'price': price,
-                                'is_sale': is_sale,
-                                'is_msrp': is_msrp or has_strikethrough,
-                                'source': source,
-                                'text': el_text[:50],
-                                'context': context[:100]
-                            })
-                    except:
-                        pass
+                for price in prices:
+                    all_found_prices.append({
+                        'price': price,
+                        'is_sale': is_sale,
+                        'is_msrp': is_msrp or has_strikethrough,
+                        'source': source,
+                        'text': el_text[:50],
+                        'context': context[:100]
+                    })
         
         # Strategy 4: Fallback - find ALL dollar amounts in text
         if not all_found_prices:
@@ -542,57 +720,72 @@ class UniversalRedDeerToyotaScraper:
         logger.info("RED DEER TOYOTA SCRAPER - ENHANCED SALE PRICE EXTRACTION")
         logger.info("=" * 80)
         
-        all_pages = self.fetch_all_pages()
-        if not all_pages:
-            logger.error("No pages fetched")
-            return []
-        
+        self.memory.start()
+        try:
+            return self.scrape_pages()
+        finally:
+            # On errors too: a warm instance must not keep tracing into the next request
+            self.memory.stop()
+
+    def scrape_pages(self):
+        """Fetch, parse and dedup every results page; scrape_inventory() brackets it with memory tracing."""
+        self.artifacts.begin_run()
         all_vehicles = []
+        pages = 0
         
-        for page_num, soup in all_pages:
+        for page_num, soup in self.iter_pages():
             logger.info("Processing page {}".format(page_num))
-            page_vehicles = self.find_vehicles(soup)
+            with self.profiler.stage('parse'):
+                page_vehicles = self.find_vehicles(soup)
+                soup.decompose()
+            pages += 1
             logger.info("Page {} found {} vehicles".format(page_num, len(page_vehicles)))
             all_vehicles.extend(page_vehicles)
         
+        if not pages:
+            self.end_debug_run([])
+            logger.error("No pages fetched")
+            return []
+        
         logger.info("Total before dedup: {}".format(len(all_vehicles)))
         
         # Deduplicate by multiple criteria
-        unique = []
-        seen = set()
-        
-        for v in all_vehicles:
-            year = v.get('year', '')
-            make = v.get('makeName', '')
-            model = v.get('model', '')
-            stock = v.get('stock_number', '')
-            mileage = v.get('mileage', '')
-            trim = v.get('trim', '')
-            price = v.get('value', '')
+        with self.profiler.stage('dedup'):
+            unique = []
+            seen = set()
             
-            # Create multiple keys to catch duplicates
-            # Priority 1: Stock number (most reliable if available)
-            if stock:
-                key = ('stock', stock)
-            # Priority 2: Year + Make + Model + Mileage
-            elif year and make and model and mileage:
-                key = ('ymm_mileage', year, make, model, mileage)
-            # Priority 3: Year + Make + Model + Trim + Price
-            elif year and make and model and trim and price:
-                key = ('ymm_trim_price', year, make, model, trim, price)
-            # Priority 4: Year + Make + Model + Price
-            elif year and make and model and price:
-                key = ('ymm_price', year, make, model, price)
-            # Fallback: Everything we have
-            else:
-                key = ('all', year, make, model, trim, mileage, price)
-            
-            if key not in seen:
-                seen.add(key)
-                unique.append(v)
-            else:
-                logger.debug("Duplicate found: {} {} {} (key: {})".format(
-                    year, make, model, key[0]))
+            for v in all_vehicles:
+                year = v.get('year', '')
+                make = v.get('makeName', '')
+                model = v.get('model', '')
+                stock = v.get('stock_number', '')
+                mileage = v.get('mileage', '')
+                trim = v.get('trim', '')
+                price = v.get('value', '')
+                
+                # Create multiple keys to catch duplicates
+                # Priority 1: Stock number (most reliable if available)
+                if stock:
+                    key = ('stock', stock)
+                # Priority 2: Year + Make + Model + Mileage
+                elif year and make and model and mileage:
+                    key = ('ymm_mileage', year, make, model, mileage)
+                # Priority 3: Year + Make + Model + Trim + Price
+                elif year and make and model and trim and price:
+                    key = ('ymm_trim_price', year, make, model, trim, price)
+                # Priority 4: Year + Make + Model + Price
+                elif year and make and model and price:
+                    key = ('ymm_price', year, make, model, price)
+                # Fallback: Everything we have
+                else:
+                    key = ('all', year, make, model, trim, mileage, price)
+                
+                if key not in seen:
+                    seen.add(key)
+                    unique.append(v)
+                else:
+                    logger.debug("Duplicate found: {} {} {} (key: {})".format(
+                        year, make, model, key[0]))
         
         self.vehicles = unique
         logger.info("FINAL: {} unique vehicles".format(len(self.vehicles)))
@@ -603,6 +796,7 @@ class UniversalRedDeerToyotaScraper:
         logger.info("Vehicles with sale prices: {} ({:.1f}%)".format(
             sale_count, 100.0 * sale_count / len(self.vehicles) if self.vehicles else 0))
         
+        self.end_debug_run(self.vehicles)
         return self.vehicles
 
     def save_to_csv(self, filename):
@@ -670,8 +864,197 @@ class UniversalRedDeerToyotaScraper:
                 v.get('sale_value', '')[:11],
                 v.get('stock_number', '')[:9]))
 
-def main():
+# -- Serverless endpoint ------------------------------------------------------
+#
+# Vercel serves the `handler` class below at /api/scrape. Inventory JSON is kept
+# in memory and in a file under /tmp (the only writable place in a function, and
+# it survives warm invocations):
+#
+#   TOYOTA_CACHE_TTL    seconds a result is served as fresh (default 900)
+#   TOYOTA_CACHE_STALE  seconds past the TTL it is still served while one background
+#                       refresh runs (default 86400); older than that, requests wait
+#   TOYOTA_CACHE_WAIT   seconds a request waits for a refresh when nothing usable is
+#                       cached (default 55)
+#   TOYOTA_CACHE_PATH   cache file (default /tmp/red-deer-toyota/inventory.json)
+#
+# Concurrent requests share one refresh. Responses carry an ETag and
+# If-None-Match gets a 304; ?refresh=1 revalidates in the background.
+
+CACHE_FIELDS = ['makeName', 'year', 'model', 'sub-model', 'trim', 'mileage',
+                'value', 'sale_value', 'stock_number', 'engine']
+
+
+def scrape_vehicles():
+    return UniversalRedDeerToyotaScraper().scrape_inventory()
+
+
+class InventoryCache:
+    def __init__(self, path, ttl=900, stale=86400, wait=55, fetch=scrape_vehicles):
+        self.path = path
+        self.ttl = ttl
+        self.stale = stale
+        self.wait = wait
+        self.fetch = fetch
+        self.entry = None  # {'body': bytes, 'etag': str, 'fetched_at': epoch seconds}
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._inflight = None  # threading.Event of the running refresh
+        self._loaded = False
+
+    @classmethod
+    def from_env(cls):
+        return cls(path=os.environ.get('TOYOTA_CACHE_PATH', '/tmp/red-deer-toyota/inventory.json'),
+                   ttl=float(os.environ.get('TOYOTA_CACHE_TTL', '900')),
+                   stale=float(os.environ.get('TOYOTA_CACHE_STALE', '86400')),
+                   wait=float(os.environ.get('TOYOTA_CACHE_WAIT', '55')))
+
+    @staticmethod
+    def make_entry(body, fetched_at):
+        return {'body': body, 'etag': '"{}"'.format(hashlib.sha256(body).hexdigest()[:32]),
+                'fetched_at': fetched_at}
+
+    def _load(self):
+        """First use in a fresh instance: pick up what an earlier invocation left on disk."""
+        self._loaded = True
+        try:
+            with open(self.path, 'rb') as f:
+                body = f.read()
+            json.loads(body.decode('utf-8'))
+            self.entry = self.make_entry(body, os.path.getmtime(self.path))
+            logger.info("Inventory cache loaded from {}".format(self.path))
+        except (OSError, ValueError):
+            pass
+
+    def _store(self, vehicles):
+        fetched_at = time.time()
+        body = json.dumps({
+            'ok': True, 'success': True, 'count': len(vehicles),
+            'scraped_at': datetime.fromtimestamp(fetched_at).isoformat(timespec='seconds'),
+            'vehicles': [{k: v.get(k, '') for k in CACHE_FIELDS} for v in vehicles],
+        }, separators=(',', ':')).encode('utf-8')
+        entry = self.make_entry(body, fetched_at)
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = self.path + '.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(body)
+            os.replace(tmp, self.path)
+            os.utime(self.path, (fetched_at, fetched_at))
+        except OSError as e:
+            logger.warning("Inventory cache not written to disk: {}".format(e))
+        self.entry = entry
+
+    def refresh(self):
+        """Start a background refresh unless one is running; returns its done event."""
+        with self._lock:
+            if self._inflight is None:
+                self._inflight = threading.Event()
+                threading.Thread(target=self._refresh, args=(self._inflight,),
+                                 name='cache-refresh', daemon=True).start()
+            return self._inflight
+
+    def _refresh(self, done):
+        started = time.time()
+        try:
+            vehicles = self.fetch()
+            if vehicles:
+                self._store(vehicles)
+                self.last_error = None
+                logger.info("Inventory cache refreshed: {} vehicles in {:.1f}s".format(
+                    len(vehicles), time.time() - started))
+            else:
+                # Keep serving the previous inventory rather than an empty one
+                self.last_error = "no vehicles found"
+                logger.warning("Refresh found no vehicles, keeping cached inventory")
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error("Inventory refresh failed: {}".format(e))
+        finally:
+            with self._lock:
+                self._inflight = None
+            done.set()
+
+    def get(self, revalidate=False):
+        """Returns (entry or None, state) with state in hit / stale / miss."""
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            entry = self.entry
+        age = time.time() - entry['fetched_at'] if entry else None
+        if entry and age < self.ttl and not revalidate:
+            return entry, 'hit'
+        if entry and age < self.ttl + self.stale:
+            # Answer now; one shared refresh runs in the background. If Vercel freezes
+            # the instance after the response, the thread picks up again on its next
+            # invocation, and the next request after it finishes gets the new entry.
+            self.refresh()
+            return entry, 'stale'
+        # Cold miss (or too old to serve): wait for the shared scrape, bounded by
+        # TOYOTA_CACHE_WAIT, which stays under the function's maxDuration
+        done = self.refresh()
+        done.wait(self.wait)
+        return self.entry or entry, 'miss'
+
+
+CACHE = InventoryCache.from_env()
+
+
+class handler(BaseHTTPRequestHandler):
+    """GET or POST /api/scrape -> inventory JSON ({ok, success, count, scraped_at, vehicles})."""
+
+    def do_GET(self):
+        query = parse_qs(urlsplit(self.path).query)
+        revalidate = query.get('refresh', ['0'])[0] not in ('', '0', 'false')
+        entry, state = CACHE.get(revalidate)
+        if entry is None:
+            body = json.dumps({'ok': False, 'success': False,
+                               'error': CACHE.last_error or 'Inventory is still loading'}).encode('utf-8')
+            self.send_response(503 if CACHE.last_error is None else 502)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Retry-After', '30')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('Cache-Control', 'no-store')
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        not_modified = self._etag_matches(entry['etag'])
+        self.send_response(304 if not_modified else 200)
+        self.send_header('ETag', entry['etag'])
+        self.send_header('Cache-Control', 'public, max-age=0, s-maxage={}, stale-while-revalidate={}'.format(
+            int(CACHE.ttl), int(CACHE.stale)))
+        self.send_header('Last-Modified', formatdate(entry['fetched_at'], usegmt=True))
+        self.send_header('X-Cache', state)
+        if not_modified:
+            self.end_headers()
+            return
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(entry['body'])))
+        self.end_headers()
+        self.wfile.write(entry['body'])
+
+    do_POST = do_GET
+
+    def _etag_matches(self, etag):
+        header = self.headers.get('If-None-Match')
+        if not header:
+            return False
+        tags = [t.strip() for t in header.split(',')]
+        return '*' in tags or etag in tags or 'W/' + etag in tags
+
+    def log_message(self, fmt, *args):
+        logger.info("HTTP %s - %s", self.address_string(), fmt % args)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
     scraper = UniversalRedDeerToyotaScraper()
+    modes = os.environ.get('TOYOTA_PROFILE', 'off')
+    if '--profile' in argv:
+        i = argv.index('--profile')
+        modes = argv[i + 1] if i + 1 < len(argv) and not argv[i + 1].startswith('-') else 'cpu,mem'
+    scraper.profiler = load_profiler(modes)
+    scraper.profiler.start()
     
     try:
         vehicles = scraper.scrape_inventory()
@@ -684,9 +1067,9 @@ def main():
         csv_path = os.path.join(public_data_dir, 'inventory.csv')
         
         if vehicles:
-            scraper.save_to_csv(csv_path)
+            with scraper.profiler.stage('write'):
+                scraper.save_to_csv(csv_path)
             print("\nCSV created: {}".format(csv_path))
-            print("\nDEBUG: Check 'debug_page1.html' to see the HTML structure")
         else:
             print("\nNo CSV created")
             if os.path.exists(csv_path):
@@ -699,6 +1082,8 @@ def main():
         import traceback
         traceback.print_exc()
         return 1
+    finally:
+        scraper.profiler.stop()
 
 if __name__ == "__main__":
     exit(main())
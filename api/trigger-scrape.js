@@ -5,6 +5,11 @@
 // - GH_OWNER (optional, default: smitster1403)
 // - GH_REPO (optional, default: red-deer-toyota)
 // - GH_WORKFLOW_FILE (optional, default: .github/workflows/daily-scrape.yml)
+// - SCRAPER_SERVICE_URL (optional): base URL of a running warm scraper service
+//   (src/script/scraper_service.py); when set, refreshes go there instead of GitHub.
+//   The service commits and pushes public/data like the workflow does (SCRAPER_PUBLISH=git),
+//   so the site redeploys the same way
+// - SCRAPER_SERVICE_SECRET (optional): forwarded as x-action-secret to the service
 
 module.exports = async function handler(req, res) {
   try {
@@ -19,6 +24,18 @@ module.exports = async function handler(req, res) {
       return res.status(401).json({ error: 'Unauthorized' });
     }
 
+    const serviceUrl = process.env.SCRAPER_SERVICE_URL;
+    if (serviceUrl) {
+      const svcRes = await fetch(`${serviceUrl.replace(/\/$/, '')}/trigger`, {
+        method: 'POST',
+        headers: process.env.SCRAPER_SERVICE_SECRET
+          ? { 'x-action-secret': process.env.SCRAPER_SERVICE_SECRET }
+          : {},
+      });
+      const body = await svcRes.json().catch(() => ({}));
+      return res.status(svcRes.status).json(body);
+    }
+
     const token = process.env.GITHUB_TOKEN;
     if (!token) {
       return res.status(500).json({ error: 'Missing GITHUB_TOKEN env' });
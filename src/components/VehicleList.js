@@ -12,8 +12,37 @@ const VehicleList = () => {
   const [searchQuery, setSearchQuery] = useState('');
   const [selectedBrand, setSelectedBrand] = useState('all');
 
-  // Function to load from CSV fallback
-  const loadFromCSV = async () => {
+  // Function to load the precomputed JSON index (hashed file is cacheable forever;
+  // only the tiny manifest is revalidated)
+  const loadFromIndex = async () => {
+    const base = `${process.env.PUBLIC_URL || ''}/data`;
+    const manifestRes = await fetch(`${base}/inventory.manifest.json`, { cache: 'no-cache' });
+    if (!manifestRes.ok) {
+      throw new Error(`Index manifest not found (${manifestRes.status})`);
+    }
+    const manifest = await manifestRes.json();
+    const indexRes = await fetch(`${base}/${manifest.index}`);
+    if (!indexRes.ok) {
+      throw new Error(`Index not found (${indexRes.status})`);
+    }
+    const { fields, rows } = await indexRes.json();
+    return rows.map((row) => {
+      const vehicle = {};
+      fields.forEach((field, i) => {
+        vehicle[field] = row[i] === null || row[i] === undefined ? '' : String(row[i]);
+      });
+      return vehicle;
+    });
+  };
+
+  // Function to load the JSON index, falling back to the CSV
+  const loadInventory = async () => {
+    try {
+      return await loadFromIndex();
+    } catch (indexError) {
+      console.warn('JSON index unavailable, parsing CSV:', indexError.message);
+    }
+
     const url = `${process.env.PUBLIC_URL || ''}/data/inventory.csv`;
     const response = await fetch(url, { cache: 'no-store' });
     
@@ -47,8 +76,7 @@ const VehicleList = () => {
     const response = await fetch('/api/scrape', {
       method: 'GET',
       headers: {
-        'Accept': 'application/json',
-        'Cache-Control': 'no-cache'
+        'Accept': 'application/json'
       }
     });
     
@@ -100,14 +128,14 @@ const VehicleList = () => {
           } catch (apiError) {
             console.warn('API failed, trying CSV fallback:', apiError.message);
             try {
-              vehicles = await loadFromCSV();
+              vehicles = await loadInventory();
               source = 'CSV (API failed)';
             } catch (csvError) {
               throw new Error(`Both API and CSV failed. API: ${apiError.message}, CSV: ${csvError.message}`);
             }
           }
         } else {
-          vehicles = await loadFromCSV();
+          vehicles = await loadInventory();
           source = 'CSV';
         }
         
@@ -168,6 +196,15 @@ const VehicleList = () => {
     return ['all', ...Array.from(brandSet).sort()];
   }, [vehicles]);
 
+  // Per-brand counts for the filter chips, computed in one pass
+  const brandCounts = useMemo(() => {
+    const counts = {};
+    vehicles.forEach((v) => {
+      if (v.makeName) counts[v.makeName] = (counts[v.makeName] || 0) + 1;
+    });
+    return counts;
+  }, [vehicles]);
+
   // Filter and search vehicles
   const filteredVehicles = useMemo(() => {
     return vehicles.filter(vehicle => {
@@ -339,7 +376,7 @@ const VehicleList = () => {
                     onClick={() => setSelectedBrand(brand)}
                   >
                     {brand === 'all' ? 'All Brands' : brand}
-                    {brand !== 'all' && ` (${vehicles.filter(v => v.makeName === brand).length})`}
+                    {brand !== 'all' && ` (${brandCounts[brand] || 0})`}
                   </button>
                 ))}
               </div>
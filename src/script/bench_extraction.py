@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the extraction hot paths.
+
+Covers toyota_scrapper (extract_make_model, extract_trim, extract_prices_from_text,
+parse_html_element, find_vehicles_in_html with and without a warm parse cache,
+dedup, save_csv) and the matching
+methods of api/scrape.py, on synthetic pages of 10 to 10,000 cards plus any
+recorded pages (*.html / *.html.gz, e.g. debug_artifacts captures or
+debug_page1.html.gz) found under --fixtures.
+
+Each case reports the best of --repeat timings, throughput (cards/s, pages/s or
+calls/s) and peak traced memory (a separate tracemalloc pass, so tracing does
+not skew the timings). Results are written as JSON; with --baseline, any case
+that got slower by more than --threshold is flagged and the exit code is 1.
+
+  python3 src/script/bench_extraction.py --out bench.json
+  python3 src/script/bench_extraction.py --quick --baseline bench.json
+"""
+
+import os, sys, gc, glob, gzip, json, time, shutil, logging, platform, argparse, tempfile, subprocess, tracemalloc
+import importlib.util
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, '..', '..'))
+sys.path.insert(0, SCRIPT_DIR)
+
+import toyota_scrapper as scraper
+import parse_cache
+from synthetic_inventory import synthetic_page
+from vehicle_record import Vehicle
+from bs4 import BeautifulSoup
+
+SIZES = [10, 100, 1000, 10000]
+QUICK_SIZES = [10, 100, 1000]
+
+
+def load_api_scraper():
+    """api/scrape.py is a standalone serverless file, not a package — load it by path."""
+    path = os.path.join(PROJECT_ROOT, 'api', 'scrape.py')
+    spec = importlib.util.spec_from_file_location('api_scrape', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.UniversalRedDeerToyotaScraper()
+
+
+def best_time(fn, repeat, min_time=0.2):
+    """Best wall time of one fn() call over `repeat` rounds (calls are looped to reach min_time)."""
+    fn()  # warm caches (regex compile, imports)
+    loops, elapsed = 1, 0.0
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or loops >= 1 << 20:
+            break
+        loops *= 2 if elapsed == 0 else max(2, min(10, int(min_time / elapsed) + 1))
+    best = elapsed / loops
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        best = min(best, (time.perf_counter() - start) / loops)
+    return best
+
+
+def peak_memory_kb(fn):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        return round(tracemalloc.get_traced_memory()[1] / 1024.0, 1)
+    finally:
+        tracemalloc.stop()
+
+
+class Bench:
+    def __init__(self, repeat, only=None, memory=True):
+        self.repeat = repeat
+        self.only = only
+        self.memory = memory
+        self.results = {}
+
+    def case(self, name, fn, units, unit):
+        """units = work items per fn() call (cards, pages or calls)."""
+        if self.only and self.only not in name:
+            return
+        seconds = best_time(fn, self.repeat)
+        result = {'seconds': seconds, 'unit': unit, 'units': units,
+                  'per_s': round(units / seconds, 1) if seconds else None}
+        if self.memory:
+            result['peak_kb'] = peak_memory_kb(fn)
+        self.results[name] = result
+        print("{:<48} {:>12.3f} ms {:>14,.0f} {}/s {:>12}".format(
+            name, seconds * 1000, result['per_s'] or 0, unit,
+            '{:,.0f} KB'.format(result['peak_kb']) if 'peak_kb' in result else ''))
+
+
+def card_texts(soup):
+    return [el.get_text(separator=' ', strip=True) for el in soup.select('.vehicle-card')]
+
+
+def load_fixtures(paths):
+    pages = []
+    for p in paths:
+        files = [p] if os.path.isfile(p) else sorted(
+            glob.glob(os.path.join(p, '**', '*.html'), recursive=True)
+            + glob.glob(os.path.join(p, '**', '*.html.gz'), recursive=True))
+        for f in files:
+            opener = gzip.open if f.endswith('.gz') else open
+            with opener(f, 'rb') as fh:
+                pages.append((os.path.relpath(f), fh.read().decode('utf-8', 'replace')))
+    return pages
+
+
+def run(sizes, fixtures, repeat, only=None, memory=True):
+    logging.disable(logging.INFO)  # the per-vehicle log lines would dominate the timings
+    bench = Bench(repeat, only, memory)
+    api = load_api_scraper()
+    tmp = tempfile.mkdtemp(prefix='bench-')
+    live_cache = scraper.PARSE_CACHE
+    # Parsing cases measure the parsers; the cache gets cases of its own below
+    scraper.PARSE_CACHE = parse_cache.ParseCache(None)
+    try:
+        # Per-call helpers on the texts of a 100-card page
+        html, _ = synthetic_page(100)
+        soup = BeautifulSoup(html, 'html.parser')
+        texts = card_texts(soup)
+        elements = soup.select('.vehicle-card')
+        n = len(texts)
+        bench.case('script.extract_make_model', lambda: [scraper.extract_make_model(t) for t in texts], n, 'calls')
+        bench.case('script.extract_trim', lambda: [scraper.extract_trim(t, 'RAV4') for t in texts], n, 'calls')
+        bench.case('script.extract_prices_from_text', lambda: [scraper.extract_prices_from_text(t) for t in texts], n, 'calls')
+        bench.case('script.parse_html_element', lambda: [scraper.parse_html_element(e, i) for i, e in enumerate(elements)], n, 'cards')
+        bench.case('api.extract_make_and_model', lambda: [api.extract_make_and_model(t) for t in texts], n, 'calls')
+        bench.case('api.extract_trim', lambda: [api.extract_trim(t, 'RAV4') for t in texts], n, 'calls')
+        bench.case('api.extract_prices_enhanced', lambda: [api.extract_prices_enhanced(e) for e in elements], n, 'calls')
+        bench.case('api.extract_vehicle_data', lambda: [api.extract_vehicle_data(e, i) for i, e in enumerate(elements)], n, 'cards')
+
+        for size in sizes:
+            html, vehicles = synthetic_page(size)
+            bench.case('script.find_vehicles_in_html[{}]'.format(size),
+                       lambda: scraper.find_vehicles_in_html(html), size, 'cards')
+            bench.case('api.find_vehicles[{}]'.format(size),
+                       lambda: api.find_vehicles(BeautifulSoup(html, 'html.parser')), size, 'cards')
+            # Same page again (page hit), and a changed page around unchanged cards (card hits)
+            scraper.PARSE_CACHE = parse_cache.ParseCache(os.path.join(tmp, 'pages-{}.sqlite'.format(size)),
+                                                         scraper.PARSER_VERSION)
+            bench.case('script.find_vehicles_in_html.page_cached[{}]'.format(size),
+                       lambda: scraper.find_vehicles_in_html(html), size, 'cards')
+            scraper.PARSE_CACHE = parse_cache.ParseCache(os.path.join(tmp, 'cards-{}.sqlite'.format(size)),
+                                                         scraper.PARSER_VERSION, levels=('card',))
+            bench.case('script.find_vehicles_in_html.cards_cached[{}]'.format(size),
+                       lambda: scraper.find_vehicles_in_html(html), size, 'cards')
+            scraper.PARSE_CACHE = parse_cache.ParseCache(None)
+            # Every card seen twice (two strategies), half of the copies missing their stock number
+            records = [Vehicle.from_dict(v) for v in vehicles]
+            dupes = records + [Vehicle.from_dict(dict(v, stock_number='')) if i % 2 else v.copy()
+                               for i, v in enumerate(records)]
+            bench.case('script.dedup[{}]'.format(size), lambda: scraper.dedup(dupes), len(dupes), 'cards')
+            out = os.path.join(tmp, str(size), 'inventory.csv')
+
+            def save():
+                shutil.rmtree(os.path.dirname(out), ignore_errors=True)
+                scraper.save_csv(vehicles, out)
+            bench.case('script.save_csv[{}]'.format(size), save, size, 'cards')
+
+            def api_save():
+                api.vehicles = vehicles
+                api.save_to_csv(os.path.join(tmp, str(size), 'api.csv'))
+            bench.case('api.save_to_csv[{}]'.format(size), api_save, size, 'cards')
+
+        for name, page_html in fixtures:
+            bench.case('fixture.script[{}]'.format(name), lambda: scraper.find_vehicles_in_html(page_html), 1, 'pages')
+            bench.case('fixture.api[{}]'.format(name),
+                       lambda: api.find_vehicles(BeautifulSoup(page_html, 'html.parser')), 1, 'pages')
+    finally:
+        scraper.PARSE_CACHE = live_cache
+        shutil.rmtree(tmp, ignore_errors=True)
+        logging.disable(logging.NOTSET)
+    return bench.results
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return ''
+
+
+def compare(results, baseline, threshold):
+    """Returns [(name, old_s, new_s, ratio)] for cases slower than baseline by more than threshold."""
+    regressions = []
+    for name, old in baseline.get('results', {}).items():
+        new = results.get(name)
+        if not new or not old.get('seconds'):
+            continue
+        ratio = new['seconds'] / old['seconds']
+        if ratio > 1 + threshold:
+            regressions.append((name, old['seconds'], new['seconds'], ratio))
+    return regressions
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument('--sizes', help='comma-separated card counts (default 10,100,1000,10000)')
+    ap.add_argument('--quick', action='store_true', help='sizes up to 1000, 3 repeats')
+    ap.add_argument('--repeat', type=int, default=5)
+    ap.add_argument('--fixtures', action='append', default=[],
+                    help='recorded page file or directory (repeatable; default ./debug_artifacts if present)')
+    ap.add_argument('--only', help='run only cases whose name contains this')
+    ap.add_argument('--no-memory', action='store_true', help='skip the tracemalloc pass')
+    ap.add_argument('--out', help='write results JSON here (default bench_results/<time>.json)')
+    ap.add_argument('--baseline', help='results JSON to compare against')
+    ap.add_argument('--threshold', type=float, default=0.15, help='slowdown ratio flagged as regression')
+    args = ap.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(',')] if args.sizes else (QUICK_SIZES if args.quick else SIZES)
+    repeat = 3 if args.quick and args.repeat == 5 else args.repeat
+    fixture_paths = args.fixtures or [p for p in ['debug_artifacts', 'debug_page1.html.gz'] if os.path.exists(p)]
+    fixtures = load_fixtures(fixture_paths)
+
+    results = run(sizes, fixtures, repeat, args.only, memory=not args.no_memory)
+    record = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'sizes': sizes, 'repeat': repeat, 'fixtures': [name for name, _ in fixtures],
+        },
+        'results': results,
+    }
+    out = args.out or os.path.join('bench_results', time.strftime('%Y%m%d-%H%M%S') + '.json')
+    if os.path.dirname(out):
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(record, f, indent=2, sort_keys=True)
+    print("\nResults: {}".format(out))
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for name, old, new, ratio in regressions:
+            print("REGRESSION {:<44} {:.3f} ms -> {:.3f} ms ({:+.0%})".format(
+                name, old * 1000, new * 1000, ratio - 1))
+        if regressions:
+            return 1
+        print("No regressions beyond {:.0%} against {}".format(args.threshold, args.baseline))
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Persistent, resumable crawl frontier (SQLite).
+
+A crawl is one pass over a dealer. Its work is a set of (strategy, page) tasks
+with a status, an attempt counter and a lease:
+
+  pending -> leased -> done
+                    -> pending   (failed, attempts left)  -> failed
+  pending -> skipped            (past the last non-empty page)
+
+Workers claim the lowest open task in a single IMMEDIATE transaction, so any
+number of threads or processes sharing the file (WAL mode; a network share
+needs working POSIX locks) never get the same task. A worker that dies simply
+lets its lease expire and the task becomes claimable again. Each done task
+keeps its vehicles as JSON, so an interrupted crawl resumes at the first
+unfinished page and still returns the whole inventory.
+
+A crawl stays open until every task is settled; an open crawl older than
+TOYOTA_FRONTIER_MAX_AGE hours is abandoned rather than resumed, so stale
+pages are never mixed into a fresh run.
+
+  python3 src/script/crawl_frontier.py status [dealer]
+  python3 src/script/crawl_frontier.py abandon dealer
+
+TOYOTA_FRONTIER_DB sets the database path ("off" disables the frontier).
+"""
+
+import os, sys, json, time, socket, sqlite3, logging, threading
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB = os.path.join(os.path.expanduser("~"), ".local", "share", "red-deer-toyota",
+                          "crawl_frontier.sqlite")
+FRONTIER_DB = os.environ.get("TOYOTA_FRONTIER_DB", DEFAULT_DB)
+MAX_AGE_S = float(os.environ.get("TOYOTA_FRONTIER_MAX_AGE", "6")) * 3600
+LEASE_S = float(os.environ.get("TOYOTA_FRONTIER_LEASE", "180"))
+MAX_ATTEMPTS = int(os.environ.get("TOYOTA_FRONTIER_MAX_ATTEMPTS", "3"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS crawls (
+    id          INTEGER PRIMARY KEY,
+    dealer      TEXT NOT NULL,
+    status      TEXT NOT NULL DEFAULT 'open',
+    started_at  REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS crawls_dealer_status ON crawls (dealer, status);
+
+CREATE TABLE IF NOT EXISTS tasks (
+    crawl_id      INTEGER NOT NULL REFERENCES crawls(id),
+    strategy      TEXT NOT NULL,
+    page          INTEGER NOT NULL,
+    status        TEXT NOT NULL DEFAULT 'pending',
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    lease_owner   TEXT,
+    lease_expires REAL,
+    vehicles      TEXT,
+    error         TEXT,
+    updated_at    REAL,
+    PRIMARY KEY (crawl_id, strategy, page)
+);
+CREATE INDEX IF NOT EXISTS tasks_claim ON tasks (crawl_id, strategy, status, page);
+"""
+
+Task = namedtuple('Task', 'crawl_id strategy page attempts owner')
+
+
+def enabled():
+    return FRONTIER_DB.lower() != 'off'
+
+
+def worker_id():
+    return "{}:{}:{}".format(socket.gethostname(), os.getpid(), threading.get_ident())
+
+
+def connect(path=None):
+    path = path or FRONTIER_DB
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Autocommit; writers take the lock explicitly with BEGIN IMMEDIATE
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+class _Tx:
+    """BEGIN IMMEDIATE ... COMMIT on a fresh connection (rolled back on error)."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        self.conn = connect(self.path)
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.conn.close()
+
+
+def open_crawl(dealer, seed=None, path=None, max_age_s=None):
+    """
+    Resume the dealer's open crawl, or start a new one seeded with
+    {strategy: [pages]}. Concurrent callers get the same crawl.
+    """
+    path = path or FRONTIER_DB
+    max_age_s = MAX_AGE_S if max_age_s is None else max_age_s
+    now = time.time()
+    with _Tx(path) as conn:
+        row = conn.execute("SELECT id, started_at FROM crawls WHERE dealer = ? AND status = 'open'"
+                           " ORDER BY id DESC LIMIT 1", (dealer,)).fetchone()
+        if row and now - row[1] > max_age_s:
+            conn.execute("UPDATE crawls SET status = 'abandoned', finished_at = ? WHERE id = ?", (now, row[0]))
+            logger.info("Frontier: abandoned stale crawl {} for {}".format(row[0], dealer))
+            row = None
+        if row:
+            crawl_id, resumed = row[0], True
+        else:
+            crawl_id = conn.execute("INSERT INTO crawls (dealer, started_at) VALUES (?, ?)",
+                                    (dealer, now)).lastrowid
+            resumed = False
+        for strategy, pages in (seed or {}).items():
+            conn.executemany("INSERT OR IGNORE INTO tasks (crawl_id, strategy, page, updated_at)"
+                             " VALUES (?, ?, ?, ?)", [(crawl_id, strategy, p, now) for p in pages])
+    crawl = Crawl(crawl_id, dealer, path)
+    if resumed:
+        logger.info("Frontier: resuming crawl {} for {} ({})".format(crawl_id, dealer, crawl.summary()))
+    return crawl
+
+
+class Crawl:
+    def __init__(self, crawl_id, dealer, path=None):
+        self.id = crawl_id
+        self.dealer = dealer
+        self.path = path or FRONTIER_DB
+
+    def claim(self, strategy, owner=None, lease_s=None):
+        """Atomically lease the lowest claimable page of strategy. Returns a Task or None."""
+        owner = owner or worker_id()
+        now = time.time()
+        with _Tx(self.path) as conn:
+            row = conn.execute(
+                "SELECT page, attempts FROM tasks WHERE crawl_id = ? AND strategy = ? AND attempts < ?"
+                " AND (status = 'pending' OR (status = 'leased' AND lease_expires < ?))"
+                " ORDER BY page LIMIT 1",
+                (self.id, strategy, MAX_ATTEMPTS, now)).fetchone()
+            if row is None:
+                return None
+            page, attempts = row
+            conn.execute(
+                "UPDATE tasks SET status = 'leased', attempts = attempts + 1, lease_owner = ?,"
+                " lease_expires = ?, updated_at = ? WHERE crawl_id = ? AND strategy = ? AND page = ?",
+                (owner, now + (LEASE_S if lease_s is None else lease_s), now, self.id, strategy, page))
+        return Task(self.id, strategy, page, attempts + 1, owner)
+
+    def _settle(self, task, sql, args):
+        """Apply an update only while task.owner still holds the lease. Returns whether it did."""
+        with _Tx(self.path) as conn:
+            cur = conn.execute(
+                sql + " WHERE crawl_id = ? AND strategy = ? AND page = ? AND lease_owner = ?"
+                " AND status = 'leased'",
+                tuple(args) + (self.id, task.strategy, task.page, task.owner))
+            if cur.rowcount == 0:
+                logger.warning("Frontier: lease on {} page {} was lost".format(task.strategy, task.page))
+            return cur.rowcount > 0
+
+    def complete(self, task, vehicles):
+        return self._settle(task, "UPDATE tasks SET status = 'done', vehicles = ?, error = NULL,"
+                            " lease_owner = NULL, lease_expires = NULL, updated_at = ?",
+                            (json.dumps(vehicles, default=dict), time.time()))
+
+    def fail(self, task, error):
+        """Return the task to the queue, or mark it failed once its attempts are used up."""
+        status = 'failed' if task.attempts >= MAX_ATTEMPTS else 'pending'
+        return self._settle(task, "UPDATE tasks SET status = ?, error = ?, lease_owner = NULL,"
+                            " lease_expires = NULL, updated_at = ?",
+                            (status, str(error)[:500], time.time()))
+
+    def release(self, task):
+        """Give the task back without spending an attempt (e.g. the run was cancelled)."""
+        return self._settle(task, "UPDATE tasks SET status = 'pending', attempts = attempts - 1,"
+                            " lease_owner = NULL, lease_expires = NULL, updated_at = ?",
+                            (time.time(),))
+
+    def record(self, strategy, page, vehicles):
+        """Store a result that was produced outside a lease (e.g. a one-shot strategy)."""
+        with _Tx(self.path) as conn:
+            conn.execute(
+                "INSERT INTO tasks (crawl_id, strategy, page, status, attempts, vehicles, updated_at)"
+                " VALUES (?, ?, ?, 'done', 1, ?, ?) ON CONFLICT (crawl_id, strategy, page) DO UPDATE SET"
+                " status = 'done', vehicles = excluded.vehicles, updated_at = excluded.updated_at",
+                (self.id, strategy, page, json.dumps(vehicles, default=dict), time.time()))
+
+    def skip_after(self, strategy, page):
+        """The listing ends at page: drop the pending pages after it."""
+        with _Tx(self.path) as conn:
+            conn.execute("UPDATE tasks SET status = 'skipped', updated_at = ? WHERE crawl_id = ?"
+                         " AND strategy = ? AND page > ? AND status = 'pending'",
+                         (time.time(), self.id, strategy, page))
+
+    def vehicles(self, strategy=None):
+        """All vehicles from done tasks, in page order."""
+        conn = connect(self.path)
+        try:
+            sql = "SELECT vehicles FROM tasks WHERE crawl_id = ? AND status = 'done'"
+            args = [self.id]
+            if strategy:
+                sql += " AND strategy = ?"
+                args.append(strategy)
+            out = []
+            for (data,) in conn.execute(sql + " ORDER BY strategy, page", args):
+                out.extend(json.loads(data or '[]'))
+            return out
+        finally:
+            conn.close()
+
+    def counts(self, strategy=None):
+        """{status: n}; expired leases count as pending, or failed once out of attempts."""
+        conn = connect(self.path)
+        try:
+            sql = ("SELECT CASE WHEN status = 'leased' AND lease_expires < ? THEN"
+                   " CASE WHEN attempts < ? THEN 'pending' ELSE 'failed' END"
+                   " WHEN status = 'pending' AND attempts >= ? THEN 'failed'"
+                   " ELSE status END, COUNT(*) FROM tasks WHERE crawl_id = ?")
+            args = [time.time(), MAX_ATTEMPTS, MAX_ATTEMPTS, self.id]
+            if strategy:
+                sql += " AND strategy = ?"
+                args.append(strategy)
+            return dict(conn.execute(sql + " GROUP BY 1", args).fetchall())
+        finally:
+            conn.close()
+
+    def leased(self, strategy=None):
+        """Number of live leases held by any worker."""
+        return self.counts(strategy).get('leased', 0)
+
+    def is_settled(self, strategy=None):
+        counts = self.counts(strategy)
+        return not counts.get('pending') and not counts.get('leased')
+
+    def summary(self):
+        counts = self.counts()
+        return ", ".join("{} {}".format(n, s) for s, n in sorted(counts.items())) or "no tasks"
+
+    def finish(self, status='done'):
+        with _Tx(self.path) as conn:
+            conn.execute("UPDATE crawls SET status = ?, finished_at = ? WHERE id = ? AND status = 'open'",
+                         (status, time.time(), self.id))
+        logger.info("Frontier: crawl {} for {} {} ({})".format(self.id, self.dealer, status, self.summary()))
+
+    def tasks(self, strategy, cancelled=None, poll_s=2.0):
+        """
+        Yield claimed tasks until the strategy is settled. While other workers hold
+        the only open tasks, wait for them: their leases either complete or expire
+        and come back here.
+        """
+        while not (cancelled and cancelled()):
+            task = self.claim(strategy)
+            if task is not None:
+                yield task
+                continue
+            if not self.leased(strategy):
+                return
+            time.sleep(poll_s)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in ('status', 'abandon') or (argv[0] == 'abandon' and len(argv) < 2):
+        print(__doc__)
+        return 1
+    if argv[0] == 'abandon':
+        with _Tx(FRONTIER_DB) as conn:
+            n = conn.execute("UPDATE crawls SET status = 'abandoned', finished_at = ?"
+                             " WHERE dealer = ? AND status = 'open'", (time.time(), argv[1])).rowcount
+        print("{} open crawl(s) abandoned".format(n))
+        return 0
+    conn = connect()
+    try:
+        sql = "SELECT id, dealer, status, started_at FROM crawls"
+        args = []
+        if len(argv) > 1:
+            sql += " WHERE dealer = ?"
+            args.append(argv[1])
+        rows = conn.execute(sql + " ORDER BY id DESC LIMIT 20", args).fetchall()
+    finally:
+        conn.close()
+    for crawl_id, dealer, status, started in rows:
+        print("{:>5} {:<20} {:<10} {}  {}".format(
+            crawl_id, dealer[:19], status, time.strftime('%Y-%m-%d %H:%M', time.localtime(started)),
+            Crawl(crawl_id, dealer).summary()))
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
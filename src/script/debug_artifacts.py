@@ -0,0 +1,167 @@
+"""
+Opt-in debug artifact capture for scraper runs.
+
+Nothing is captured (and no producer is ever called) unless TOYOTA_DEBUG_CAPTURE
+is set, so a healthy run with capture off pays only a flag check.
+
+  TOYOTA_DEBUG_CAPTURE   off (default) | failure | always | N (every Nth run, plus failures)
+  TOYOTA_DEBUG_DIR       where run folders go (default ./debug_artifacts)
+  TOYOTA_DEBUG_KEEP_RUNS ring buffer size in runs (default 10)
+  TOYOTA_DEBUG_MAX_MB    ring buffer size cap in MB (default 50)
+  TOYOTA_DEBUG_HAR       1 to record a zipped HAR on sampled runs (cold browser only)
+
+Artifacts are gzip-compressed and written by a single background thread;
+each run gets its own folder and the oldest folders are pruned at end_run().
+"""
+
+import os, re, gzip, json, shutil, logging, threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Run folders are named by begin_run(); anything else under root (per-dealer
+# recorders' own roots, for one) is not this recorder's to prune
+RUN_DIR_RE = re.compile(r'^\d{8}_\d{6}_\d{6}$')
+
+
+class ArtifactRecorder:
+    def __init__(self, mode="off", root="debug_artifacts", keep_runs=10, max_mb=50, har=False):
+        mode = (mode or "off").strip().lower()
+        self.every_n = int(mode) if mode.isdigit() else 0
+        self.on_failure = mode in ("failure", "always") or self.every_n > 0
+        self.always = mode == "always"
+        self.root = root
+        self.keep_runs = keep_runs
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.har = har
+        self.run_dir = None
+        self.sampled = False
+        self._captured = False
+        self._pending = []
+        self._lock = threading.Lock()
+        self._executor = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            mode=os.environ.get("TOYOTA_DEBUG_CAPTURE", "off"),
+            root=os.environ.get("TOYOTA_DEBUG_DIR", "debug_artifacts"),
+            keep_runs=int(os.environ.get("TOYOTA_DEBUG_KEEP_RUNS", "10")),
+            max_mb=float(os.environ.get("TOYOTA_DEBUG_MAX_MB", "50")),
+            har=os.environ.get("TOYOTA_DEBUG_HAR", "") == "1",
+        )
+
+    @property
+    def enabled(self):
+        return self.on_failure
+
+    def begin_run(self):
+        """Start a run; decides up front whether this run is sampled."""
+        self._captured = False
+        self.run_dir = None
+        if not self.enabled:
+            self.sampled = False
+            return
+        self.sampled = self.always or (self.every_n > 0 and self._next_run_number() % self.every_n == 0)
+        self.run_dir = os.path.join(self.root, datetime.now().strftime("%Y%m%d_%H%M%S_%f"))
+
+    def _next_run_number(self):
+        path = os.path.join(self.root, "counter.json")
+        try:
+            with open(path) as f:
+                n = json.load(f).get("runs", 0) + 1
+        except (OSError, ValueError):
+            n = 1
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            with open(path, "w") as f:
+                json.dump({"runs": n}, f)
+        except OSError as e:
+            logger.debug("Artifact counter not saved: {}".format(e))
+        return n
+
+    def har_path(self):
+        """Path for Playwright's record_har_path on sampled runs, else None."""
+        if not (self.har and self.sampled and self.run_dir):
+            return None
+        os.makedirs(self.run_dir, exist_ok=True)
+        self._captured = True
+        return os.path.join(self.run_dir, "network.har.zip")
+
+    def capture(self, name, producer, failure=False):
+        """
+        Record an artifact if this run is sampled, or if failure=True and failures
+        are captured. producer() is only called when the artifact will be kept
+        (it runs on the caller's thread; compression and I/O happen in the background).
+        """
+        if not self.run_dir or not (self.sampled or (failure and self.on_failure)):
+            return False
+        try:
+            data = producer()
+        except Exception as e:
+            logger.debug("Artifact producer for {} failed: {}".format(name, e))
+            return False
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        path = os.path.join(self.run_dir, name + ".gz")
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="artifacts")
+            self._pending.append(self._executor.submit(self._write, path, data))
+            self._captured = True
+        return True
+
+    @staticmethod
+    def _write(path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with gzip.open(path, "wb", compresslevel=6) as f:
+            f.write(data)
+
+    def end_run(self, ok, **meta):
+        """Flush pending writes, write run.json for captured runs, prune the ring buffer."""
+        if not self.enabled:
+            return
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for fut in pending:
+            try:
+                fut.result()
+            except Exception as e:
+                logger.warning("Artifact write failed: {}".format(e))
+        if self._captured and self.run_dir:
+            os.makedirs(self.run_dir, exist_ok=True)
+            with open(os.path.join(self.run_dir, "run.json"), "w") as f:
+                json.dump(dict(meta, ok=ok, sampled=self.sampled,
+                               finished=datetime.now().isoformat()), f, indent=2)
+            logger.info("Debug artifacts saved to {}".format(self.run_dir))
+        self.prune()
+
+    def prune(self):
+        try:
+            runs = sorted(d for d in os.listdir(self.root)
+                          if RUN_DIR_RE.match(d) and os.path.isdir(os.path.join(self.root, d)))
+        except OSError:
+            return
+        sizes = {d: _dir_size(os.path.join(self.root, d)) for d in runs}
+        total = sum(sizes.values())
+        while runs and (len(runs) > self.keep_runs or total > self.max_bytes):
+            oldest = runs.pop(0)
+            total -= sizes[oldest]
+            shutil.rmtree(os.path.join(self.root, oldest), ignore_errors=True)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+def _dir_size(path):
+    total = 0
+    for base, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(base, name))
+            except OSError:
+                pass
+    return total
@@ -0,0 +1,179 @@
+"""
+Streaming dedup index for vehicle records.
+
+Vehicles can be added one at a time as they arrive from any strategy or page.
+Each record is reachable through hashed tuple keys:
+
+  ('stock', STOCK)                      identity
+  ('ymm_km', year, make, model, km)     secondary
+  ('ymm_price', year, make, model, $)   secondary
+  ('ymm', year, make, model)            secondary, only for records with neither km nor price
+
+Identity keys always link. Secondary keys only link when at least one side
+has no identity (two different stock numbers with the same price are two cars),
+and never fold two records that both have one: a card without a stock number
+that matches two stocked vehicles is merged into the first only.
+Duplicates are merged field by field: the more complete record wins each
+conflicting field, and blanks are filled from the other. Every insert is a
+constant number of dict lookups, so a whole run is O(n), and indexes built by
+parallel workers can be combined with merge().
+
+vehicles() lists records with a stock number first, then the rest, each in the
+order they were first seen (the order the old multi-pass dedup produced).
+Unstocked cards with the same year/make/model but different odometers or
+prices are kept apart; only cards that carry neither still collapse by
+year/make/model. `python3 src/script/dedup_index.py` checks these cases.
+"""
+
+import sys
+
+from vehicle_record import as_vehicle
+
+
+def completeness(v):
+    return as_vehicle(v).completeness()
+
+
+def record_keys(v):
+    """Return (identity_keys, secondary_keys) for a Vehicle."""
+    identity, secondary = [], []
+    stock = v.stock_number.upper()
+    if stock:
+        identity.append(('stock', stock))
+    if v.year is not None and v.make and v.model:
+        make, model = v.make.lower(), v.model.lower()
+        if v.mileage is not None:
+            secondary.append(('ymm_km', v.year, make, model, v.mileage))
+        if v.value is not None:
+            secondary.append(('ymm_price', v.year, make, model, v.value))
+        if not secondary:
+            # A bare card says nothing else about which car it is
+            secondary.append(('ymm', v.year, make, model))
+    return identity, secondary
+
+
+def merge_records(a, b):
+    """Field-level merge: the more complete record wins conflicts, blanks are filled from the other."""
+    if b.completeness() > a.completeness():
+        a, b = b, a
+    out = a.copy()
+    out.fill_from(b)
+    # Prices travel as a pair: never combine one record's regular with the other's sale
+    if a.value is not None:
+        out.sale_value = a.sale_value
+    return out
+
+
+class DedupIndex:
+    def __init__(self, vehicles=None):
+        self._records = []     # slot -> merged Vehicle (None once folded into another slot)
+        self._has_id = []      # slot -> whether the record carries a stock number
+        self._keys = []        # slot -> set of keys pointing at it
+        self._index = {}       # key -> slot
+        if vehicles:
+            self.update(vehicles)
+
+    def __len__(self):
+        return sum(1 for r in self._records if r is not None)
+
+    def update(self, vehicles):
+        for v in vehicles:
+            self.add(v)
+        return self
+
+    def add(self, v):
+        v = as_vehicle(v)
+        identity, secondary = record_keys(v)
+        slots = []
+        for key in identity:
+            slot = self._index.get(key)
+            if slot is not None and slot not in slots:
+                slots.append(slot)
+        for key in secondary:
+            slot = self._index.get(key)
+            if slot is None or slot in slots:
+                continue
+            # Secondary keys never join two vehicles that both carry an identity
+            if self._has_id[slot] and (identity or any(self._has_id[s] for s in slots)):
+                continue
+            slots.append(slot)
+
+        if not slots:
+            slot = len(self._records)
+            self._records.append(v.copy())
+            self._has_id.append(bool(identity))
+            self._keys.append(set())
+        else:
+            slot = slots[0]
+            merged = merge_records(self._records[slot], v)
+            for other in slots[1:]:
+                merged = merge_records(merged, self._records[other])
+                self._fold(other, slot)
+            self._records[slot] = merged
+            self._has_id[slot] = self._has_id[slot] or bool(identity)
+
+        # Re-derive keys from the merged record so later inserts can find it by any of them
+        m_identity, m_secondary = record_keys(self._records[slot])
+        for key in list(identity) + list(secondary) + m_identity + m_secondary:
+            if key not in self._index:
+                self._index[key] = slot
+                self._keys[slot].add(key)
+        return slot
+
+    def _fold(self, src, dst):
+        for key in self._keys[src]:
+            self._index[key] = dst
+        self._keys[dst] |= self._keys[src]
+        self._keys[src] = set()
+        self._has_id[dst] = self._has_id[dst] or self._has_id[src]
+        self._records[src] = None
+
+    def merge(self, other):
+        """Fold another worker's index into this one."""
+        return self.update(other.vehicles())
+
+    def vehicles(self):
+        """Stocked records first, then the rest, each in first-seen order."""
+        return ([r for r, has_id in zip(self._records, self._has_id) if r is not None and has_id]
+                + [r for r, has_id in zip(self._records, self._has_id) if r is not None and not has_id])
+
+
+# (description, cards, stock numbers or "ymm/km/$" of the expected output, in order)
+CHECKS = [
+    ("same stock number merges", [
+        {'stock_number': 'S1', 'mileage': '50000'}, {'stock_number': 'S1', 'value': '30000'}], ['S1']),
+    ("unstocked card joins the stocked car with its km", [
+        {'stock_number': 'S1', 'mileage': '50000'}, {'mileage': '50000', 'value': '30000'}], ['S1']),
+    ("two stocked cars with the same price stay apart", [
+        {'stock_number': 'S1', 'value': '30000'}, {'stock_number': 'S2', 'value': '30000'}], ['S1', 'S2']),
+    ("an unstocked card matching two stocked cars joins the first only", [
+        {'stock_number': 'S1', 'mileage': '50000', 'value': '30000'},
+        {'stock_number': 'S2', 'mileage': '60000', 'value': '25000'},
+        {'mileage': '50000', 'value': '25000'}], ['S1', 'S2']),
+    ("unstocked, no price, same km: one car", [
+        {'mileage': '50000'}, {'mileage': '50000'}], ['2020 rav4 50000/']),
+    ("unstocked, no price, different km: two cars", [
+        {'mileage': '50000'}, {'mileage': '60000'}], ['2020 rav4 50000/', '2020 rav4 60000/']),
+    ("unstocked, no price and no km: one car", [{}, {}], ['2020 rav4 /']),
+    ("stocked cars are listed first", [
+        {'mileage': '70000'}, {'stock_number': 'S1', 'mileage': '50000'}], ['S1', '2020 rav4 70000/']),
+]
+
+
+def _label(v):
+    return v.stock_number or "{} {} {}/{}".format(v.year, v.model.lower(), v['mileage'], v['value'])
+
+
+def main(argv=None):
+    failed = 0
+    for name, cards, expected in CHECKS:
+        got = [_label(v) for v in DedupIndex(
+            [dict(card, year='2020', makeName='Toyota', model='RAV4') for card in cards]).vehicles()]
+        ok = got == expected
+        failed += not ok
+        print("{}  {}{}".format("ok  " if ok else "FAIL", name, "" if ok else ": got {}".format(got)))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Incremental scrapes: listing snapshots, a preflight check and an early pagination stop.
+
+With TOYOTA_INCREMENTAL=on, every run that reads the results pages to the end
+saves them per dealer: each page's vehicles, one fingerprint per card and the
+listing total. The next run starts with a preflight, which fetches page 1 over
+plain HTTP. When the total and page 1's cards match the snapshot, the lot has
+not changed. The saved pages are reused and the run costs one request.
+
+Otherwise the pages are read as usual. Under the dealer's stable sort (newest
+first), changes collect at the front of the listing. Once a page matches its
+saved copy card for card, and the total has not moved, the saved pages after it
+are reused instead of fetched. Listings whose pages state no total are always
+read to the end.
+
+A saved page is only reused for TOYOTA_INCREMENTAL_MAX_AGE hours after it was
+last actually read, so every page is re-read at least that often. A reused page
+keeps its original read time.
+
+  TOYOTA_INCREMENTAL          off (default) | on
+  TOYOTA_INCREMENTAL_DIR      snapshot folder (default ~/.local/share/red-deer-toyota/listings)
+  TOYOTA_INCREMENTAL_MAX_AGE  hours (default 24)
+
+  python3 src/script/incremental.py [dealer]     # what the saved snapshot holds
+"""
+
+import os, re, sys, json, time, hashlib, logging, threading
+
+from inventory_output import FIELDS, normalize_row
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DIR = os.path.join(os.path.expanduser("~"), ".local", "share", "red-deer-toyota", "listings")
+INCREMENTAL = os.environ.get("TOYOTA_INCREMENTAL", "off").lower() in ("1", "on", "true", "yes")
+SNAPSHOT_DIR = os.environ.get("TOYOTA_INCREMENTAL_DIR", DEFAULT_DIR)
+MAX_AGE_S = float(os.environ.get("TOYOTA_INCREMENTAL_MAX_AGE", "24")) * 3600
+
+# "totalCount": 240 in embedded JSON, or "240 results" / "240 Vehicles" in the page
+TOTAL_JSON_RE = re.compile(r'"(?:totalCount|total_count|totalResults|numFound|resultCount|total)"\s*:\s*(\d+)')
+TOTAL_TEXT_RE = re.compile(r'>\s*(\d{1,3}(?:,\d{3})*|\d+)\s+(?:results|vehicles|matches|listings)\b',
+                           re.IGNORECASE)
+
+
+def enabled():
+    return INCREMENTAL
+
+
+def card_fingerprint(v):
+    """Short hash of a card's normalized fields: a price or mileage change gives a new fingerprint."""
+    row = normalize_row(v)
+    data = '\x1f'.join(row[f] for f in FIELDS).encode('utf-8')
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
+def page_fingerprints(vehicles):
+    return [card_fingerprint(v) for v in vehicles]
+
+
+def listing_total(html):
+    """The listing's vehicle count as the page states it, or None."""
+    m = TOTAL_JSON_RE.search(html) or TOTAL_TEXT_RE.search(html)
+    return int(m.group(1).replace(',', '')) if m else None
+
+
+def snapshot_path(dealer, root=None):
+    return os.path.join(root or SNAPSHOT_DIR, "{}.json".format(dealer))
+
+
+def load_snapshot(dealer, root=None):
+    path = snapshot_path(dealer, root)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning("Listing snapshot unreadable, ignoring it: {}".format(e))
+        return None
+
+
+class IncrementalRun:
+    """The previous snapshot plus the pages this run has read or reused so far."""
+
+    def __init__(self, dealer, previous=None, max_pages=10, root=None):
+        self.dealer = dealer
+        self.previous = previous
+        self.max_pages = max_pages
+        self.root = root
+        self.total = None        # listing total seen this run (preflight or page 1)
+        self.pages = {}          # page -> {'read_at', 'fingerprints', 'vehicles'}
+        self.last_page = None    # last non-empty page, once the end of the listing is known
+        self.reused = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, dealer, max_pages=10, root=None):
+        return cls(dealer, load_snapshot(dealer, root), max_pages, root)
+
+    def _saved(self, page, now):
+        """The previous run's copy of page, if it is young enough to stand in for a fetch."""
+        if not self.previous:
+            return None
+        saved = self.previous['pages'].get(str(page))
+        if saved is None or now - saved['read_at'] > MAX_AGE_S:
+            return None
+        return saved
+
+    def _total_unchanged(self):
+        """
+        The listing total matches the snapshot's. A page that states no total
+        cannot vouch for the pages after it (a car sold from the last page would
+        go unnoticed), so reuse needs one.
+        """
+        return self.previous is not None and self.total is not None and self.total == self.previous.get('total')
+
+    def read(self, page, vehicles):
+        """Record a page fetched and parsed this run."""
+        with self._lock:
+            self.pages[page] = {'read_at': time.time(), 'fingerprints': page_fingerprints(vehicles),
+                                'vehicles': [dict(v) for v in vehicles]}
+
+    def ended(self, page):
+        """page came back empty (or 404): the listing ends on the page before it."""
+        with self._lock:
+            self.last_page = page - 1
+
+    def _reuse(self, first, last, now):
+        """Saved pages first..last, or None when any of them is missing or too old."""
+        out = []
+        for p in range(first, last + 1):
+            saved = self._saved(p, now)
+            if saved is None:
+                return None
+            out.append((p, saved))
+        return out
+
+    def unchanged(self, page1_vehicles):
+        """
+        Preflight: all of the saved vehicles when page 1 and the total match the
+        snapshot and every saved page is still fresh, else None. page1_vehicles
+        is recorded as read either way.
+        """
+        self.read(1, page1_vehicles)
+        prev, now = self.previous, time.time()
+        if not prev or not page1_vehicles or not self._total_unchanged():
+            return None
+        if prev['pages'].get('1', {}).get('fingerprints') != self.pages[1]['fingerprints']:
+            return None
+        rest = self._reuse(2, prev['last_page'], now)
+        if rest is None:
+            return None
+        with self._lock:
+            for p, saved in rest:
+                self.pages[p] = saved
+            self.last_page = prev['last_page']
+            self.reused = len(rest)
+        return [v for p in range(1, prev['last_page'] + 1) for v in self.pages[p]['vehicles']]
+
+    def reuse_after(self, page, vehicles):
+        """
+        Early stop: [(page, vehicles), ...] for the saved pages after page when this
+        page matches its saved copy and the total has not moved, else None.
+        """
+        self.read(page, vehicles)
+        prev, now = self.previous, time.time()
+        if not prev or not vehicles or not self._total_unchanged():
+            return None
+        saved = prev['pages'].get(str(page))
+        if saved is None or saved['fingerprints'] != self.pages[page]['fingerprints']:
+            return None
+        rest = self._reuse(page + 1, prev['last_page'], now)
+        if rest is None:
+            return None
+        with self._lock:
+            for p, s in rest:
+                self.pages[p] = s
+            self.last_page = prev['last_page']
+            self.reused = len(rest)
+        return [(p, s['vehicles']) for p, s in rest]
+
+    def save(self):
+        """Write the snapshot when pages 1..last were all read or reused. Returns whether it did."""
+        with self._lock:
+            last = self.last_page
+            if last is None and len(self.pages) >= self.max_pages:
+                last = self.max_pages  # read as far as the scraper goes
+            if not last or any(p not in self.pages for p in range(1, last + 1)):
+                return False
+            data = {'dealer': self.dealer, 'saved_at': time.time(), 'total': self.total, 'last_page': last,
+                    'pages': {str(p): self.pages[p] for p in range(1, last + 1)}}
+        path = snapshot_path(self.dealer, self.root)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = "{}.{}.tmp".format(path, os.getpid())
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning("Listing snapshot not saved: {}".format(e))
+            return False
+        return True
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    dealer = argv[0] if argv else 'reddeertoyota'
+    snap = load_snapshot(dealer)
+    if not snap:
+        print("No snapshot for {} in {}".format(dealer, SNAPSHOT_DIR))
+        return 1
+    print("{}: saved {}, total {}, pages 1-{}".format(
+        dealer, time.strftime('%Y-%m-%d %H:%M', time.localtime(snap['saved_at'])),
+        snap['total'] if snap['total'] is not None else '?', snap['last_page']))
+    now = time.time()
+    for p in range(1, snap['last_page'] + 1):
+        page = snap['pages'][str(p)]
+        age = (now - page['read_at']) / 3600.0
+        print("  page {:>2}: {:>3} cards, read {:.1f} h ago{}".format(
+            p, len(page['vehicles']), age, " (too old to reuse)" if age * 3600 > MAX_AGE_S else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+"""
+Inventory analytics over NumPy columns.
+
+Vehicles (the current run, CSV snapshots or the history store) are loaded into
+columns once: text as integer codes into a label table, numbers as float64
+with NaN for unknown. Every statistic is then a grouped reduction over whole
+arrays (np.bincount, one lexsort for medians), so a report over years of
+hourly observations from several dealers is a few array passes, not a Python
+loop per row. The history columns are cached next to the database
+(<db>.columns.npz) and extended with only the runs added since, so each
+report reads one run's rows from SQLite.
+
+Report sections:
+  makes         vehicles and sale-priced vehicles per make
+  model_years   count and median / min / max price per model and year
+  depreciation  per model: least-squares price change per 10,000 km
+  discounts     sale discount percentiles and distribution
+  stale         current vehicles listed for TOYOTA_REPORT_STALE_DAYS or more (history store)
+  trend         per day over the last TOYOTA_REPORT_TREND_DAYS: vehicles listed, median price,
+                share on sale (last run of each day, history store)
+
+"Price" is the sale price when there is one, else the listed value.
+
+  TOYOTA_REPORT             on (default) | off; writes <csv name>.report.json / .report.md
+                            next to the CSV after each scrape
+  TOYOTA_REPORT_STALE_DAYS  default 60
+  TOYOTA_REPORT_TREND_DAYS  default 90
+
+  python3 src/script/inventory_analytics.py                          # public/data/inventory.csv + history
+  python3 src/script/inventory_analytics.py --csv a.csv b.csv --no-history --format json
+  python3 src/script/inventory_analytics.py --dealer all             # trend across every dealer in the history
+"""
+
+import os, csv, json, time, calendar, logging, argparse
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import inventory_history
+from vehicle_record import to_int
+
+logger = logging.getLogger(__name__)
+
+STALE_DAYS = float(os.environ.get("TOYOTA_REPORT_STALE_DAYS", "60"))
+TREND_DAYS = int(os.environ.get("TOYOTA_REPORT_TREND_DAYS", "90"))
+
+TEXT_COLUMNS = ('dealer', 'make', 'model', 'stock')
+NUMBER_COLUMNS = ('year', 'mileage', 'value', 'sale')
+DISCOUNT_BINS = [0, 2, 5, 10, 15, 20, 100]   # percent
+MIN_FIT = 3                                  # vehicles per model before a depreciation fit is reported
+
+
+class Columns:
+    """n vehicles as arrays. codes[c] index into labels[c]; nums[c] are float64, NaN = unknown."""
+
+    def __init__(self, codes, labels, nums, observed=None):
+        self.codes = codes
+        self.labels = labels
+        self.nums = nums
+        self.observed = observed    # int64 epoch seconds per row (history), else None
+        self.n = len(nums['value'])
+
+    @classmethod
+    def from_vehicles(cls, vehicles, dealer=''):
+        """Vehicles or CSV-shaped dicts; the only per-row Python pass, done once."""
+        tables = {c: {} for c in TEXT_COLUMNS}
+        codes = {c: [] for c in TEXT_COLUMNS}
+        nums = {c: [] for c in NUMBER_COLUMNS}
+        for v in vehicles:
+            text = (v.get('dealer') or dealer, v.get('makeName') or 'Unknown', v.get('model') or '',
+                    v.get('stock_number') or '')
+            for c, s in zip(TEXT_COLUMNS, text):
+                codes[c].append(tables[c].setdefault(s, len(tables[c])))
+            for c, key in zip(NUMBER_COLUMNS, ('year', 'mileage', 'value', 'sale_value')):
+                nums[c].append(to_int(v.get(key)))
+        return cls({c: np.array(codes[c], dtype=np.int32) for c in TEXT_COLUMNS},
+                   {c: np.array(list(tables[c]), dtype=object) for c in TEXT_COLUMNS},
+                   {c: np.array(nums[c], dtype=np.float64) for c in NUMBER_COLUMNS})
+
+    @classmethod
+    def from_csv(cls, paths, dealer=''):
+        rows = []
+        for path in paths:
+            with open(path, newline='', encoding='utf-8') as f:
+                rows.extend(csv.DictReader(f))
+        return cls.from_vehicles(rows, dealer)
+
+    def take(self, mask):
+        return Columns({c: a[mask] for c, a in self.codes.items()}, self.labels,
+                       {c: a[mask] for c, a in self.nums.items()},
+                       None if self.observed is None else self.observed[mask])
+
+    def price(self):
+        """Sale price where there is one, else the listed value."""
+        sale = self.nums['sale']
+        return np.where(np.isnan(sale), self.nums['value'], sale)
+
+
+# -----------------------------------------------------------------------
+# History store as columns
+# -----------------------------------------------------------------------
+
+def _naive_epoch(dt):
+    """Seconds for a naive local datetime read as UTC, the way SQLite's strftime('%s') reads observed_at."""
+    return calendar.timegm(dt.timetuple())
+
+
+def history_columns(conn, cache_path=None):
+    """
+    Every observation in the history store as Columns (observed = run time).
+
+    The arrays are cached in cache_path (.npz) together with the last run id
+    they cover; later calls read only the runs added since, so the per-row
+    Python work is paid once per observation, not once per report. A cache that
+    is ahead of the database (a replaced or trimmed file) is rebuilt.
+    """
+    cached = None
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with np.load(cache_path) as z:
+                cached = {k: z[k] for k in z.files}
+        except (OSError, ValueError) as e:
+            logger.warning("Analytics cache unreadable, rebuilding: {}".format(e))
+    max_run = conn.execute("SELECT COALESCE(MAX(id), 0) FROM runs").fetchone()[0]
+    if cached is not None and int(cached['last_run']) > max_run:
+        cached = None
+    last_run = int(cached['last_run']) if cached is not None else 0
+
+    tables = {c: {} for c in TEXT_COLUMNS}
+    if cached is not None:
+        for c in TEXT_COLUMNS:
+            tables[c] = {s: i for i, s in enumerate(cached['labels_' + c].tolist())}
+    run_time = dict(conn.execute(
+        "SELECT id, CAST(strftime('%s', observed_at) AS INTEGER) FROM runs WHERE id > ?", (last_run,)))
+    codes = {c: [] for c in TEXT_COLUMNS}
+    nums = {c: [] for c in NUMBER_COLUMNS}
+    observed, runs = [], []
+    for row in conn.execute(
+            "SELECT run_id, COALESCE(dealer, ''), COALESCE(make, ''), COALESCE(model, ''), stock_number,"
+            " COALESCE(year, -1), COALESCE(mileage, -1), COALESCE(value, -1), COALESCE(sale_value, -1)"
+            " FROM observations WHERE run_id > ?", (last_run,)):
+        runs.append(row[0])
+        observed.append(run_time.get(row[0], 0))
+        for c, s in zip(TEXT_COLUMNS, row[1:5]):
+            t = tables[c]
+            code = t.get(s)
+            if code is None:
+                code = t[s] = len(t)
+            codes[c].append(code)
+        for c, x in zip(NUMBER_COLUMNS, row[5:]):
+            nums[c].append(x)
+
+    new_codes = {c: np.array(codes[c], dtype=np.int32) for c in TEXT_COLUMNS}
+    new_nums = {c: np.array(nums[c], dtype=np.float64) for c in NUMBER_COLUMNS}
+    for a in new_nums.values():
+        a[a < 0] = np.nan
+    new_observed = np.array(observed, dtype=np.int64)
+    if cached is not None:
+        new_codes = {c: np.concatenate([cached['code_' + c], new_codes[c]]) for c in TEXT_COLUMNS}
+        new_nums = {c: np.concatenate([cached['num_' + c], new_nums[c]]) for c in NUMBER_COLUMNS}
+        new_observed = np.concatenate([cached['observed'], new_observed])
+    labels = {c: np.array(list(tables[c]), dtype=object) for c in TEXT_COLUMNS}
+
+    if cache_path and (runs or cached is None):
+        try:
+            tmp = cache_path + '.tmp.npz'
+            np.savez(tmp, last_run=np.int64(max(runs) if runs else last_run), observed=new_observed,
+                     **{'code_' + c: new_codes[c] for c in TEXT_COLUMNS},
+                     **{'num_' + c: new_nums[c] for c in NUMBER_COLUMNS},
+                     **{'labels_' + c: np.array(list(tables[c]), dtype=str) for c in TEXT_COLUMNS})
+            os.replace(tmp, cache_path)
+        except OSError as e:
+            logger.warning("Analytics cache not written: {}".format(e))
+    return Columns(new_codes, labels, new_nums, observed=new_observed)
+
+
+def history_slice(hist, dealer=None, since=None):
+    """Rows of one dealer (None = all) observed at or after the naive datetime since."""
+    mask = np.ones(hist.n, dtype=bool)
+    if dealer:
+        match = np.flatnonzero(hist.labels['dealer'] == dealer)
+        mask &= np.isin(hist.codes['dealer'], match)
+    if since is not None:
+        mask &= hist.observed >= _naive_epoch(since)
+    return hist.take(mask)
+
+
+# -----------------------------------------------------------------------
+# Grouped reductions
+# -----------------------------------------------------------------------
+
+def group_by(*keys):
+    """(group id per row, unique key rows) for the combination of integer key arrays."""
+    stacked = np.stack(keys, axis=1) if len(keys) > 1 else keys[0][:, None]
+    uniq, inverse = np.unique(stacked, axis=0, return_inverse=True)
+    return inverse.reshape(-1), uniq
+
+
+def grouped_quantiles(groups, values, ngroups):
+    """(count, median, min, max) per group over the finite values; NaN for empty groups."""
+    ok = np.isfinite(values)
+    g, v = groups[ok], values[ok]
+    order = np.lexsort((v, g))
+    g, v = g[order], v[order]
+    counts = np.bincount(g, minlength=ngroups)
+    starts = np.cumsum(counts) - counts
+    med = np.full(ngroups, np.nan)
+    lo = np.full(ngroups, np.nan)
+    hi = np.full(ngroups, np.nan)
+    has = counts > 0
+    s, c = starts[has], counts[has]
+    med[has] = (v[s + (c - 1) // 2] + v[s + c // 2]) / 2.0
+    lo[has] = v[s]
+    hi[has] = v[s + c - 1]
+    return counts, med, lo, hi
+
+
+def grouped_slope(groups, x, y, ngroups):
+    """(n, least-squares dy/dx) per group over rows where x and y are both known."""
+    ok = np.isfinite(x) & np.isfinite(y)
+    g, x, y = groups[ok], x[ok], y[ok]
+    n = np.bincount(g, minlength=ngroups).astype(np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mx = np.bincount(g, x, ngroups) / n
+        my = np.bincount(g, y, ngroups) / n
+        dx = x - mx[g]
+        sxx = np.bincount(g, dx * dx, ngroups)
+        sxy = np.bincount(g, dx * (y - my[g]), ngroups)
+        slope = np.where(sxx > 0, sxy / sxx, np.nan)
+    return n.astype(np.int64), slope
+
+
+def _num(x, digits=0):
+    if x is None or not np.isfinite(x):
+        return None
+    return int(round(float(x))) if digits == 0 else round(float(x), digits)
+
+
+# -----------------------------------------------------------------------
+# Sections
+# -----------------------------------------------------------------------
+
+def makes(cols):
+    counts = np.bincount(cols.codes['make'], minlength=len(cols.labels['make']))
+    on_sale = np.bincount(cols.codes['make'], np.isfinite(cols.nums['sale']),
+                          len(cols.labels['make'])).astype(np.int64)
+    order = np.argsort(-counts, kind='stable')
+    return [{'make': cols.labels['make'][i], 'vehicles': int(counts[i]), 'on_sale': int(on_sale[i])}
+            for i in order if counts[i]]
+
+
+def model_years(cols):
+    year = np.nan_to_num(cols.nums['year'], nan=0).astype(np.int64)
+    groups, keys = group_by(cols.codes['make'], cols.codes['model'], year)
+    vehicles = np.bincount(groups, minlength=len(keys))
+    count, med, lo, hi = grouped_quantiles(groups, cols.price(), len(keys))
+    rows = []
+    for i, (mk, md, yr) in enumerate(keys):
+        rows.append({'make': cols.labels['make'][mk], 'model': cols.labels['model'][md],
+                     'year': int(yr) or None, 'vehicles': int(vehicles[i]),
+                     'priced': int(count[i]), 'median_price': _num(med[i]),
+                     'min_price': _num(lo[i]), 'max_price': _num(hi[i])})
+    return sorted(rows, key=lambda r: (r['make'], r['model'], r['year'] or 0))
+
+
+def depreciation(cols):
+    groups, keys = group_by(cols.codes['make'], cols.codes['model'])
+    n, slope = grouped_slope(groups, cols.nums['mileage'], cols.price(), len(keys))
+    _, med, _, _ = grouped_quantiles(groups, cols.price(), len(keys))
+    rows = [{'make': cols.labels['make'][mk], 'model': cols.labels['model'][md], 'vehicles': int(n[i]),
+             'median_price': _num(med[i]), 'per_10000_km': _num(slope[i] * 10000)}
+            for i, (mk, md) in enumerate(keys) if n[i] >= MIN_FIT and np.isfinite(slope[i])]
+    return sorted(rows, key=lambda r: (r['make'], r['model']))
+
+
+def discounts(cols):
+    value, sale = cols.nums['value'], cols.nums['sale']
+    ok = np.isfinite(value) & np.isfinite(sale) & (value > 0) & (sale < value)
+    pct = (value[ok] - sale[ok]) / value[ok] * 100.0
+    out = {'on_sale': int(ok.sum()), 'priced': int(np.isfinite(value).sum())}
+    if pct.size:
+        p = np.percentile(pct, [10, 25, 50, 75, 90])
+        out['percentiles'] = {k: round(float(x), 1) for k, x in zip(('p10', 'p25', 'p50', 'p75', 'p90'), p)}
+        out['mean_dollars'] = _num(np.mean(value[ok] - sale[ok]))
+        hist, _ = np.histogram(pct, bins=DISCOUNT_BINS)
+        out['histogram'] = [{'range': '{}-{}%'.format(a, b), 'vehicles': int(h)}
+                            for a, b, h in zip(DISCOUNT_BINS[:-1], DISCOUNT_BINS[1:], hist)]
+    return out
+
+
+def stale(conn, dealer, stale_days=None, limit=25):
+    """Vehicles in the dealer's latest run first seen stale_days or more before it."""
+    stale_days = STALE_DAYS if stale_days is None else stale_days
+    where, args = ("WHERE dealer = ?", [dealer]) if dealer else ("", [])
+    latest = conn.execute("SELECT MAX(observed_at) FROM runs " + where, args).fetchone()[0]
+    if not latest:
+        return []
+    rows = conn.execute(
+        "SELECT dealer, stock_number, year, make, model, first_value, last_value, last_sale_value,"
+        " julianday(?) - julianday(first_seen) FROM vehicles WHERE last_seen = ?"
+        + (" AND dealer = ?" if dealer else ""), [latest, latest] + ([dealer] if dealer else [])).fetchall()
+    if not rows:
+        return []
+    days = np.array([r[8] for r in rows], dtype=np.float64)
+    keep = np.flatnonzero(days >= stale_days)
+    keep = keep[np.argsort(-days[keep], kind='stable')][:limit]
+    out = []
+    for i in keep:
+        d, stock, year, make, model, first, last, sale = rows[i][:8]
+        out.append({'dealer': d, 'stock_number': stock, 'year': year, 'make': make, 'model': model,
+                    'days_listed': round(float(days[i]), 1), 'first_value': first, 'last_value': last,
+                    'last_sale_value': sale,
+                    'price_change': (last - first) if first is not None and last is not None else None})
+    return out
+
+
+def trend(hist):
+    """Per day: vehicles, median price and share on sale in each dealer's last run of the day."""
+    if hist.n == 0:
+        return []
+    days, day_idx = np.unique(hist.observed // 86400, return_inverse=True)
+    key = hist.codes['dealer'].astype(np.int64) * len(days) + day_idx
+    last_obs = np.full(len(hist.labels['dealer']) * len(days), np.iinfo(np.int64).min)
+    np.maximum.at(last_obs, key, hist.observed)
+    sel = hist.observed == last_obs[key]
+    g = day_idx[sel]
+    vehicles = np.bincount(g, minlength=len(days))
+    on_sale = np.bincount(g, np.isfinite(hist.nums['sale'][sel]), len(days))
+    _, med, _, _ = grouped_quantiles(g, hist.price()[sel], len(days))
+    return [{'date': str(np.datetime64(int(d), 'D')),
+             'vehicles': int(vehicles[i]), 'median_price': _num(med[i]),
+             'on_sale_share': round(float(on_sale[i] / vehicles[i]), 3) if vehicles[i] else None}
+            for i, d in enumerate(days)]
+
+
+# -----------------------------------------------------------------------
+# Report
+# -----------------------------------------------------------------------
+
+def build_report(current, dealer=None, history_path=None, stale_days=None, trend_days=None):
+    """current: Columns for the listing being reported; history_path None skips stale/trend."""
+    trend_days = TREND_DAYS if trend_days is None else trend_days
+    price = current.price()
+    report = {
+        'generated': datetime.now().isoformat(timespec='seconds'),
+        'dealer': dealer or 'all',
+        'vehicles': current.n,
+        'median_price': _num(np.nanmedian(price)) if np.isfinite(price).any() else None,
+        'median_mileage': _num(np.nanmedian(current.nums['mileage']))
+                          if np.isfinite(current.nums['mileage']).any() else None,
+        'makes': makes(current),
+        'model_years': model_years(current),
+        'depreciation': depreciation(current),
+        'discounts': discounts(current),
+    }
+    if history_path and os.path.exists(history_path):
+        conn = inventory_history.connect(history_path)
+        try:
+            started = time.perf_counter()
+            hist = history_columns(conn, history_path + '.columns.npz')
+            recent = history_slice(hist, dealer, datetime.now() - timedelta(days=trend_days))
+            report['stale'] = stale(conn, dealer, stale_days)
+            report['trend'] = trend(recent)
+            logger.info("Analytics: {} history observations ({} in the trend window) in {:.2f}s".format(
+                hist.n, recent.n, time.perf_counter() - started))
+        finally:
+            conn.close()
+    return report
+
+
+def _cell(x, key=''):
+    if x is None:
+        return ''
+    if isinstance(x, int) and not isinstance(x, bool) and abs(x) >= 1000 and key != 'year':
+        return '{:,}'.format(x)
+    return str(x)
+
+
+def _table(rows, columns):
+    if not rows:
+        return ["_none_", ""]
+    out = ["| " + " | ".join(title for title, _ in columns) + " |",
+           "|" + "|".join("---" for _ in columns) + "|"]
+    out += ["| " + " | ".join(_cell(r.get(key), key) for _, key in columns) + " |" for r in rows]
+    return out + [""]
+
+
+def to_markdown(report):
+    lines = ["# Inventory report: {}".format(report['dealer']), "",
+             "Generated {}. {} vehicles, median price ${}, median mileage {} km.".format(
+                 report['generated'], report['vehicles'], _cell(report['median_price']),
+                 _cell(report['median_mileage'])), ""]
+    lines += ["## Makes", ""] + _table(report['makes'], [('Make', 'make'), ('Vehicles', 'vehicles'),
+                                                         ('On sale', 'on_sale')])
+    lines += ["## Price by model and year", ""] + _table(report['model_years'], [
+        ('Make', 'make'), ('Model', 'model'), ('Year', 'year'), ('Vehicles', 'vehicles'),
+        ('Median $', 'median_price'), ('Min $', 'min_price'), ('Max $', 'max_price')])
+    lines += ["## Price change per 10,000 km", ""] + _table(report['depreciation'], [
+        ('Make', 'make'), ('Model', 'model'), ('Vehicles', 'vehicles'), ('Median $', 'median_price'),
+        ('$ per 10,000 km', 'per_10000_km')])
+    d = report['discounts']
+    lines += ["## Sale discounts", "", "{} of {} priced vehicles on sale.".format(d['on_sale'], d['priced'])]
+    if d.get('percentiles'):
+        lines += ["Discount percentiles: " + ", ".join(
+            "{} {}%".format(k, v) for k, v in d['percentiles'].items())
+            + "; mean ${}.".format(_cell(d['mean_dollars'])), ""]
+        lines += _table(d['histogram'], [('Discount', 'range'), ('Vehicles', 'vehicles')])
+    else:
+        lines.append("")
+    if 'stale' in report:
+        lines += ["## Listed {:g}+ days".format(STALE_DAYS), ""] + _table(report['stale'], [
+            ('Stock #', 'stock_number'), ('Year', 'year'), ('Make', 'make'), ('Model', 'model'),
+            ('Days', 'days_listed'), ('First $', 'first_value'), ('Now $', 'last_value'),
+            ('Change $', 'price_change')])
+    if 'trend' in report:
+        lines += ["## Daily trend", ""] + _table(report['trend'][-31:], [
+            ('Date', 'date'), ('Vehicles', 'vehicles'), ('Median $', 'median_price'),
+            ('On sale', 'on_sale_share')])
+    return "\n".join(lines)
+
+
+def write_report(vehicles, csv_path, dealer=None, history_path=None):
+    """<csv name>.report.json and .report.md next to the CSV. Returns the report."""
+    report = build_report(Columns.from_vehicles(vehicles, dealer or ''), dealer, history_path)
+    base = os.path.splitext(csv_path)[0]
+    with open(base + '.report.json', 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=1)
+    with open(base + '.report.md', 'w', encoding='utf-8') as f:
+        f.write(to_markdown(report) + "\n")
+    logger.info("Report written: {}.report.json / .md".format(base))
+    return report
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    project_root = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+    ap = argparse.ArgumentParser(description="Inventory analytics report")
+    ap.add_argument('--csv', nargs='+', default=[os.path.join(project_root, 'public', 'data', 'inventory.csv')])
+    ap.add_argument('--dealer', default=inventory_history.DEFAULT_DEALER, help='"all" for every dealer')
+    ap.add_argument('--history', default=inventory_history.HISTORY_DB)
+    ap.add_argument('--no-history', action='store_true')
+    ap.add_argument('--stale-days', type=float)
+    ap.add_argument('--trend-days', type=int)
+    ap.add_argument('--format', choices=['md', 'json'], default='md')
+    args = ap.parse_args(argv)
+    dealer = None if args.dealer == 'all' else args.dealer
+    history = None if args.no_history or args.history.lower() == 'off' else args.history
+    report = build_report(Columns.from_csv(args.csv, dealer or ''), dealer, history,
+                          args.stale_days, args.trend_days)
+    print(json.dumps(report, indent=1) if args.format == 'json' else to_markdown(report))
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+SQLite inventory history: one row per run, one observation per vehicle per run,
+plus a first-seen / last-seen rollup per stock number.
+
+Each run is written in a single transaction. Lookups go through indexes on
+(dealer, stock_number, observed_at), so price history and days-on-lot are
+index queries instead of replaying git revisions of inventory.csv.
+
+  python3 src/script/inventory_history.py price-history S20561
+  python3 src/script/inventory_history.py days-on-lot [--make Toyota]
+
+TOYOTA_HISTORY_DB sets the database path ("off" disables recording). The default
+lives outside the checkout so the workflow's clean checkout does not wipe it.
+"""
+
+import os, re, sys, sqlite3, logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB = os.path.join(os.path.expanduser("~"), ".local", "share", "red-deer-toyota",
+                          "inventory_history.sqlite")
+HISTORY_DB = os.environ.get("TOYOTA_HISTORY_DB", DEFAULT_DB)
+DEFAULT_DEALER = "reddeertoyota"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id            INTEGER PRIMARY KEY,
+    dealer        TEXT NOT NULL,
+    observed_at   TEXT NOT NULL,
+    vehicle_count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_dealer_time ON runs (dealer, observed_at);
+
+CREATE TABLE IF NOT EXISTS observations (
+    run_id       INTEGER NOT NULL REFERENCES runs(id),
+    dealer       TEXT NOT NULL,
+    stock_number TEXT NOT NULL,
+    observed_at  TEXT NOT NULL,
+    year         INTEGER,
+    make         TEXT,
+    model        TEXT,
+    trim         TEXT,
+    mileage      INTEGER,
+    value        INTEGER,
+    sale_value   INTEGER
+);
+CREATE INDEX IF NOT EXISTS obs_stock_time ON observations (dealer, stock_number, observed_at);
+CREATE INDEX IF NOT EXISTS obs_time ON observations (observed_at);
+
+CREATE TABLE IF NOT EXISTS vehicles (
+    dealer          TEXT NOT NULL,
+    stock_number    TEXT NOT NULL,
+    first_seen      TEXT NOT NULL,
+    last_seen       TEXT NOT NULL,
+    year            INTEGER,
+    make            TEXT,
+    model           TEXT,
+    trim            TEXT,
+    first_value     INTEGER,
+    last_value      INTEGER,
+    last_sale_value INTEGER,
+    PRIMARY KEY (dealer, stock_number)
+);
+CREATE INDEX IF NOT EXISTS vehicles_model ON vehicles (dealer, make, model);
+"""
+
+
+def _int(val):
+    digits = re.sub(r'[^\d]', '', str(val or ''))
+    return int(digits) if digits else None
+
+
+def connect(path=None):
+    path = path or HISTORY_DB
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def record_run(vehicles, path=None, dealer=DEFAULT_DEALER, observed_at=None):
+    """Append one run's observations and update the rollups in a single transaction."""
+    observed_at = observed_at or datetime.now().isoformat(timespec='seconds')
+    rows = []
+    for v in vehicles:
+        stock = str(v.get('stock_number', '') or '').strip()
+        if not stock:
+            continue
+        rows.append((dealer, stock, observed_at, _int(v.get('year')),
+                     v.get('makeName', '') or '', v.get('model', '') or '', v.get('trim', '') or '',
+                     _int(v.get('mileage')), _int(v.get('value')), _int(v.get('sale_value'))))
+    conn = connect(path)
+    try:
+        with conn:
+            run_id = conn.execute(
+                "INSERT INTO runs (dealer, observed_at, vehicle_count) VALUES (?, ?, ?)",
+                (dealer, observed_at, len(vehicles))).lastrowid
+            conn.executemany(
+                "INSERT INTO observations (run_id, dealer, stock_number, observed_at, year, make,"
+                " model, trim, mileage, value, sale_value) VALUES (?,?,?,?,?,?,?,?,?,?,?)",
+                [(run_id,) + r for r in rows])
+            conn.executemany(
+                "INSERT INTO vehicles (dealer, stock_number, first_seen, last_seen, year, make, model,"
+                " trim, first_value, last_value, last_sale_value)"
+                " VALUES (?1, ?2, ?3, ?3, ?4, ?5, ?6, ?7, ?9, ?9, ?10)"
+                " ON CONFLICT (dealer, stock_number) DO UPDATE SET"
+                " last_seen = excluded.last_seen, last_value = excluded.last_value,"
+                " last_sale_value = excluded.last_sale_value, trim = excluded.trim",
+                rows)
+    finally:
+        conn.close()
+    logger.info("History: run {} recorded ({} observations, {} without stock #)".format(
+        run_id, len(rows), len(vehicles) - len(rows)))
+    return run_id
+
+
+def price_history(stock_number, path=None, dealer=DEFAULT_DEALER):
+    """Price changes for one vehicle: [(observed_at, value, sale_value), ...], first sighting included."""
+    conn = connect(path)
+    try:
+        cur = conn.execute(
+            "SELECT observed_at, value, sale_value FROM observations"
+            " WHERE dealer = ? AND stock_number = ? ORDER BY observed_at",
+            (dealer, stock_number))
+        changes, last = [], object()
+        for observed_at, value, sale in cur:
+            if (value, sale) != last:
+                changes.append((observed_at, value, sale))
+                last = (value, sale)
+        return changes
+    finally:
+        conn.close()
+
+
+def days_on_lot(path=None, dealer=DEFAULT_DEALER, make=None):
+    """Average/min/max days between first and last sighting, grouped by make and model."""
+    conn = connect(path)
+    try:
+        sql = ("SELECT make, model, COUNT(*),"
+               " AVG(julianday(last_seen) - julianday(first_seen)),"
+               " MIN(julianday(last_seen) - julianday(first_seen)),"
+               " MAX(julianday(last_seen) - julianday(first_seen))"
+               " FROM vehicles WHERE dealer = ?")
+        args = [dealer]
+        if make:
+            sql += " AND make = ?"
+            args.append(make)
+        sql += " GROUP BY make, model ORDER BY make, model"
+        return [{'make': m, 'model': mo, 'vehicles': n, 'avg_days': round(a, 1),
+                 'min_days': round(lo, 1), 'max_days': round(hi, 1)}
+                for m, mo, n, a, lo, hi in conn.execute(sql, args)]
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in ('price-history', 'days-on-lot'):
+        print(__doc__)
+        return 1
+    if argv[0] == 'price-history':
+        if len(argv) < 2:
+            print("usage: inventory_history.py price-history STOCK")
+            return 1
+        for observed_at, value, sale in price_history(argv[1]):
+            print("{:<20} {:>10} {:>10}".format(observed_at, value or '', sale or ''))
+        return 0
+    make = argv[argv.index('--make') + 1] if '--make' in argv else None
+    print("{:<12} {:<20} {:>5} {:>8} {:>8} {:>8}".format('Make', 'Model', 'N', 'Avg', 'Min', 'Max'))
+    for r in days_on_lot(make=make):
+        print("{:<12} {:<20} {:>5} {:>8} {:>8} {:>8}".format(
+            r['make'][:11], r['model'][:19], r['vehicles'], r['avg_days'], r['min_days'], r['max_days']))
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
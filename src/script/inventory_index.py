@@ -0,0 +1,141 @@
+"""
+Precomputed JSON inventory index for the React front end.
+
+Writes, next to inventory.csv:
+
+  inventory.<hash>.json            compact index (typed rows, facets, orderings)
+  inventory.<make>.<hash>.json     optional per-make shards (TOYOTA_INDEX_SHARDS=1)
+  inventory.manifest.json          tiny pointer to the current hashed files
+
+The hash covers the index bytes only, so an unchanged inventory produces the
+same filenames and nothing is rewritten. Hashed files never change content and
+can be cached forever; only the manifest needs revalidation. Compression is
+left to the host (Vercel compresses responses itself).
+
+Index layout:
+  {"fields": [...], "rows": [[...], ...],
+   "facets": {"makes": {make: n}, "models": {make: {model: n}}},
+   "order": {"price": [row#...], "year": [...], "mileage": [...]}}
+"""
+
+import os, re, json, hashlib, logging
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ['makeName', 'year', 'model', 'sub-model', 'trim', 'mileage',
+          'value', 'sale_value', 'stock_number', 'engine']
+INT_FIELDS = ('year', 'mileage', 'value', 'sale_value')
+MANIFEST = 'inventory.manifest.json'
+SHARDS = os.environ.get("TOYOTA_INDEX_SHARDS", "") == "1"
+
+
+def _int_or_none(val):
+    digits = re.sub(r'[^\d]', '', str(val or ''))
+    return int(digits) if digits else None
+
+
+def typed_row(v):
+    return [(_int_or_none(v.get(f)) if f in INT_FIELDS else str(v.get(f, '') or '').strip())
+            for f in FIELDS]
+
+
+def build_index(vehicles):
+    rows = [typed_row(v) for v in vehicles]
+    col = {f: i for i, f in enumerate(FIELDS)}
+    makes, models = {}, {}
+    for r in rows:
+        make, model = r[col['makeName']] or 'Unknown', r[col['model']]
+        makes[make] = makes.get(make, 0) + 1
+        if model:
+            models.setdefault(make, {})
+            models[make][model] = models[make].get(model, 0) + 1
+
+    def order(field, reverse=False):
+        i = col[field]
+        present = [n for n, r in enumerate(rows) if r[i] is not None]
+        missing = [n for n, r in enumerate(rows) if r[i] is None]
+        return sorted(present, key=lambda n: rows[n][i], reverse=reverse) + missing
+
+    def price(n):
+        r = rows[n]
+        return r[col['sale_value']] or r[col['value']]
+
+    priced = [n for n in range(len(rows)) if price(n)]
+    return {
+        'fields': FIELDS,
+        'rows': rows,
+        'facets': {
+            'makes': dict(sorted(makes.items())),
+            'models': {m: dict(sorted(c.items())) for m, c in sorted(models.items())},
+        },
+        'order': {
+            'price': sorted(priced, key=price) + [n for n in range(len(rows)) if not price(n)],
+            'year': order('year', reverse=True),
+            'mileage': order('mileage'),
+        },
+    }
+
+
+def _dumps(obj):
+    return json.dumps(obj, separators=(',', ':'), sort_keys=True, ensure_ascii=False).encode('utf-8')
+
+
+def _slug(s):
+    return re.sub(r'[^a-z0-9]+', '-', s.lower()).strip('-') or 'unknown'
+
+
+def _write_hashed(out_dir, stem, data):
+    """Write stem.<hash>.json unless it already exists. Returns the filename."""
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    name = '{}.{}.json'.format(stem, digest)
+    path = os.path.join(out_dir, name)
+    if not os.path.exists(path):
+        with open(path, 'wb') as f:
+            f.write(data)
+    return name
+
+
+def write_index(vehicles, out_dir):
+    """Write the hashed index (and shards) plus the manifest. Returns the manifest dict."""
+    os.makedirs(out_dir, exist_ok=True)
+    index = build_index(vehicles)
+    manifest = {
+        'index': _write_hashed(out_dir, 'inventory', _dumps(index)),
+        'count': len(index['rows']),
+        'fields': FIELDS,
+    }
+    if SHARDS:
+        make_col = FIELDS.index('makeName')
+        by_make = {}
+        for v, row in zip(vehicles, index['rows']):
+            by_make.setdefault(row[make_col] or 'Unknown', []).append(v)
+        manifest['shards'] = {
+            make: _write_hashed(out_dir, 'inventory.' + _slug(make), _dumps(build_index(vs)))
+            for make, vs in sorted(by_make.items())
+        }
+
+    manifest_path = os.path.join(out_dir, MANIFEST)
+    data = json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8')
+    try:
+        with open(manifest_path, 'rb') as f:
+            unchanged = f.read() == data
+    except OSError:
+        unchanged = False
+    if not unchanged:
+        with open(manifest_path, 'wb') as f:
+            f.write(data)
+        logger.info("JSON index written: {}".format(manifest['index']))
+    _remove_stale(out_dir, manifest)
+    return manifest
+
+
+def _remove_stale(out_dir, manifest):
+    keep = {manifest['index']} | set(manifest.get('shards', {}).values())
+    # .gz/.br variants are no longer written; any left from earlier runs go too
+    pattern = re.compile(r'^inventory\.(?:[a-z0-9-]+\.)?[0-9a-f]{12}\.json(?:\.gz|\.br)?$')
+    for name in os.listdir(out_dir):
+        if pattern.match(name) and name not in keep:
+            try:
+                os.remove(os.path.join(out_dir, name))
+            except OSError:
+                pass
@@ -0,0 +1,115 @@
+"""
+Deterministic, change-aware inventory output.
+
+Rows are normalized (numbers reduced to plain digits, text trimmed) and sorted
+canonically, then compared with the previous snapshot by stock number. The CSV
+is only rewritten when a material field changed, so an unchanged lot leaves the
+file byte-identical and the workflow skips the commit and the redeploy.
+Each real change also writes <name>.delta.json next to the CSV:
+
+  {"generated": ..., "added": [...], "removed": [...],
+   "repriced": [{"stock_number", "old_value", "new_value", "old_sale", "new_sale"}],
+   "updated": [{"stock_number", "fields"}]}
+"""
+
+import os, csv, json, re, logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ['makeName', 'year', 'model', 'sub-model', 'trim', 'mileage',
+          'value', 'sale_value', 'stock_number', 'engine']
+NUMERIC_FIELDS = ('year', 'mileage', 'value', 'sale_value')
+PRICE_FIELDS = ('value', 'sale_value')
+
+
+def normalize_row(v):
+    row = {}
+    for f in FIELDS:
+        val = re.sub(r'\s+', ' ', str(v.get(f, '') or '')).strip()
+        if f in NUMERIC_FIELDS:
+            digits = re.sub(r'[^\d]', '', val)
+            val = digits.lstrip('0') or ('0' if digits else '')
+        row[f] = val
+    return row
+
+
+def sort_key(row):
+    return (row['makeName'].lower(), row['model'].lower(), row['year'],
+            row['trim'].lower(), row['stock_number'], row['value'], row['mileage'])
+
+
+def canonical_rows(vehicles):
+    return sorted((normalize_row(v) for v in vehicles), key=sort_key)
+
+
+def row_key(row):
+    """Stock number when present, else the full normalized row."""
+    return row['stock_number'] or tuple(row[f] for f in FIELDS)
+
+
+def read_snapshot(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, newline='', encoding='utf-8') as f:
+        return [normalize_row(r) for r in csv.DictReader(f)]
+
+
+def compute_delta(old_rows, new_rows):
+    old = {row_key(r): r for r in old_rows}
+    new = {row_key(r): r for r in new_rows}
+    delta = {'added': [], 'removed': [], 'repriced': [], 'updated': []}
+    for k, r in new.items():
+        prev = old.get(k)
+        if prev is None:
+            delta['added'].append(r)
+            continue
+        if any(prev[f] != r[f] for f in PRICE_FIELDS):
+            delta['repriced'].append({
+                'stock_number': r['stock_number'],
+                'old_value': prev['value'], 'new_value': r['value'],
+                'old_sale': prev['sale_value'], 'new_sale': r['sale_value'],
+            })
+        changed = [f for f in FIELDS if f not in PRICE_FIELDS and prev[f] != r[f]]
+        if changed:
+            delta['updated'].append({'stock_number': r['stock_number'], 'fields': changed})
+    delta['removed'] = [r for k, r in old.items() if k not in new]
+    return delta
+
+
+def delta_is_empty(delta):
+    return not any(delta[k] for k in ('added', 'removed', 'repriced', 'updated'))
+
+
+def delta_path_for(path):
+    return os.path.splitext(path)[0] + '.delta.json'
+
+
+def write_inventory(vehicles, path, delta_path=None):
+    """
+    Write vehicles to path in canonical form if anything material changed.
+    Returns the delta dict (empty lists when nothing changed and nothing was written).
+    """
+    rows = canonical_rows(vehicles)
+    old_rows = read_snapshot(path)
+    delta = compute_delta(old_rows, rows)
+    if old_rows and delta_is_empty(delta) and len(old_rows) == len(rows):
+        logger.info("Inventory unchanged ({} rows) — {} left as is".format(len(rows), path))
+        return delta
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp, path)
+    logger.info("CSV saved: {} ({} rows; +{} -{} ~${} ~{})".format(
+        path, len(rows), len(delta['added']), len(delta['removed']),
+        len(delta['repriced']), len(delta['updated'])))
+
+    delta_path = delta_path or delta_path_for(path)
+    with open(delta_path, 'w', encoding='utf-8') as f:
+        json.dump(dict(delta, generated=datetime.now().isoformat(timespec='seconds')),
+                  f, indent=2, sort_keys=True)
+    return delta
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the dealer site: replays recorded pages or serves synthetic
+inventory, with latency, error, 403/429 and content-mutation injection.
+
+  # capture the live site into an archive (homepage, every results page, JSON API hits)
+  python3 src/script/mock_dealer.py record mock_archive/
+
+  # replay it, or serve 240 synthetic vehicles at 24 per page
+  python3 src/script/mock_dealer.py serve --archive mock_archive/
+  python3 src/script/mock_dealer.py serve --synthetic 240 --latency 150 --jitter 100 --p429 0.05
+
+  # point the scrapers at it
+  TOYOTA_BASE_URL=http://127.0.0.1:8780 python3 src/script/toyota_scrapper.py
+  TOYOTA_BASE_URL=http://127.0.0.1:8780 python3 api/scrape.py
+
+Serve options (all injection is seeded, so a run is reproducible):
+  --latency MS / --jitter MS   added to every response
+  --p500 / --p403 / --p429 P   probability of an injected error (429 carries Retry-After)
+  --require-cookie             results pages return 403 until the homepage has set a cookie
+  --mutate-prices P            change each $ amount with probability P (per request)
+  --json-api                   synthetic mode: also expose the inventory as JSON at /api/vehicles/used
+  --per-page N                 synthetic mode: cards per results page (default 24)
+  --lean-cards                 synthetic mode: cards without odometer and engine (detail pages have them)
+  --sitemap                    synthetic mode: robots.txt, a sitemap index and an inventory sitemap of
+                               detail pages with lastmod (XML responses carry an ETag and honour If-None-Match)
+
+GET /__mock/stats returns request and injection counters.
+
+Archive layout: manifest.json ({key: {"status", "content_type", "file"}}) plus
+gzipped bodies. Keys are the path without trailing slash plus the sorted query,
+with page=1 dropped, so /inventory/used/, /inventory/used and
+/inventory/used?page=1 are the same page.
+"""
+
+import os, re, json, gzip, time, random, hashlib, logging, argparse, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+from synthetic_inventory import synthetic_vehicles, render_page, render_vdp, render_sitemaps, vdp_path
+
+logger = logging.getLogger(__name__)
+
+HOST = os.environ.get("MOCK_DEALER_HOST", "127.0.0.1")
+PORT = int(os.environ.get("MOCK_DEALER_PORT", "8780"))
+INVENTORY_PATH = "/inventory/used"
+COOKIE = "__cf_bm=mock"
+JSON_API_PATH = "/api/vehicles/used"  # one of toyota_scrapper.API_CANDIDATES
+
+HOMEPAGE = """<!DOCTYPE html><html><head><title>Red Deer Toyota</title></head><body>
+<nav class="main-nav"><a href="/inventory/new/">New Inventory</a>
+<a href="/inventory/used/">Used Inventory</a></nav><h1>Welcome</h1></body></html>"""
+EMPTY_PAGE = """<!DOCTYPE html><html><body><section class="srp-results">
+<p>No vehicles found. No results match your search.</p></section></body></html>"""
+
+
+def request_key(path):
+    parts = urlsplit(path)
+    query = [(k, v) for k, v in parse_qsl(parts.query) if not (k == 'page' and v == '1')]
+    p = parts.path.rstrip('/') or '/'
+    return p + ('?' + urlencode(sorted(query)) if query else '')
+
+
+# -- archives ----------------------------------------------------------------
+
+class Archive:
+    def __init__(self, root):
+        self.root = root
+        self.entries = {}
+        path = os.path.join(root, 'manifest.json')
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.entries = json.load(f)
+
+    def get(self, key):
+        e = self.entries.get(key)
+        if e is None:
+            return None
+        with gzip.open(os.path.join(self.root, e['file']), 'rb') as f:
+            return e['status'], e['content_type'], f.read()
+
+    def put(self, key, status, content_type, body):
+        os.makedirs(self.root, exist_ok=True)
+        name = '{:03d}.body.gz'.format(len(self.entries))
+        with gzip.open(os.path.join(self.root, name), 'wb') as f:
+            f.write(body)
+        self.entries[key] = {'status': status, 'content_type': content_type, 'file': name}
+
+    def save(self):
+        with open(os.path.join(self.root, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, indent=2, sort_keys=True)
+
+
+class SyntheticSite:
+    """Archive-shaped view over synthetic inventory split into results pages."""
+
+    def __init__(self, count, per_page=24, seed=0, json_api=False, lean=False, sitemap=False):
+        self.vehicles = synthetic_vehicles(count, seed)
+        self.per_page = per_page
+        self.json_api = json_api
+        self.lean = lean
+        self.vdps = {vdp_path(v): v for v in self.vehicles}
+        self.sitemaps = render_sitemaps(self.vehicles) if sitemap else {}
+
+    def get(self, key):
+        parts = urlsplit(key)
+        if parts.path == '/':
+            return 200, 'text/html; charset=utf-8', HOMEPAGE.encode('utf-8')
+        if parts.path == INVENTORY_PATH:
+            page = int(dict(parse_qsl(parts.query)).get('page', '1') or 1)
+            chunk = self.vehicles[(page - 1) * self.per_page: page * self.per_page] if page > 0 else []
+            html = render_page(chunk, self.lean, len(self.vehicles)) if chunk else EMPTY_PAGE
+            return 200, 'text/html; charset=utf-8', html.encode('utf-8')
+        if parts.path == '/robots.txt' and self.sitemaps:
+            return 200, 'text/plain', b'User-agent: *\nDisallow: /api/\nSitemap: /sitemap.xml\n'
+        if parts.path in self.sitemaps:
+            return 200, 'application/xml', self.sitemaps[parts.path].encode('utf-8')
+        if parts.path in self.vdps:
+            return 200, 'text/html; charset=utf-8', render_vdp(self.vdps[parts.path]).encode('utf-8')
+        if self.json_api and parts.path == JSON_API_PATH:
+            return 200, 'application/json', json.dumps({'vehicles': [
+                {'make': v['makeName'], 'year': v['year'], 'model': v['model'], 'trim': v['trim'],
+                 'mileage': v['mileage'], 'price': v['value'], 'salePrice': v['sale_value'],
+                 'stockNumber': v['stock_number'], 'engine': v['engine'], 'vdpUrl': vdp_path(v)}
+                for v in self.vehicles]}).encode('utf-8')
+        return None
+
+
+def record(base, out, max_pages=10):
+    """Capture the live site: homepage, results pages until an empty one, JSON API candidates."""
+    import toyota_scrapper as scraper
+
+    base = base.rstrip('/')
+    session = scraper.make_session(base + INVENTORY_PATH + '/')
+    archive = Archive(out)
+
+    def fetch(path, referer=None):
+        try:
+            resp = session.get(base + path, timeout=30, headers={'Referer': referer} if referer else None)
+        except Exception as e:
+            logger.warning("Record {} failed: {}".format(path, e))
+            return None
+        archive.put(request_key(path), resp.status_code,
+                    resp.headers.get('Content-Type', 'text/html'), resp.content)
+        logger.info("Recorded {} -> {} ({} bytes)".format(path, resp.status_code, len(resp.content)))
+        return resp
+
+    fetch('/')
+    for page in range(1, max_pages + 1):
+        resp = fetch('{}/?page={}'.format(INVENTORY_PATH, page), referer=base + '/')
+        if resp is None or resp.status_code != 200 or \
+                not re.search(r'\b(19[89]\d|20[0-2]\d)\b', resp.text):
+            break
+        time.sleep(0.5)
+    for path in scraper.API_CANDIDATES:
+        try:
+            resp = session.get(base + path, timeout=15)
+        except Exception:
+            continue
+        if resp.status_code == 200 and 'json' in resp.headers.get('Content-Type', ''):
+            archive.put(request_key(path), 200, resp.headers['Content-Type'], resp.content)
+            logger.info("Recorded API {}".format(path))
+    archive.save()
+    logger.info("Archive: {} ({} entries)".format(out, len(archive.entries)))
+    return archive
+
+
+# -- server ------------------------------------------------------------------
+
+class Faults:
+    def __init__(self, latency_ms=0, jitter_ms=0, p500=0.0, p403=0.0, p429=0.0,
+                 mutate_prices=0.0, require_cookie=False, seed=0):
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.p500, self.p403, self.p429 = p500, p403, p429
+        self.mutate_prices = mutate_prices
+        self.require_cookie = require_cookie
+        self._rnd = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'served': 0, 'not_found': 0, 'injected_500': 0,
+                      'injected_403': 0, 'injected_429': 0, 'cookie_403': 0, 'mutated': 0}
+
+    def delay(self):
+        with self._lock:
+            return self.latency + self._rnd.random() * self.jitter
+
+    def draw(self):
+        with self._lock:
+            return self._rnd.random(), self._rnd.random(), self._rnd.random()
+
+    def bump(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def mutate(self, body):
+        if self.mutate_prices <= 0:
+            return body
+        with self._lock:
+            rnd = random.Random(self._rnd.random())
+
+        def change(m):
+            if rnd.random() >= self.mutate_prices:
+                return m.group(0)
+            price = int(m.group(1).replace(',', '')) + rnd.choice((-1, 1)) * rnd.randrange(250, 2001, 250)
+            return '${:,}'.format(max(price, 3000))
+        text, n = re.subn(r'\$([0-9]{1,3}(?:,[0-9]{3})+)', change, body.decode('utf-8', 'replace'))
+        if n:
+            self.bump('mutated')
+        return text.encode('utf-8')
+
+
+def make_handler(source, faults):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, status, content_type, body, headers=None):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.startswith('/__mock/stats'):
+                return self._send(200, 'application/json', json.dumps(faults.stats).encode('utf-8'))
+            faults.bump('requests')
+            if faults.latency or faults.jitter:
+                time.sleep(faults.delay())
+            r500, r403, r429 = faults.draw()
+            if r500 < faults.p500:
+                faults.bump('injected_500')
+                return self._send(500, 'text/html', b'<h1>500 Internal Server Error</h1>')
+            if r429 < faults.p429:
+                faults.bump('injected_429')
+                return self._send(429, 'text/html', b'<h1>Too Many Requests</h1>', {'Retry-After': '2'})
+            if r403 < faults.p403:
+                faults.bump('injected_403')
+                return self._send(403, 'text/html', b'<h1>Access denied</h1>')
+
+            key = request_key(self.path)
+            headers = {}
+            if faults.require_cookie:
+                if key == '/':
+                    headers['Set-Cookie'] = COOKIE + '; Path=/'
+                elif urlsplit(key).path == INVENTORY_PATH and COOKIE not in (self.headers.get('Cookie') or ''):
+                    faults.bump('cookie_403')
+                    return self._send(403, 'text/html', b'<h1>Checking your browser</h1>')
+            hit = source.get(key)
+            if hit is None:
+                faults.bump('not_found')
+                return self._send(404, 'text/html', b'<h1>Not Found</h1>')
+            status, content_type, body = hit
+            if 'html' in content_type or 'json' in content_type:
+                body = faults.mutate(body)
+            if 'xml' in content_type:
+                headers['ETag'] = '"{}"'.format(hashlib.md5(body).hexdigest()[:16])
+                if self.headers.get('If-None-Match') == headers['ETag']:
+                    faults.bump('served')
+                    return self._send(304, content_type, b'', headers)
+            faults.bump('served')
+            self._send(status, content_type, body, headers)
+
+        def log_message(self, fmt, *args):
+            logger.debug("HTTP %s - %s", self.address_string(), fmt % args)
+
+    return Handler
+
+
+def serve(source, faults, host=HOST, port=PORT):
+    server = ThreadingHTTPServer((host, port), make_handler(source, faults))
+    server.daemon_threads = True
+    logger.info("Mock dealer on http://{}:{}".format(host, server.server_address[1]))
+    return server
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    ap = argparse.ArgumentParser(description="Local mock of the dealer site")
+    sub = ap.add_subparsers(dest='cmd', required=True)
+    rec = sub.add_parser('record', help='capture the live site into an archive')
+    rec.add_argument('out')
+    rec.add_argument('--base', default='https://www.reddeertoyota.com')
+    rec.add_argument('--pages', type=int, default=10)
+    srv = sub.add_parser('serve', help='replay an archive or serve synthetic inventory')
+    srv.add_argument('--archive')
+    srv.add_argument('--synthetic', type=int, default=0, help='number of synthetic vehicles')
+    srv.add_argument('--per-page', type=int, default=24)
+    srv.add_argument('--json-api', action='store_true')
+    srv.add_argument('--lean-cards', action='store_true', help='cards without odometer and engine')
+    srv.add_argument('--sitemap', action='store_true', help='robots.txt and sitemaps listing detail pages')
+    srv.add_argument('--host', default=HOST)
+    srv.add_argument('--port', type=int, default=PORT)
+    srv.add_argument('--latency', type=float, default=0, help='ms')
+    srv.add_argument('--jitter', type=float, default=0, help='ms')
+    srv.add_argument('--p500', type=float, default=0)
+    srv.add_argument('--p403', type=float, default=0)
+    srv.add_argument('--p429', type=float, default=0)
+    srv.add_argument('--mutate-prices', type=float, default=0)
+    srv.add_argument('--require-cookie', action='store_true')
+    srv.add_argument('--seed', type=int, default=0)
+    args = ap.parse_args(argv)
+
+    if args.cmd == 'record':
+        record(args.base, args.out, args.pages)
+        return 0
+
+    if args.archive:
+        source = Archive(args.archive)
+        if not source.entries:
+            logger.error("Empty or missing archive: {}".format(args.archive))
+            return 1
+    else:
+        source = SyntheticSite(args.synthetic or 240, args.per_page, args.seed, args.json_api,
+                               args.lean_cards, args.sitemap)
+    faults = Faults(args.latency, args.jitter, args.p500, args.p403, args.p429,
+                    args.mutate_prices, args.require_cookie, args.seed)
+    server = serve(source, faults, args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Shutting down... {}".format(json.dumps(faults.stats)))
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
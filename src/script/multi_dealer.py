@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Multi-dealer orchestrator
+Scrapes every dealer in the registry (dealers.json, or TOYOTA_DEALERS) concurrently
+and writes one inventory per dealer plus a merged feed with a `dealer` column.
+
+  python3 src/script/multi_dealer.py [dealer_id ...]
+
+Concurrency is bounded at three levels:
+  TOYOTA_MAX_DEALERS    dealers in flight at once (default 4)
+  TOYOTA_MAX_BROWSERS   Chromium instances at once, across all dealers (default 2)
+  TOYOTA_MAX_HTTP       JSON API requests at once, across all dealers (default 8)
+  TOYOTA_HOST_INTERVAL  minimum seconds between JSON requests to one host (default 0)
+
+Registry entries: {"id", "name", "base", "inventory_path", "api_url", "output",
+"api_candidates"}; output defaults to public/data/dealers/<id>/inventory.csv.
+
+Dealers that fail, come back empty or are not named on the command line keep
+their last published inventory in the merged feed, which is only rewritten
+when its rows change.
+"""
+
+import io, os, sys, csv, json, time, logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import toyota_scrapper as scraper
+from inventory_output import FIELDS, canonical_rows, read_snapshot
+
+logger = logging.getLogger(__name__)
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, '..', '..'))
+DEALERS_FILE = os.environ.get("TOYOTA_DEALERS", os.path.join(SCRIPT_DIR, 'dealers.json'))
+MAX_DEALERS = int(os.environ.get("TOYOTA_MAX_DEALERS", "4"))
+MERGED_PATH = os.path.join(PROJECT_ROOT, 'public', 'data', 'all_dealers.csv')
+
+
+def load_registry(path=DEALERS_FILE):
+    with open(path, encoding='utf-8') as f:
+        cfg = json.load(f)
+    sites = []
+    for entry in cfg.get('dealers', []):
+        entry = dict(entry)
+        entry.setdefault('output', os.path.join('public', 'data', 'dealers', entry['id'], 'inventory.csv'))
+        sites.append(scraper.Site.from_config(entry, PROJECT_ROOT))
+    return sites
+
+
+def scrape_dealer(site):
+    started = time.time()
+    vehicles = scraper.run_scrape(site=site)
+    if vehicles:
+        scraper.publish(vehicles, site.output, site=site)
+    scraper.finish_run(vehicles, site=site)
+    logger.info("[{}] {} vehicles in {:.1f}s".format(site.dealer_id, len(vehicles), time.time() - started))
+    return vehicles
+
+
+def write_merged(results, path=MERGED_PATH):
+    """
+    results: {dealer_id: vehicles}. Rows are canonical per dealer, dealers in id
+    order, so an unchanged feed is byte-identical and left as is. Returns whether
+    the file was written.
+    """
+    buf = io.StringIO(newline='')
+    writer = csv.DictWriter(buf, fieldnames=['dealer'] + FIELDS)
+    writer.writeheader()
+    for dealer_id in sorted(results):
+        for row in canonical_rows(results[dealer_id]):
+            writer.writerow(dict(row, dealer=dealer_id))
+    data = buf.getvalue()
+    try:
+        with open(path, newline='', encoding='utf-8') as f:
+            if f.read() == data:
+                logger.info("Merged feed unchanged ({} dealers) — {} left as is".format(len(results), path))
+                return False
+    except OSError:
+        pass
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'w', newline='', encoding='utf-8') as f:
+        f.write(data)
+    os.replace(tmp, path)
+    logger.info("Merged feed: {} ({} dealers)".format(path, len(results)))
+    return True
+
+
+def with_published(results, sites):
+    """
+    results plus, for every other dealer in the registry, its last published CSV:
+    one failed or skipped scrape must not drop a dealer from the merged feed.
+    """
+    merged = dict(results)
+    for site in sites:
+        if site.dealer_id in merged or not site.output:
+            continue
+        rows = read_snapshot(site.output)
+        if rows:
+            logger.info("[{}] not scraped this run, merging its last published {} vehicles".format(
+                site.dealer_id, len(rows)))
+            merged[site.dealer_id] = rows
+    return merged
+
+
+def run_all(sites, max_dealers=MAX_DEALERS):
+    results, failed = {}, []
+    with ThreadPoolExecutor(max_workers=max(1, max_dealers), thread_name_prefix='dealer') as pool:
+        futures = {pool.submit(scrape_dealer, site): site for site in sites}
+        for fut in as_completed(futures):
+            site = futures[fut]
+            try:
+                vehicles = fut.result()
+            except Exception as e:
+                logger.error("[{}] scrape failed: {}".format(site.dealer_id, e))
+                vehicles = []
+            if vehicles:
+                results[site.dealer_id] = vehicles
+            else:
+                failed.append(site.dealer_id)
+    return results, failed
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    registry = sites = load_registry()
+    if argv:
+        sites = [s for s in sites if s.dealer_id in argv]
+    if not sites:
+        logger.error("No dealers to scrape (registry: {})".format(DEALERS_FILE))
+        return 1
+    logger.info("Scraping {} dealers (max {} at once)".format(len(sites), MAX_DEALERS))
+    results, failed = run_all(sites)
+    merged = with_published(results, registry)
+    if merged:
+        write_merged(merged)
+    for dealer_id in failed:
+        logger.warning("[{}] no vehicles".format(dealer_id))
+    return 0 if results and not failed else 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Cross-run cache of parsed results pages and cards, keyed by content (SQLite).
+
+The dealer's rendered pages carry no ETag or Last-Modified, so every run
+downloads and re-parses HTML that mostly has not changed. This cache
+remembers what the extractor made of it, at two levels:
+
+  page  hash of the page HTML with scripts, styles, comments and whitespace
+        runs taken out (they differ per request and never reach a card) ->
+        the page's vehicles; a hit skips BeautifulSoup altogether
+  card  hash of one card's text, data-* attributes and link -> its vehicle;
+        in a changed page, only the cards that changed are parsed
+
+Every entry carries the version stamp of the code and vocabulary that produced
+it (see code_version; toyota_scrapper stamps the card parsers, CAR_MAKES,
+TRIM_PATTERNS and CARD_SELECTORS). Entries from another version are dropped
+the first time the cache is opened. Past TOYOTA_PARSE_CACHE_MB, the least
+recently used entries are evicted.
+
+  TOYOTA_PARSE_CACHE     path (default ~/.local/share/red-deer-toyota/parse_cache.sqlite, "off" disables)
+  TOYOTA_PARSE_CACHE_MB  size cap (default 64)
+
+  python3 src/script/parse_cache.py stats
+  python3 src/script/parse_cache.py clear
+"""
+
+import os, re, sys, json, time, sqlite3, hashlib, inspect, logging, threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB = os.path.join(os.path.expanduser("~"), ".local", "share", "red-deer-toyota", "parse_cache.sqlite")
+CACHE_DB = os.environ.get("TOYOTA_PARSE_CACHE", DEFAULT_DB)
+MAX_BYTES = int(float(os.environ.get("TOYOTA_PARSE_CACHE_MB", "64")) * 1024 * 1024)
+
+LEVELS = ('page', 'card')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS parsed (
+    kind       TEXT NOT NULL,     -- 'page' or 'card'
+    key        TEXT NOT NULL,
+    version    TEXT NOT NULL,
+    value      TEXT NOT NULL,     -- JSON: a vehicle (card) or a list of them (page)
+    size       INTEGER NOT NULL,
+    last_used  REAL NOT NULL,
+    PRIMARY KEY (kind, key)
+);
+CREATE INDEX IF NOT EXISTS parsed_last_used ON parsed (last_used);
+"""
+
+# Per-request noise that never reaches a card: inline scripts (nonces, tracking
+# ids, timestamps), styles and comments. get_text() skips them too.
+_NOISE_RE = re.compile(r'<script\b.*?</script\s*>|<style\b.*?</style\s*>|<!--.*?-->', re.IGNORECASE | re.DOTALL)
+_SPACE_RE = re.compile(r'\s+')
+
+
+def _digest(data):
+    return hashlib.blake2b(data.encode('utf-8', 'surrogatepass'), digest_size=16).hexdigest()
+
+
+def page_key(html):
+    return _digest(_SPACE_RE.sub(' ', _NOISE_RE.sub('', html)))
+
+
+def card_key(text, attrs, link):
+    return _digest(json.dumps([text, sorted((attrs or {}).items()), link or ''], separators=(',', ':')))
+
+
+def code_version(*parts):
+    """
+    Stamp for a set of functions/modules (their source) and plain values
+    (JSON, sets sorted). Any edit to one of them gives a new stamp.
+    """
+    h = hashlib.blake2b(digest_size=8)
+    for part in parts:
+        if inspect.isfunction(part) or inspect.ismodule(part):
+            try:
+                data = inspect.getsource(part)
+            except (OSError, TypeError):
+                data = repr(getattr(part, '__code__', part))
+        else:
+            data = json.dumps(part, sort_keys=True, default=sorted)
+        h.update(data.encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+class ParseCache:
+    """One SQLite connection shared by the scraper's threads; get/put are no-ops when disabled."""
+
+    def __init__(self, path, version=None, max_bytes=MAX_BYTES, levels=LEVELS):
+        self.path = None if not path or path.lower() == 'off' else path
+        self.version = version
+        self.max_bytes = max_bytes
+        self.levels = frozenset(levels)
+        self.hits = dict.fromkeys(LEVELS, 0)
+        self.misses = dict.fromkeys(LEVELS, 0)
+        self._conn = None
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, version):
+        return cls(CACHE_DB, version)
+
+    def _connect(self):
+        """
+        The shared connection, opened on first use. Entries from other versions
+        are purged then, unless version is None (the CLI only inspects).
+        """
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            gone = 0
+            if self.version is not None:
+                with conn:
+                    gone = conn.execute("DELETE FROM parsed WHERE version != ?", (self.version,)).rowcount
+            if gone:
+                logger.info("Parse cache: extractor changed, dropped {} entries".format(gone))
+            self._size = conn.execute("SELECT COALESCE(SUM(size), 0) FROM parsed").fetchone()[0]
+            self._conn = conn
+        return self._conn
+
+    def get(self, kind, keys):
+        """{key: value} for the keys that are cached at this level."""
+        if not self.path or kind not in self.levels or not keys:
+            return {}
+        keys = list(dict.fromkeys(keys))
+        out = {}
+        try:
+            with self._lock:
+                conn = self._connect()
+                for i in range(0, len(keys), 500):
+                    chunk = keys[i:i + 500]
+                    rows = conn.execute("SELECT key, value FROM parsed WHERE kind = ? AND key IN ({})".format(
+                        ",".join("?" * len(chunk))), [kind] + chunk)
+                    out.update((key, json.loads(value)) for key, value in rows)
+                if out:
+                    with conn:
+                        conn.executemany("UPDATE parsed SET last_used = ? WHERE kind = ? AND key = ?",
+                                         [(time.time(), kind, key) for key in out])
+                self.hits[kind] += len(out)
+                self.misses[kind] += len(keys) - len(out)
+        except sqlite3.Error as e:
+            logger.warning("Parse cache unavailable: {}".format(e))
+            return {}
+        return out
+
+    def put(self, kind, items):
+        """Store {key: vehicle or list of vehicles}, then evict down to the size cap if it was passed."""
+        if not self.path or kind not in self.levels or not items:
+            return
+        now = time.time()
+        rows = []
+        for key, value in items.items():
+            data = json.dumps(value, default=dict, separators=(',', ':'))
+            rows.append((kind, key, self.version, data, len(data) + len(key), now))
+        try:
+            with self._lock:
+                conn = self._connect()
+                with conn:
+                    conn.executemany("INSERT OR REPLACE INTO parsed (kind, key, version, value, size, last_used)"
+                                     " VALUES (?, ?, ?, ?, ?, ?)", rows)
+                self._size += sum(r[4] for r in rows)
+                if self._size > self.max_bytes:
+                    self._evict(conn)
+        except sqlite3.Error as e:
+            logger.warning("Parse cache not written: {}".format(e))
+
+    def _evict(self, conn):
+        """Drop least recently used entries until the cache is under 90% of the cap."""
+        self._size = conn.execute("SELECT COALESCE(SUM(size), 0) FROM parsed").fetchone()[0]
+        excess = self._size - int(self.max_bytes * 0.9)
+        if excess <= 0:
+            return
+        doomed, freed = [], 0
+        for kind, key, size in conn.execute("SELECT kind, key, size FROM parsed ORDER BY last_used"):
+            doomed.append((kind, key))
+            freed += size
+            if freed >= excess:
+                break
+        with conn:
+            conn.executemany("DELETE FROM parsed WHERE kind = ? AND key = ?", doomed)
+        self._size -= freed
+        logger.info("Parse cache: evicted {} entries ({:.1f} MB)".format(len(doomed), freed / 1048576.0))
+
+    def counters(self):
+        with self._lock:
+            return {'hits': dict(self.hits), 'misses': dict(self.misses)}
+
+    def stats(self):
+        if not self.path or not os.path.exists(self.path):
+            return []
+        with self._lock:
+            conn = self._connect()
+            return conn.execute("SELECT kind, version, COUNT(*), SUM(size), MIN(last_used) FROM parsed"
+                                " GROUP BY kind, version ORDER BY kind").fetchall()
+
+    def clear(self):
+        if not self.path or not os.path.exists(self.path):
+            return 0
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                n = conn.execute("DELETE FROM parsed").rowcount
+            conn.execute("VACUUM")
+            self._size = 0
+        return n
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['stats']:
+        cache = ParseCache(CACHE_DB)
+        print("{:<5} {:<16} {:>8} {:>9}  {}".format('kind', 'version', 'entries', 'MB', 'oldest use'))
+        for kind, version, n, size, oldest in cache.stats():
+            print("{:<5} {:<16} {:>8} {:>9.2f}  {}".format(
+                kind, version, n, size / 1048576.0, time.strftime('%Y-%m-%d %H:%M', time.localtime(oldest))))
+        return 0
+    if argv[:1] == ['clear']:
+        print("Removed {} entries".format(ParseCache(CACHE_DB).clear()))
+        return 0
+    print(__doc__.strip().splitlines()[-2].strip())
+    print(__doc__.strip().splitlines()[-1].strip())
+    return 2
+
+
+if __name__ == "__main__":
+    exit(main())
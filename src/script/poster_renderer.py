@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Batch A4 poster renderer (vector PDF, no browser).
+
+Renders the same classic layout as VehiclePoster.js straight from the inventory
+records: logo, "YEAR MAKE MODEL", info box, price block, disclaimer. Text is
+vector, so each poster is a few KB instead of a rasterized 2x PNG.
+
+Each poster is named by a hash of its poster-relevant fields (plus the template
+version and logo), so after a scrape only new or repriced vehicles are rendered.
+Renders run in parallel across cores.
+
+  python3 src/script/poster_renderer.py [inventory.csv] [out_dir]
+
+Requires: pip install reportlab
+"""
+
+import os, re, csv, sys, json, hashlib, logging
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_VERSION = "classic-1"
+POSTER_FIELDS = ['makeName', 'year', 'model', 'trim', 'mileage', 'value', 'sale_value',
+                 'stock_number', 'engine']
+MANIFEST = 'posters.json'
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, '..', '..'))
+LOGO_PATH = os.path.join(PROJECT_ROOT, 'public', 'red-deer-logo.png')
+DEFAULT_OUT = os.environ.get("TOYOTA_POSTER_DIR", os.path.join(PROJECT_ROOT, 'public', 'posters'))
+
+# CSS px on the 794px-wide web poster -> PDF points on a 595pt-wide A4 page
+PX = 595.0 / 794.0
+
+
+def _digits(val):
+    return re.sub(r'[^\d]', '', str(val or ''))
+
+
+def _money(val):
+    d = _digits(val)
+    return "${:,}".format(int(d)) if d else ''
+
+
+def has_sale(v):
+    sale, value = _digits(v.get('sale_value')), _digits(v.get('value'))
+    return bool(sale) and (not value or int(sale) < int(value))
+
+
+def _logo_digest():
+    try:
+        with open(LOGO_PATH, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()[:12]
+    except OSError:
+        return ''
+
+
+def poster_hash(v, logo_digest=''):
+    payload = [TEMPLATE_VERSION, logo_digest] + [str(v.get(f, '') or '').strip() for f in POSTER_FIELDS]
+    return hashlib.sha256(json.dumps(payload).encode('utf-8')).hexdigest()[:12]
+
+
+def poster_filename(v, digest):
+    name = "{}-{}-{}".format(v.get('makeName') or 'vehicle', v.get('year') or '', v.get('model') or '')
+    name = re.sub(r'[^a-z0-9-]', '', re.sub(r'\s+', '-', name).lower()).strip('-') or 'poster'
+    stock = re.sub(r'[^A-Za-z0-9]', '', str(v.get('stock_number', '') or ''))
+    return "{}{}-{}.pdf".format(stock + '-' if stock else '', name, digest)
+
+
+def prepare_logo(out_dir, logo_digest):
+    """
+    Downscale the 3675px source logo once to print resolution (~300 dpi at its
+    poster size) so each PDF embeds a small image instead of the full original.
+    """
+    if not logo_digest:
+        return None
+    path = os.path.join(out_dir, '.logo-{}.png'.format(logo_digest))
+    if os.path.exists(path):
+        return path
+    try:
+        from PIL import Image
+        with Image.open(LOGO_PATH) as im:
+            im = im.convert('RGBA')
+            w = 800
+            im.resize((w, max(1, round(im.height * w / float(im.width)))), Image.LANCZOS).save(path, optimize=True)
+        return path
+    except Exception as e:
+        logger.debug("Logo downscale failed, using original: {}".format(e))
+        return LOGO_PATH
+
+
+def render_poster(v, path, logo_path=LOGO_PATH):
+    """Draw one A4 poster to path. Runs in a worker process."""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.colors import HexColor
+    from reportlab.pdfgen import canvas
+
+    width, height = A4
+    c = canvas.Canvas(path, pagesize=A4, pageCompression=1)
+    c.setTitle("{} {} {}".format(v.get('year', ''), v.get('makeName', ''), v.get('model', '')).strip())
+    cx = width / 2.0
+    y = height - 40
+
+    def centered(text, size, color='#000000', font='Helvetica-Bold', gap=1.15):
+        nonlocal y
+        # Shrink long lines to fit the page margins
+        while size > 10 and c.stringWidth(text, font, size) > width - 60:
+            size -= 2
+        y -= size * gap
+        c.setFillColor(HexColor(color))
+        c.setFont(font, size)
+        c.drawCentredString(cx, y, text)
+        return size
+
+    # Logo centered (250px wide on the web poster)
+    try:
+        from reportlab.lib.utils import ImageReader
+        logo = ImageReader(logo_path)
+        iw, ih = logo.getSize()
+        lw = 250 * PX
+        lh = lw * ih / float(iw)
+        y -= lh
+        c.drawImage(logo, cx - lw / 2, y, lw, lh, mask='auto')
+    except Exception as e:
+        logger.debug("Logo not drawn: {}".format(e))
+
+    title = "{}{} {}".format(v.get('year', '') + ' ' if v.get('year') else '',
+                             v.get('makeName', ''), v.get('model', '')).strip()
+    centered(title, 88 * PX, gap=1.3)
+
+    # Info box
+    mileage = _digits(v.get('mileage'))
+    lines = [
+        ("Trim:", v.get('trim') or '—'),
+        ("Condition:", "Used"),
+        ("Stock #:", v.get('stock_number') or '—'),
+        ("Odometer:", "{:,} km".format(int(mileage)) if mileage else '—'),
+        ("Engine:", v.get('engine') or '—'),
+    ]
+    line_size = 32 * PX
+    box_h = len(lines) * line_size * 1.35 + 24
+    y -= 20
+    c.setFillColor(HexColor('#fdeae8'))
+    c.roundRect(40, y - box_h, width - 80, box_h, 10, stroke=0, fill=1)
+    y -= 12
+    for label, value in lines:
+        centered("{} {}".format(label, value).replace('—', '-'), line_size, gap=1.35)
+    y -= 24
+
+    # Price block
+    price = _money(v.get('value'))
+    if has_sale(v):
+        centered("PRICE:", 34 * PX, gap=1.4)
+        size = centered(price, 76 * PX, color='#6b7280')
+        w = c.stringWidth(price, 'Helvetica-Bold', size)
+        c.setStrokeColor(HexColor('#ef4444'))
+        c.setLineWidth(4)
+        c.line(cx - w / 2, y + size * 0.15, cx + w / 2, y + size * 0.55)
+        centered("NEW PRICE", 34 * PX, color='#991b1b', gap=1.6)
+        centered(_money(v.get('sale_value')), 150 * PX, color='#b91c1c', gap=1.0)
+    else:
+        centered("PRICE:", 34 * PX, gap=1.4)
+        centered(price or '-', 114 * PX)
+
+    c.setFillColor(HexColor('#000000'))
+    c.setFont('Helvetica-Bold', 20 * PX)
+    c.drawCentredString(cx, 40, "Price Does not include GST.")
+    c.showPage()
+    c.save()
+    return path
+
+
+def _render_job(args):
+    v, path, logo_path = args
+    tmp = path + '.tmp'
+    render_poster(v, tmp, logo_path)
+    os.replace(tmp, path)
+    return path
+
+
+def render_all(vehicles, out_dir=DEFAULT_OUT, workers=None):
+    """
+    Render posters for every vehicle whose poster hash is not already on disk.
+    Writes out_dir/posters.json (stock/key -> filename) and removes the PDFs the
+    previous manifest listed that this one does not; other files in out_dir are
+    left alone. Returns (rendered_count, manifest).
+    """
+    try:
+        import reportlab  # noqa: F401
+    except ImportError:
+        logger.error("reportlab not installed. Run: pip install reportlab")
+        return 0, {}
+
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, MANIFEST)
+    try:
+        with open(manifest_path, encoding='utf-8') as f:
+            previous = set(json.load(f).values())
+    except (OSError, ValueError):
+        previous = set()
+    logo_digest = _logo_digest()
+    logo_path = prepare_logo(out_dir, logo_digest)
+    manifest, jobs = {}, []
+    for v in vehicles:
+        name = poster_filename(v, poster_hash(v, logo_digest))
+        key = str(v.get('stock_number', '') or '').strip() or name
+        manifest[key] = name
+        path = os.path.join(out_dir, name)
+        if not os.path.exists(path):
+            jobs.append((dict(v), path, logo_path))
+
+    if jobs:
+        if len(jobs) == 1 or workers == 1:
+            for job in jobs:
+                _render_job(job)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(_render_job, jobs, chunksize=max(1, len(jobs) // ((workers or os.cpu_count() or 1) * 4))))
+    logger.info("Posters: {} rendered, {} cached ({})".format(
+        len(jobs), len(manifest) - len(jobs), out_dir))
+
+    stale = previous - set(manifest.values())
+    for name in os.listdir(out_dir):
+        if name in stale or \
+                (name.startswith('.logo-') and logo_path and name != os.path.basename(logo_path)):
+            os.remove(os.path.join(out_dir, name))
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return len(jobs), manifest
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    argv = sys.argv[1:] if argv is None else argv
+    csv_path = argv[0] if argv else os.path.join(PROJECT_ROOT, 'public', 'data', 'inventory.csv')
+    out_dir = argv[1] if len(argv) > 1 else DEFAULT_OUT
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        vehicles = list(csv.DictReader(f))
+    rendered, manifest = render_all(vehicles, out_dir)
+    print("{} posters ({} rendered) in {}".format(len(manifest), rendered, out_dir))
+    return 0 if manifest else 1
+
+
+if __name__ == "__main__":
+    exit(main())
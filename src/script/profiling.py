@@ -0,0 +1,275 @@
+"""
+Opt-in, stage-scoped profiling for scraper runs.
+
+  TOYOTA_PROFILE           off (default) or a comma list of:
+                             cpu       sampling profiler -> collapsed stacks (flamegraph.pl / speedscope)
+                             cprofile  deterministic cProfile per stage -> .pstats + top-N text
+                             mem       tracemalloc -> top-N allocation sites and peak per stage
+  TOYOTA_PROFILE_DIR       output root (default ./profiles); each run gets a timestamped folder
+  TOYOTA_PROFILE_INTERVAL  sampling interval in ms (default 5)
+  TOYOTA_PROFILE_TOP       rows per report (default 25)
+
+Work is attributed to stages (discovery, browser, parse, dedup, write). Stages
+entered with cpu=False (network discovery, the browser session) are timed and
+allocation-tracked, but the CPU profilers only look at the CPU-bound stages
+nested inside them, so Playwright and socket waits don't drown the picture.
+Stages are per thread and nest; the innermost stage owns a sample.
+
+When profiling is off, stage() returns a shared no-op context manager.
+"""
+
+import os, sys, time, pstats, cProfile, logging, threading, tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+_SELF = os.path.abspath(__file__).rstrip('c')
+
+
+class _NoStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_STAGE = _NoStage()
+
+
+class StageProfiler:
+    def __init__(self, modes=(), root="profiles", interval_ms=5.0, top=25):
+        self.modes = set(m.strip().lower() for m in modes if m.strip()) - {'off'}
+        self.root = root
+        self.interval = max(0.001, interval_ms / 1000.0)
+        self.top = top
+        self.running = False
+        self.run_dir = None
+        self._lock = threading.Lock()
+        self._stacks = {}        # thread id -> [(stage, cpu), ...]
+        self._samples = {}       # collapsed stack -> count
+        self._profiles = {}      # stage -> pstats.Stats merged across calls and threads
+        self._mem_open = []      # [frame dict] for open stages, any thread
+        self._mem = {}           # stage -> {'calls', 'peak', 'sites': {(file, line): [size, count]}}
+        self._wall = {}          # stage -> [calls, seconds]
+        self._sampler = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(modes=os.environ.get("TOYOTA_PROFILE", "off").split(','),
+                   root=os.environ.get("TOYOTA_PROFILE_DIR", "profiles"),
+                   interval_ms=float(os.environ.get("TOYOTA_PROFILE_INTERVAL", "5")),
+                   top=int(os.environ.get("TOYOTA_PROFILE_TOP", "25")))
+
+    @property
+    def enabled(self):
+        return bool(self.modes)
+
+    def set_modes(self, modes):
+        if not self.running:
+            self.modes = set(m.strip().lower() for m in modes.split(',') if m.strip()) - {'off'}
+
+    # -- lifecycle ---------------------------------------------------------
+
+    def start(self):
+        if not self.enabled or self.running:
+            return
+        self.running = True
+        self.run_dir = os.path.join(self.root, datetime.now().strftime("%Y%m%d_%H%M%S"))
+        if 'mem' in self.modes and not tracemalloc.is_tracing():
+            tracemalloc.start(1)  # reports group by line; deeper tracebacks only slow the snapshots
+        if 'cpu' in self.modes:
+            self._sampler = threading.Thread(target=self._sample_loop, name='profiler-sampler', daemon=True)
+            self._sampler.start()
+        logger.info("Profiling ({}) -> {}".format(",".join(sorted(self.modes)), self.run_dir))
+
+    def stop(self):
+        """Stop sampling/tracing and write the reports. Returns the run folder."""
+        if not self.running:
+            return None
+        self.running = False
+        if self._sampler is not None:
+            self._sampler.join()
+            self._sampler = None
+        if 'mem' in self.modes and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        try:
+            self._write_reports()
+        except OSError as e:
+            logger.warning("Profile not written: {}".format(e))
+            return None
+        logger.info("Profile written: {}".format(self.run_dir))
+        return self.run_dir
+
+    # -- stages --------------------------------------------------------------
+
+    def stage(self, name, cpu=True):
+        """Attribute work inside the block to stage `name`; cpu=False for wait-dominated stages."""
+        if not self.running:
+            return _NO_STAGE
+        return self._stage(name, cpu)
+
+    @contextmanager
+    def _stage(self, name, cpu):
+        tid = threading.get_ident()
+        stack = self._stacks.setdefault(tid, [])
+        outer_cpu = stack[-1][1] if stack else False
+        # Snapshot bookkeeping is the profiler's own work: keep it out of the CPU picture
+        stack.append(('profiler', False))
+        frame = self._mem_enter(name) if 'mem' in self.modes else None
+        stack[-1] = (name, cpu)
+        prof = None
+        if cpu and 'cprofile' in self.modes and not outer_cpu:
+            # cProfile hooks only the current thread; nested cpu stages stay in the outer profile
+            prof = cProfile.Profile()
+            try:
+                prof.enable()
+            except ValueError:  # 3.12+: another thread's profile is active (sys.monitoring is global)
+                prof = None
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            elapsed = time.perf_counter() - start
+            if prof is not None:
+                prof.disable()
+            stack[-1] = ('profiler', False)
+            if frame is not None:
+                self._mem_exit(frame)
+            if prof is not None:
+                with self._lock:
+                    if name in self._profiles:
+                        self._profiles[name].add(prof)
+                    else:
+                        self._profiles[name] = pstats.Stats(prof)
+            stack.pop()
+            with self._lock:
+                w = self._wall.setdefault(name, [0, 0.0])
+                w[0] += 1
+                w[1] += elapsed
+
+    # -- cpu sampling --------------------------------------------------------
+
+    def _sample_loop(self):
+        me = threading.get_ident()
+        while self.running:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            for tid, stack in list(self._stacks.items()):
+                try:
+                    stage, cpu = stack[-1]
+                except IndexError:  # the thread just left its last stage
+                    continue
+                frame = frames.get(tid)
+                if tid == me or not cpu or frame is None:
+                    continue
+                key = self._collapse(stage, frame)
+                self._samples[key] = self._samples.get(key, 0) + 1
+
+    @staticmethod
+    def _collapse(stage, frame):
+        names = []
+        while frame is not None and len(names) < 128:
+            code = frame.f_code
+            if code.co_filename.rstrip('c') != _SELF and 'contextlib' not in code.co_filename:
+                names.append("{}:{}".format(os.path.basename(code.co_filename), code.co_name))
+            frame = frame.f_back
+        names.reverse()
+        return ";".join([stage] + names)
+
+    # -- allocations ---------------------------------------------------------
+
+    def _mem_enter(self, name):
+        peak = tracemalloc.get_traced_memory()[1]
+        with self._lock:
+            for f in self._mem_open:
+                f['peak'] = max(f['peak'], peak)
+            tracemalloc.reset_peak()
+            frame = {'name': name, 'peak': 0, 'base': tracemalloc.get_traced_memory()[0],
+                     'snapshot': self._snapshot()}
+            self._mem_open.append(frame)
+        return frame
+
+    def _mem_exit(self, frame):
+        peak = tracemalloc.get_traced_memory()[1]
+        snapshot = self._snapshot()
+        with self._lock:
+            for f in self._mem_open:
+                f['peak'] = max(f['peak'], peak)
+            self._mem_open.remove(frame)
+            m = self._mem.setdefault(frame['name'], {'calls': 0, 'peak': 0, 'sites': {}})
+            m['calls'] += 1
+            m['peak'] = max(m['peak'], frame['peak'] - frame['base'])
+            for stat in snapshot.compare_to(frame['snapshot'], 'lineno'):
+                if stat.size_diff <= 0:
+                    continue
+                tb = stat.traceback[0]
+                site = m['sites'].setdefault((tb.filename, tb.lineno), [0, 0])
+                site[0] += stat.size_diff
+                site[1] += stat.count_diff
+
+    @staticmethod
+    def _snapshot():
+        return tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ])
+
+    # -- reports -------------------------------------------------------------
+
+    def _write_reports(self):
+        os.makedirs(self.run_dir, exist_ok=True)
+        lines = ["{:<12} {:>6} {:>10}".format('stage', 'calls', 'wall s')]
+        for name, (calls, secs) in sorted(self._wall.items(), key=lambda kv: -kv[1][1]):
+            lines.append("{:<12} {:>6} {:>10.3f}".format(name, calls, secs))
+        self._write('stages.txt', "\n".join(lines))
+
+        if 'cpu' in self.modes:
+            self._write('cpu.collapsed', "\n".join(
+                "{} {}".format(k, n) for k, n in sorted(self._samples.items())))
+            self._write('cpu-top.txt', self._cpu_top())
+
+        for name, stats in self._profiles.items():
+            path = os.path.join(self.run_dir, 'cprofile-{}.pstats'.format(name))
+            stats.dump_stats(path)
+            with open(os.path.join(self.run_dir, 'cprofile-{}.txt'.format(name)), 'w') as f:
+                stats.stream = f
+                stats.sort_stats('tottime').print_stats(self.top)
+
+        if self._mem:
+            out = []
+            for name, m in sorted(self._mem.items()):
+                out.append("== {} ({} calls, peak {:.1f} KB above stage start)".format(
+                    name, m['calls'], m['peak'] / 1024.0))
+                sites = sorted(m['sites'].items(), key=lambda kv: -kv[1][0])[:self.top]
+                for (filename, lineno), (size, count) in sites:
+                    out.append("  {:>10.1f} KB {:>8} blocks  {}:{}".format(
+                        size / 1024.0, count, os.path.relpath(filename) if filename.startswith(os.getcwd()) else filename, lineno))
+                out.append("")
+            self._write('mem-top.txt', "\n".join(out))
+
+    def _cpu_top(self):
+        """Self samples per (stage, leaf function)."""
+        total = sum(self._samples.values()) or 1
+        leaf = {}
+        for key, n in self._samples.items():
+            parts = key.split(';')
+            k = (parts[0], parts[-1])
+            leaf[k] = leaf.get(k, 0) + n
+        lines = ["{} samples at {:.0f} ms".format(total, self.interval * 1000),
+                 "{:>8} {:>6}  {:<10} {}".format('samples', '%', 'stage', 'function')]
+        for (stage, fn), n in sorted(leaf.items(), key=lambda kv: -kv[1])[:self.top]:
+            lines.append("{:>8} {:>5.1f}%  {:<10} {}".format(n, 100.0 * n / total, stage, fn))
+        return "\n".join(lines)
+
+    def _write(self, name, text):
+        with open(os.path.join(self.run_dir, name), 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+
+
+PROFILER = StageProfiler.from_env()
+
+
+def stage(name, cpu=True):
+    return PROFILER.stage(name, cpu)
@@ -0,0 +1,174 @@
+"""
+Stage-level timing and counters for scraper runs.
+
+Off by default. When off, span() hands back one shared no-op context manager
+and count() returns immediately, so instrumented code pays a method call and a
+flag check.
+
+  TOYOTA_METRICS       off (default) | log (one JSON line in the log) | path (append JSON lines)
+  TOYOTA_METRICS_PROM  Prometheus textfile path, or a directory for one file per dealer
+                       (node_exporter textfile collector); "{dealer}" in the path is filled in
+
+One record per run:
+
+  {"dealer", "started", "duration_s", "ok",
+   "stages":   {name: {"calls", "total_s", "max_s"}},
+   "counters": {name: n},
+   "timeline": [[name, start_offset_s, duration_s], ...]}   (first 500 spans)
+"""
+
+import os, json, time, logging, threading
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+TIMELINE_LIMIT = 500
+_APPEND_LOCK = threading.Lock()
+
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class RunMetrics:
+    def __init__(self, mode="off", prom=None, dealer="reddeertoyota"):
+        self.mode = (mode or "off").strip()
+        self.enabled = self.mode.lower() != "off" or bool(prom)
+        self.prom = prom
+        self.dealer = dealer
+        self._lock = threading.Lock()
+        self._reset()
+
+    @classmethod
+    def from_env(cls, dealer="reddeertoyota"):
+        return cls(mode=os.environ.get("TOYOTA_METRICS", "off"),
+                   prom=os.environ.get("TOYOTA_METRICS_PROM") or None, dealer=dealer)
+
+    def _reset(self):
+        self.started = None
+        self._t0 = time.perf_counter()
+        self.stages = {}
+        self.counters = {}
+        self.timeline = []
+
+    def begin_run(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._reset()
+            self.started = datetime.now().isoformat(timespec='seconds')
+
+    def span(self, name):
+        """Context manager timing one stage; nested and concurrent spans are fine."""
+        if not self.enabled:
+            return _NO_SPAN
+        return self._span(name)
+
+    @contextmanager
+    def _span(self, name):
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.observe(name, time.perf_counter() - start, start)
+
+    def observe(self, name, seconds, start=None):
+        if not self.enabled:
+            return
+        with self._lock:
+            s = self.stages.get(name)
+            if s is None:
+                s = self.stages[name] = {'calls': 0, 'total_s': 0.0, 'max_s': 0.0}
+            s['calls'] += 1
+            s['total_s'] += seconds
+            s['max_s'] = max(s['max_s'], seconds)
+            if len(self.timeline) < TIMELINE_LIMIT:
+                offset = (start if start is not None else time.perf_counter() - seconds) - self._t0
+                self.timeline.append([name, round(offset, 4), round(seconds, 4)])
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def record(self, ok=True):
+        with self._lock:
+            return {
+                'dealer': self.dealer,
+                'started': self.started,
+                'duration_s': round(time.perf_counter() - self._t0, 3),
+                'ok': bool(ok),
+                'stages': {k: {'calls': v['calls'], 'total_s': round(v['total_s'], 4),
+                               'max_s': round(v['max_s'], 4)} for k, v in sorted(self.stages.items())},
+                'counters': dict(sorted(self.counters.items())),
+                'timeline': list(self.timeline),
+            }
+
+    def end_run(self, ok=True):
+        """Emit the run record (log line / JSON lines file / Prometheus textfile). Returns it."""
+        if not self.enabled or self.started is None:
+            return None
+        rec = self.record(ok)
+        self.started = None
+        mode = self.mode.lower()
+        try:
+            if mode == "log":
+                logger.info("METRICS {}".format(json.dumps(rec, separators=(',', ':'))))
+            elif mode != "off":
+                if os.path.dirname(self.mode):
+                    os.makedirs(os.path.dirname(self.mode), exist_ok=True)
+                with _APPEND_LOCK, open(self.mode, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(rec, separators=(',', ':')) + '\n')
+            if self.prom:
+                self.write_prom(rec)
+        except OSError as e:
+            logger.warning("Metrics not written: {}".format(e))
+        return rec
+
+    def prom_path(self):
+        path = self.prom.replace('{dealer}', self.dealer)
+        if os.path.isdir(path) or path.endswith(os.sep):
+            path = os.path.join(path, 'toyota_scraper_{}.prom'.format(self.dealer))
+        return path
+
+    def write_prom(self, rec):
+        d = 'dealer="{}"'.format(self.dealer)
+        lines = [
+            '# HELP toyota_scrape_success Whether the last run found vehicles.',
+            '# TYPE toyota_scrape_success gauge',
+            'toyota_scrape_success{{{}}} {}'.format(d, int(rec['ok'])),
+            '# HELP toyota_scrape_duration_seconds Wall time of the last run.',
+            '# TYPE toyota_scrape_duration_seconds gauge',
+            'toyota_scrape_duration_seconds{{{}}} {}'.format(d, rec['duration_s']),
+            '# HELP toyota_scrape_last_run_timestamp_seconds When the last run finished.',
+            '# TYPE toyota_scrape_last_run_timestamp_seconds gauge',
+            'toyota_scrape_last_run_timestamp_seconds{{{}}} {}'.format(d, int(time.time())),
+            '# HELP toyota_scrape_stage_seconds Seconds spent per stage in the last run.',
+            '# TYPE toyota_scrape_stage_seconds gauge',
+        ]
+        lines += ['toyota_scrape_stage_seconds{{{},stage="{}"}} {}'.format(d, k, v['total_s'])
+                  for k, v in rec['stages'].items()]
+        lines += ['# HELP toyota_scrape_stage_calls Calls per stage in the last run.',
+                  '# TYPE toyota_scrape_stage_calls gauge']
+        lines += ['toyota_scrape_stage_calls{{{},stage="{}"}} {}'.format(d, k, v['calls'])
+                  for k, v in rec['stages'].items()]
+        lines += ['# HELP toyota_scrape_count Counters from the last run (requests, bytes, pages, cards).',
+                  '# TYPE toyota_scrape_count gauge']
+        lines += ['toyota_scrape_count{{{},name="{}"}} {}'.format(d, k, v)
+                  for k, v in rec['counters'].items()]
+        path = self.prom_path()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp, path)  # the collector must never read a half-written file
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Warm scraper service
+Keeps Playwright/Chromium and a warmed browser context alive between runs, so an
+on-demand refresh costs only the scrape itself (no pip install, no browser
+download, no cold Chromium start, no homepage warmup once cookies are held).
+
+  python3 src/script/scraper_service.py
+
+  POST /trigger  -> queue a scrape (202), 409 if one is already queued/running
+  GET  /status   -> JSON: state, last run, vehicle count, browser runs/RSS
+
+Environment:
+  SCRAPER_SERVICE_HOST     bind address (default 127.0.0.1)
+  SCRAPER_SERVICE_PORT     port (default 8765)
+  SCRAPER_SERVICE_SECRET   if set, /trigger requires header x-action-secret
+  SCRAPER_INTERVAL_MIN     scheduled scrape every N minutes (default 0 = on demand only)
+  SCRAPER_RECYCLE_RUNS     relaunch Chromium after N runs (default 20)
+  SCRAPER_RECYCLE_RSS_MB   relaunch Chromium when browser+service RSS exceeds this (default 1500)
+  SCRAPER_PUBLISH          git (default): commit and push public/data after a run that changed the
+                           CSV, like the workflow does, so the deployed site rebuilds | off
+"""
+
+import os, json, time, logging, threading, subprocess
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import toyota_scrapper as scraper
+
+logger = logging.getLogger(__name__)
+
+HOST = os.environ.get("SCRAPER_SERVICE_HOST", "127.0.0.1")
+PORT = int(os.environ.get("SCRAPER_SERVICE_PORT", "8765"))
+SECRET = os.environ.get("SCRAPER_SERVICE_SECRET", "")
+INTERVAL_MIN = float(os.environ.get("SCRAPER_INTERVAL_MIN", "0"))
+RECYCLE_RUNS = int(os.environ.get("SCRAPER_RECYCLE_RUNS", "20"))
+RECYCLE_RSS_MB = int(os.environ.get("SCRAPER_RECYCLE_RSS_MB", "1500"))
+PUBLISH = os.environ.get("SCRAPER_PUBLISH", "git").lower()
+COMMIT_MESSAGE = "chore(data): update inventory.csv [skip ci]"
+
+
+def process_tree_rss_mb(pid=None):
+    """RSS of a process and all its descendants in MB (Linux /proc only, else None)."""
+    pid = pid or os.getpid()
+    if not os.path.isdir("/proc/{}".format(pid)):
+        return None
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open("/proc/{}/stat".format(entry)) as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            children.setdefault(ppid, []).append(int(entry))
+        except (OSError, ValueError, IndexError):
+            continue
+    total_kb, stack = 0, [pid]
+    while stack:
+        p = stack.pop()
+        stack.extend(children.get(p, []))
+        try:
+            with open("/proc/{}/status".format(p)) as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        break
+        except OSError:
+            continue
+    return total_kb / 1024.0
+
+
+def git(cwd, *args):
+    return subprocess.run(["git"] + list(args), cwd=cwd, capture_output=True, text=True,
+                          timeout=120, check=True).stdout.strip()
+
+
+def push_data(csv_path):
+    """
+    The workflow's "Commit CSV if changed" step: commit public/data and push, so
+    the deployed site (built from the repo) picks up the refresh. Returns the new
+    commit's short hash, or None when the CSV did not change.
+    """
+    data_dir = os.path.dirname(os.path.abspath(csv_path))
+    root = git(data_dir, "rev-parse", "--show-toplevel")
+    if not git(root, "status", "--porcelain", "--", csv_path):
+        return None
+    git(root, "add", "-A", data_dir)
+    git(root, "commit", "-m", COMMIT_MESSAGE)
+    # The scheduled workflow pushes from its own checkout: replay on top of it, keeping this run's data
+    git(root, "pull", "--rebase", "-X", "theirs")
+    git(root, "push")
+    return git(root, "rev-parse", "--short", "HEAD")
+
+
+class WarmBrowser:
+    """
+    One long-lived Playwright driver + Chromium + context.
+    Must be created and used from a single thread (Playwright's sync API is thread-bound).
+    """
+
+    def __init__(self, recycle_runs=RECYCLE_RUNS, recycle_rss_mb=RECYCLE_RSS_MB):
+        self.recycle_runs = recycle_runs
+        self.recycle_rss_mb = recycle_rss_mb
+        self.pw = None
+        self.browser = None
+        self.context = None
+        self.runs = 0
+        self.launched_at = None
+        self.warm = False
+
+    def start(self):
+        from playwright.sync_api import sync_playwright
+        self.pw = sync_playwright().start()
+        self._launch()
+
+    def _launch(self):
+        logger.info("Launching warm Chromium...")
+        self.browser, self.context = scraper.launch_browser(self.pw)
+        self.runs = 0
+        self.warm = False
+        self.launched_at = time.time()
+
+    def _close_browser(self):
+        try:
+            if self.browser:
+                self.browser.close()
+        except Exception as e:
+            logger.warning("Browser close failed: {}".format(e))
+        self.browser = self.context = None
+
+    def recycle_if_needed(self):
+        rss = process_tree_rss_mb()
+        reason = None
+        if self.recycle_runs and self.runs >= self.recycle_runs:
+            reason = "{} runs".format(self.runs)
+        elif rss is not None and self.recycle_rss_mb and rss > self.recycle_rss_mb:
+            reason = "RSS {:.0f} MB".format(rss)
+        elif self.browser is None or not self.browser.is_connected():
+            reason = "browser disconnected"
+        if reason:
+            logger.info("Recycling Chromium ({})".format(reason))
+            self._close_browser()
+            self._launch()
+
+    def scrape(self):
+        self.recycle_if_needed()
+        try:
+            vehicles = scraper.run_scrape(self.context, warmup=not self.warm)
+        finally:
+            self.runs += 1
+        # Only trust the session cookies once a run has actually reached inventory
+        self.warm = bool(vehicles)
+        return vehicles
+
+    def stop(self):
+        self._close_browser()
+        if self.pw:
+            self.pw.stop()
+            self.pw = None
+
+    def info(self):
+        return {
+            "runs_since_launch": self.runs,
+            "launched_at": datetime.fromtimestamp(self.launched_at).isoformat() if self.launched_at else None,
+            "warm": self.warm,
+            "rss_mb": process_tree_rss_mb(),
+        }
+
+
+class ScrapeWorker(threading.Thread):
+    """Owns the WarmBrowser and runs scrapes on trigger or on the schedule."""
+
+    def __init__(self, csv_path, interval_min=INTERVAL_MIN):
+        super().__init__(name="scrape-worker", daemon=True)
+        self.csv_path = csv_path
+        self.interval = interval_min * 60 if interval_min > 0 else None
+        self.browser = WarmBrowser()
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopping = False
+        self.status = {
+            "state": "starting", "queued": False, "last_started": None,
+            "last_finished": None, "last_duration_s": None, "last_count": None,
+            "last_error": None, "total_runs": 0, "last_pushed": None,
+        }
+
+    def trigger(self):
+        """Queue a run. Returns False if one is already queued or running."""
+        with self.lock:
+            if self.status["queued"] or self.status["state"] == "running":
+                return False
+            self.status["queued"] = True
+        self.wakeup.set()
+        return True
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.status)
+
+    def run(self):
+        try:
+            self.browser.start()
+        except Exception as e:
+            logger.error("Could not start Chromium: {}".format(e))
+            with self.lock:
+                self.status.update(state="error", last_error=str(e))
+            return
+        with self.lock:
+            self.status.update(state="idle", browser=self.browser.info())
+        while not self.stopping:
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+            if self.stopping:
+                break
+            self._run_once()
+        self.browser.stop()
+
+    def _run_once(self):
+        started = time.time()
+        with self.lock:
+            self.status.update(state="running", queued=False,
+                               last_started=datetime.now().isoformat())
+        count, error, vehicles, pushed = None, None, [], None
+        try:
+            vehicles = self.browser.scrape()
+            count = len(vehicles)
+            if vehicles:
+                scraper.publish(vehicles, self.csv_path)
+            else:
+                error = "no vehicles found"
+        except Exception as e:
+            logger.error("Scrape failed: {}".format(e))
+            error = str(e)
+        scraper.finish_run(vehicles)
+        if vehicles and PUBLISH == "git":
+            try:
+                pushed = push_data(self.csv_path)
+                logger.info("Pushed inventory as {}".format(pushed) if pushed else "Inventory unchanged, nothing to push")
+            except (OSError, subprocess.SubprocessError) as e:
+                detail = getattr(e, "stderr", None) or str(e)
+                logger.error("Publishing to git failed: {}".format(detail))
+                error = "push failed: {}".format(detail.strip())
+        with self.lock:
+            if pushed:
+                self.status["last_pushed"] = pushed
+            self.status.update(
+                state="idle", last_finished=datetime.now().isoformat(),
+                last_duration_s=round(time.time() - started, 2), last_count=count,
+                last_error=error, total_runs=self.status["total_runs"] + 1,
+                browser=self.browser.info(),
+            )
+
+    def shutdown(self):
+        self.stopping = True
+        self.wakeup.set()
+
+
+def make_handler(worker):
+    class Handler(BaseHTTPRequestHandler):
+        def _json(self, code, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/status":
+                return self._json(200, worker.snapshot())
+            self._json(404, {"error": "Not Found"})
+
+        def do_POST(self):
+            if self.path.rstrip("/") != "/trigger":
+                return self._json(404, {"error": "Not Found"})
+            if SECRET and self.headers.get("x-action-secret") != SECRET:
+                return self._json(401, {"error": "Unauthorized"})
+            if worker.trigger():
+                return self._json(202, {"ok": True, "message": "Scrape queued"})
+            self._json(409, {"ok": False, "message": "Scrape already queued or running",
+                             "status": worker.snapshot()})
+
+        def log_message(self, fmt, *args):
+            logger.info("HTTP %s - %s", self.address_string(), fmt % args)
+
+    return Handler
+
+
+def main():
+    worker = ScrapeWorker(scraper.default_csv_path())
+    worker.start()
+    server = ThreadingHTTPServer((HOST, PORT), make_handler(worker))
+    logger.info("Scraper service listening on http://{}:{} (interval: {})".format(
+        HOST, PORT, "{} min".format(INTERVAL_MIN) if INTERVAL_MIN > 0 else "on demand"))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Shutting down...")
+    finally:
+        server.server_close()
+        worker.shutdown()
+        worker.join(timeout=30)
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Sitemap-driven discovery: the dealer's sitemap as a change feed for detail pages.
+
+Dealer sites list every vehicle detail page (VDP) in sitemap.xml, usually with a
+lastmod. The sitemap strategy reads the sitemaps named in robots.txt (or
+/sitemap.xml) as a stream, keeps the URLs that look like VDPs, and compares
+them with the last run:
+
+  - new URLs, URLs whose lastmod moved, and URLs without a lastmod that were last
+    fetched more than TOYOTA_SITEMAP_REFRESH hours ago are fetched, a few at a time,
+    and parsed into vehicle records;
+  - URLs that left the sitemap are marked sold;
+  - everything else is served from the stored records.
+
+Sitemap files are fetched with If-None-Match / If-Modified-Since, and a child
+sitemap whose lastmod in the index has not changed is not fetched at all, so a
+quiet day costs a request or two. A run that could not read every sitemap, or
+left detail pages unfetched (TOYOTA_SITEMAP_MAX), is incomplete: nothing is
+marked sold and the planner moves on to the listing tiers.
+
+  TOYOTA_SITEMAP            off (default) | on: registers the 'sitemap' strategy
+  TOYOTA_SITEMAP_URL        sitemap URL(s), comma-separated (default: robots.txt, then /sitemap.xml)
+  TOYOTA_SITEMAP_MATCH      regex a VDP URL matches (default: a used/inventory path with a model year)
+  TOYOTA_SITEMAP_DB         state path (default ~/.local/share/red-deer-toyota/sitemap.sqlite)
+  TOYOTA_SITEMAP_WORKERS    concurrent detail fetches (default 4, also bounded by TOYOTA_MAX_HTTP)
+  TOYOTA_SITEMAP_MAX        detail fetches per run (default 250)
+  TOYOTA_SITEMAP_MAX_FILES  sitemap files read per run (default 25)
+  TOYOTA_SITEMAP_REFRESH    hours before a VDP without lastmod is fetched again (default 24)
+
+  python3 src/script/sitemap_discovery.py stats [dealer]
+  python3 src/script/sitemap_discovery.py parse sitemap.xml
+"""
+
+import os, re, sys, gzip, json, time, sqlite3, logging
+import xml.etree.ElementTree as ET
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB = os.path.join(os.path.expanduser("~"), ".local", "share", "red-deer-toyota", "sitemap.sqlite")
+SITEMAP = os.environ.get("TOYOTA_SITEMAP", "off").lower() in ("1", "on", "true", "yes")
+SITEMAP_URLS = [u.strip() for u in os.environ.get("TOYOTA_SITEMAP_URL", "").split(',') if u.strip()]
+MATCH_RE = re.compile(os.environ.get("TOYOTA_SITEMAP_MATCH", r'/(?:used|inventory)[/-][^?#]*\b(?:19[89]\d|20[0-2]\d)\b'),
+                      re.IGNORECASE)
+SITEMAP_DB = os.environ.get("TOYOTA_SITEMAP_DB", DEFAULT_DB)
+WORKERS = int(os.environ.get("TOYOTA_SITEMAP_WORKERS", "4"))
+MAX_FETCHES = int(os.environ.get("TOYOTA_SITEMAP_MAX", "250"))
+MAX_FILES = int(os.environ.get("TOYOTA_SITEMAP_MAX_FILES", "25"))
+REFRESH_S = float(os.environ.get("TOYOTA_SITEMAP_REFRESH", "24")) * 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sitemap_files (
+    dealer         TEXT NOT NULL,
+    url            TEXT NOT NULL,
+    parent         TEXT NOT NULL DEFAULT '',
+    kind           TEXT NOT NULL,           -- 'index' or 'urlset'
+    lastmod        TEXT,                    -- as the parent index gave it
+    etag           TEXT,
+    last_modified  TEXT,
+    checked_at     REAL NOT NULL,
+    PRIMARY KEY (dealer, url)
+);
+CREATE TABLE IF NOT EXISTS sitemap_urls (
+    dealer      TEXT NOT NULL,
+    url         TEXT NOT NULL,
+    source      TEXT NOT NULL,              -- sitemap file that lists it
+    lastmod     TEXT,
+    status      TEXT NOT NULL,              -- 'listed', 'failed' or 'sold'
+    vehicle     TEXT,                       -- JSON record from the last successful fetch
+    fetched_at  REAL,
+    first_seen  REAL NOT NULL,
+    last_seen   REAL NOT NULL,
+    sold_at     REAL,
+    PRIMARY KEY (dealer, url)
+);
+CREATE INDEX IF NOT EXISTS sitemap_urls_status ON sitemap_urls (dealer, status);
+"""
+
+
+def enabled():
+    return SITEMAP
+
+
+def robots_sitemaps(text):
+    """Sitemap: lines of a robots.txt, in order."""
+    return [m.group(1).strip() for m in re.finditer(r'^\s*sitemap\s*:\s*(\S+)', text, re.IGNORECASE | re.MULTILINE)]
+
+
+def is_vehicle_url(url):
+    return bool(MATCH_RE.search(url))
+
+
+def _local(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def iter_sitemap(stream, gzipped=False):
+    """
+    Yield ('sitemap' | 'url', loc, lastmod) from a sitemap index or urlset as it
+    streams in; each entry is dropped from the tree once read.
+    """
+    if gzipped:
+        stream = gzip.GzipFile(fileobj=stream)
+    loc = lastmod = None
+    for event, elem in ET.iterparse(stream, events=('end',)):
+        tag = _local(elem.tag)
+        if tag == 'loc':
+            loc = (elem.text or '').strip()
+        elif tag == 'lastmod':
+            lastmod = (elem.text or '').strip() or None
+        elif tag in ('url', 'sitemap'):
+            if loc:
+                yield ('url' if tag == 'url' else 'sitemap'), loc, lastmod
+            loc = lastmod = None
+            elem.clear()
+
+
+class SitemapState:
+    """One dealer's sitemap files and VDP URLs as of the last run."""
+
+    def __init__(self, files=None, urls=None):
+        self.files = files or {}  # url -> {'parent', 'kind', 'lastmod', 'etag', 'last_modified'}
+        self.urls = urls or {}    # url -> {'source', 'lastmod', 'status', 'vehicle', 'fetched_at'}
+
+    def children(self, parent):
+        return [(u, f['lastmod']) for u, f in self.files.items() if f['parent'] == parent]
+
+    def listed_in(self, source):
+        """VDP URLs a sitemap file listed last time it was read: {url: lastmod}."""
+        return {u: e['lastmod'] for u, e in self.urls.items() if e['source'] == source and e['status'] != 'sold'}
+
+    def due(self, listed, now=None):
+        """URLs among listed ({url: (lastmod, source)}) whose detail page has to be fetched."""
+        now = time.time() if now is None else now
+        out = []
+        for url, (lastmod, _) in listed.items():
+            e = self.urls.get(url)
+            if e is None or e['status'] != 'listed' or e['vehicle'] is None:
+                out.append(url)
+            elif lastmod and lastmod != e['lastmod']:
+                out.append(url)
+            elif not lastmod and now - (e['fetched_at'] or 0) > REFRESH_S:
+                out.append(url)
+        return out
+
+    def vanished(self, listed):
+        return [u for u, e in self.urls.items() if e['status'] != 'sold' and u not in listed]
+
+
+class SitemapStore:
+    def __init__(self, path):
+        self.path = None if not path or path.lower() == 'off' else path
+
+    @classmethod
+    def from_env(cls):
+        return cls(SITEMAP_DB)
+
+    def connect(self):
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        return conn
+
+    def load(self, dealer):
+        if not self.path:
+            return SitemapState()
+        conn = self.connect()
+        try:
+            files = {url: {'parent': parent, 'kind': kind, 'lastmod': lastmod, 'etag': etag,
+                           'last_modified': last_modified}
+                     for url, parent, kind, lastmod, etag, last_modified in conn.execute(
+                         "SELECT url, parent, kind, lastmod, etag, last_modified FROM sitemap_files"
+                         " WHERE dealer = ?", (dealer,))}
+            urls = {url: {'source': source, 'lastmod': lastmod, 'status': status,
+                          'vehicle': json.loads(vehicle) if vehicle else None, 'fetched_at': fetched_at}
+                    for url, source, lastmod, status, vehicle, fetched_at in conn.execute(
+                        "SELECT url, source, lastmod, status, vehicle, fetched_at FROM sitemap_urls"
+                        " WHERE dealer = ?", (dealer,))}
+        finally:
+            conn.close()
+        return SitemapState(files, urls)
+
+    def save(self, dealer, files, listed, fetched, sold, prune=False):
+        """
+        One transaction: the sitemap files read or confirmed this run, every URL
+        listed ({url: (lastmod, source)}), fetch results ({url: vehicle dict or None})
+        and the URLs that left the sitemap. prune (a complete walk) drops files
+        no longer in the tree.
+        """
+        if not self.path:
+            return
+        now = time.time()
+        conn = self.connect()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO sitemap_files (dealer, url, parent, kind, lastmod, etag, last_modified,"
+                    " checked_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(dealer, u, f['parent'], f['kind'], f['lastmod'], f['etag'], f['last_modified'], now)
+                     for u, f in files.items()])
+                if prune:
+                    known = conn.execute("SELECT url FROM sitemap_files WHERE dealer = ?", (dealer,)).fetchall()
+                    conn.executemany("DELETE FROM sitemap_files WHERE dealer = ? AND url = ?",
+                                     [(dealer, u) for (u,) in known if u not in files])
+                conn.executemany(
+                    "INSERT INTO sitemap_urls (dealer, url, source, lastmod, status, first_seen, last_seen)"
+                    " VALUES (?, ?, ?, ?, 'listed', ?, ?) ON CONFLICT (dealer, url) DO UPDATE SET"
+                    " source = excluded.source, last_seen = excluded.last_seen,"
+                    " status = CASE WHEN status = 'sold' THEN 'listed' ELSE status END, sold_at = NULL",
+                    [(dealer, u, source, lastmod, now, now) for u, (lastmod, source) in listed.items()])
+                # lastmod only moves with a successful fetch, so a failed one is retried next run
+                conn.executemany(
+                    "UPDATE sitemap_urls SET lastmod = ?, status = 'listed', vehicle = ?, fetched_at = ?"
+                    " WHERE dealer = ? AND url = ?",
+                    [(listed[u][0], json.dumps(v, default=dict), now, dealer, u)
+                     for u, v in fetched.items() if v is not None])
+                conn.executemany(
+                    "UPDATE sitemap_urls SET status = 'failed', fetched_at = ? WHERE dealer = ? AND url = ?",
+                    [(now, dealer, u) for u, v in fetched.items() if v is None])
+                conn.executemany(
+                    "UPDATE sitemap_urls SET status = 'sold', sold_at = ? WHERE dealer = ? AND url = ?",
+                    [(now, dealer, u) for u in sold])
+        finally:
+            conn.close()
+
+    def stats(self, dealer=None):
+        if not self.path or not os.path.exists(self.path):
+            return []
+        conn = self.connect()
+        try:
+            sql = "SELECT dealer, status, COUNT(*), MAX(last_seen) FROM sitemap_urls"
+            args = ()
+            if dealer:
+                sql += " WHERE dealer = ?"
+                args = (dealer,)
+            return conn.execute(sql + " GROUP BY dealer, status ORDER BY dealer, status", args).fetchall()
+        finally:
+            conn.close()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['parse'] and len(argv) > 1:
+        with open(argv[1], 'rb') as f:
+            for kind, loc, lastmod in iter_sitemap(f, argv[1].endswith('.gz')):
+                if kind == 'sitemap' or is_vehicle_url(loc):
+                    print("{:<8} {:<26} {}".format(kind, lastmod or '-', loc))
+        return 0
+    if argv[:1] == ['stats']:
+        print("{:<16} {:<8} {:>7}  {}".format('dealer', 'status', 'urls', 'last seen'))
+        for dealer, status, n, last_seen in SitemapStore.from_env().stats(argv[1] if len(argv) > 1 else None):
+            print("{:<16} {:<8} {:>7}  {}".format(
+                dealer, status, n, time.strftime('%Y-%m-%d %H:%M', time.localtime(last_seen))))
+        return 0
+    print(__doc__.strip().splitlines()[-2].strip())
+    print(__doc__.strip().splitlines()[-1].strip())
+    return 2
+
+
+if __name__ == "__main__":
+    exit(main())
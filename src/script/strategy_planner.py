@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Cost-based ordering of scrape strategies, per dealer.
+
+Strategies register with a prior: roughly how many seconds an attempt takes
+and how often it works. After each attempt its outcome and wall time are
+folded into per-dealer moving averages, and plan() orders the strategies by
+expected seconds to a complete result:
+
+    expected_cost = latency_s / max(ok_rate, MIN_OK_RATE)
+
+A cheap tier that keeps failing sinks below an expensive one that works. A
+strategy that has not been tried for TOYOTA_STRATEGY_REPROBE hours falls back
+to its prior, so it gets another chance once the site changes.
+
+  TOYOTA_STRATEGY_STATS    stats file (default ~/.local/share/red-deer-toyota/strategy_stats.json,
+                           "off" keeps them in memory for the life of the process)
+  TOYOTA_STRATEGIES        fixed order and subset instead of the planner, e.g. "json,browser_dom"
+  TOYOTA_STRATEGY_REPROBE  hours (default 168)
+
+  python3 src/script/strategy_planner.py [dealer]     # stats and current plan
+"""
+
+import os, sys, json, time, logging, threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STATS = os.path.join(os.path.expanduser("~"), ".local", "share", "red-deer-toyota",
+                             "strategy_stats.json")
+ALPHA = 0.3          # weight of the newest attempt in the moving averages
+MIN_OK_RATE = 0.02
+
+
+class Strategy:
+    def __init__(self, name, fn, cost_s, ok_rate=0.5, browser=False, doc=''):
+        self.name = name
+        self.fn = fn
+        self.cost_s = cost_s
+        self.ok_rate = ok_rate
+        self.browser = browser
+        self.doc = doc
+
+
+class StrategyRegistry:
+    def __init__(self):
+        self.strategies = {}  # name -> Strategy, in registration order
+
+    def register(self, name, cost_s, ok_rate=0.5, browser=False):
+        """Decorator: @REGISTRY.register('static', cost_s=8)"""
+        def wrap(fn):
+            doc = (fn.__doc__ or '').strip().splitlines()
+            self.strategies[name] = Strategy(name, fn, cost_s, ok_rate, browser, doc[0] if doc else '')
+            return fn
+        return wrap
+
+    def get(self, name):
+        return self.strategies.get(name)
+
+    def __iter__(self):
+        return iter(list(self.strategies.values()))
+
+
+class StrategyStats:
+    """{dealer: {strategy: {attempts, ok, ok_rate, latency_s, last_attempt, last_ok, ...}}} in a JSON file."""
+
+    def __init__(self, path=None):
+        self.path = None if not path or path.lower() == 'off' else path
+        self._lock = threading.Lock()
+        self._data = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(os.environ.get("TOYOTA_STRATEGY_STATS", DEFAULT_STATS))
+
+    def _load(self):
+        if self._data is None:
+            self._data = {}
+            if self.path and os.path.exists(self.path):
+                try:
+                    with open(self.path, encoding='utf-8') as f:
+                        self._data = json.load(f)
+                except (OSError, ValueError) as e:
+                    logger.warning("Strategy stats unreadable, starting fresh: {}".format(e))
+        return self._data
+
+    def get(self, dealer, name):
+        with self._lock:
+            return dict(self._load().get(dealer, {}).get(name, {}))
+
+    def dealer(self, dealer):
+        with self._lock:
+            return {k: dict(v) for k, v in self._load().get(dealer, {}).items()}
+
+    def record(self, dealer, name, ok, seconds, prior=None, **extra):
+        """Fold one attempt in; the first attempt starts from the strategy's prior."""
+        now = time.time()
+        with self._lock:
+            s = self._load().setdefault(dealer, {}).setdefault(name, {})
+            if not s.get('attempts') and prior is not None:
+                s['ok_rate'], s['latency_s'] = prior.ok_rate, prior.cost_s
+            s['attempts'] = s.get('attempts', 0) + 1
+            s['ok'] = s.get('ok', 0) + int(bool(ok))
+            s['ok_rate'] = round((1 - ALPHA) * s.get('ok_rate', 0.5) + ALPHA * (1.0 if ok else 0.0), 4)
+            s['latency_s'] = round((1 - ALPHA) * s.get('latency_s', seconds) + ALPHA * seconds, 3)
+            s['last_attempt'] = round(now)
+            if ok:
+                s['last_ok'] = round(now)
+            s.update(extra)
+            self._save()
+
+    def note(self, dealer, name, **extra):
+        """Attach facts to a strategy without counting an attempt (e.g. a learned API URL)."""
+        with self._lock:
+            self._load().setdefault(dealer, {}).setdefault(name, {}).update(extra)
+            self._save()
+
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = "{}.{}.tmp".format(self.path, os.getpid())
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self._data, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning("Strategy stats not saved: {}".format(e))
+
+
+class Planner:
+    def __init__(self, registry, stats, fixed=None, reprobe_s=168 * 3600):
+        self.registry = registry
+        self.stats = stats
+        self.fixed = [n.strip() for n in fixed.split(',') if n.strip()] if fixed else None
+        self.reprobe_s = reprobe_s
+
+    @classmethod
+    def from_env(cls, registry):
+        return cls(registry, StrategyStats.from_env(), fixed=os.environ.get("TOYOTA_STRATEGIES") or None,
+                   reprobe_s=float(os.environ.get("TOYOTA_STRATEGY_REPROBE", "168")) * 3600)
+
+    def estimate(self, dealer, strategy):
+        """(latency_s, ok_rate): recorded averages, or the prior when untried or due a re-probe."""
+        s = self.stats.get(dealer, strategy.name)
+        if not s.get('attempts') or time.time() - s.get('last_attempt', 0) > self.reprobe_s:
+            return strategy.cost_s, strategy.ok_rate
+        return s['latency_s'], s['ok_rate']
+
+    def expected_cost(self, dealer, strategy):
+        latency, ok_rate = self.estimate(dealer, strategy)
+        return latency / max(ok_rate, MIN_OK_RATE)
+
+    def plan(self, dealer):
+        """Registered strategies, cheapest expected cost first (or the TOYOTA_STRATEGIES order)."""
+        if self.fixed:
+            plan = [self.registry.get(n) for n in self.fixed]
+            unknown = [n for n, s in zip(self.fixed, plan) if s is None]
+            if unknown:
+                logger.warning("Unknown strategies in TOYOTA_STRATEGIES ignored: {}".format(", ".join(unknown)))
+            return [s for s in plan if s is not None]
+        # sorted() is stable: ties keep registration order (cheapest tier first)
+        return sorted(self.registry, key=lambda s: self.expected_cost(dealer, s))
+
+    def record(self, dealer, name, ok, seconds, **extra):
+        self.stats.record(dealer, name, ok, seconds, prior=self.registry.get(name), **extra)
+
+    def describe(self, dealer, plan=None):
+        plan = self.plan(dealer) if plan is None else plan
+        return " > ".join("{} ~{:.0f}s".format(s.name, self.expected_cost(dealer, s)) for s in plan)
+
+
+REGISTRY = StrategyRegistry()
+PLANNER = Planner.from_env(REGISTRY)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import toyota_scrapper  # registers the strategies (on the imported module, not this __main__)
+    planner = toyota_scrapper.PLANNER
+    dealer = argv[0] if argv else toyota_scrapper.DEFAULT_SITE.dealer_id
+    print("{:<12} {:>9} {:>8} {:>10} {:>10}  {}".format(
+        'strategy', 'attempts', 'ok rate', 'latency s', 'expected', 'last attempt'))
+    for s in planner.plan(dealer):
+        st = planner.stats.get(dealer, s.name)
+        latency, ok_rate = planner.estimate(dealer, s)
+        last = st.get('last_attempt')
+        print("{:<12} {:>9} {:>8.2f} {:>10.1f} {:>10.1f}  {}".format(
+            s.name, st.get('attempts', 0), ok_rate, latency, planner.expected_cost(dealer, s),
+            time.strftime('%Y-%m-%d %H:%M', time.localtime(last)) if last else '-'))
+    learned = planner.stats.get(dealer, 'json').get('api_url')
+    if learned:
+        print("\nLearned JSON endpoint: {}".format(learned))
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
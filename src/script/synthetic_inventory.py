@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Synthetic dealer inventory pages for benchmarks and offline runs.
+
+Builds a results page shaped like the dealer's SRP: header/nav chrome, a grid of
+`.vehicle-card` elements carrying data-* attributes, title, odometer, stock #,
+engine and a price block (about a third on sale, with a struck-through regular
+price), then a footer with inline scripts. Output is deterministic for a seed,
+so timings from different runs are comparable.
+
+  python3 src/script/synthetic_inventory.py 1000 > page.html
+"""
+
+import sys, json, random, hashlib, datetime
+from html import escape
+
+# (make, model, trim, engine) — all recognised by CAR_MAKES / TRIM_PATTERNS
+MODELS = [
+    ('Toyota', 'Corolla', 'LE', '2.0L 4'),
+    ('Toyota', 'RAV4', 'XLE', '2.5L 4'),
+    ('Toyota', 'Tacoma', 'TRD Off-Road', '3.5L V6'),
+    ('Toyota', 'Highlander', 'XLE', '3.5L V6'),
+    ('Toyota', 'Camry', 'SE', '2.5L 4'),
+    ('Toyota', 'Tundra', 'SR5', '3.5L V6'),
+    ('Honda', 'Civic', 'EX', '2.0L 4'),
+    ('Honda', 'CR-V', 'Touring', '1.5L 4'),
+    ('Ford', 'F-150', 'XLT', '3.5L V6'),
+    ('Ford', 'Escape', 'SE', '1.5L 3'),
+    ('Kia', 'Seltos', 'LX', '2.0L 4'),
+    ('Hyundai', 'Tucson', 'Preferred', '2.5L 4'),
+    ('Mazda', 'CX-5', 'GT', '2.5L 4'),
+    ('Subaru', 'Outback', 'Limited', '2.5L 4'),
+    ('Chevrolet', 'Equinox', 'LT', '1.5L 4'),
+    ('GMC', 'Sierra 1500', 'SLE', '5.3L V8'),
+    ('Jeep', 'Grand Cherokee', 'Limited', '3.6L V6'),
+    ('Nissan', 'Rogue', 'SV', '2.5L 4'),
+]
+
+HEADER = """<!DOCTYPE html>
+<html lang="en"><head><meta charset="utf-8"><title>Used Inventory | Red Deer Toyota</title>
+<link rel="stylesheet" href="/static/site.css"><script src="/static/vendor.js"></script></head>
+<body><header class="site-header"><nav class="main-nav"><ul>
+<li><a href="/">Home</a></li><li><a href="/inventory/new/">New Inventory</a></li>
+<li><a href="/inventory/used/">Used Inventory</a></li><li><a href="/service/">Service</a></li>
+<li><a href="/finance/">Finance</a></li><li><a href="/contact/">Contact Us</a></li>
+</ul></nav></header>
+<main class="srp"><aside class="filters"><h3>Filter results</h3>
+<label><input type="checkbox"> Toyota</label><label><input type="checkbox"> Honda</label>
+<label><input type="checkbox"> Ford</label></aside>
+<section class="srp-results"><h1>Used vehicles for sale in Red Deer</h1>
+<div class="results-count">{count} results</div><div class="srp-grid">
+"""
+
+FOOTER = """</div><nav class="pagination"><a href="?page=1">1</a> <a href="?page=2">2</a></nav>
+</section></main><footer class="site-footer"><p>Red Deer Toyota, 6841 50 Ave, Red Deer AB.
+All prices plus GST. Vehicles subject to prior sale.</p></footer>
+<script>window.dataLayer = window.dataLayer || []; dataLayer.push({{"page": "srp", "count": {count}}});</script>
+</body></html>
+"""
+
+
+def synthetic_vehicles(n, seed=0, sale_ratio=0.33):
+    """n deterministic vehicle dicts in the scraper's CSV shape."""
+    rnd = random.Random(seed)
+    vehicles = []
+    for i in range(n):
+        make, model, trim, engine = MODELS[rnd.randrange(len(MODELS))]
+        value = rnd.randrange(12000, 78000, 1000) - 23
+        sale = value - rnd.randrange(500, 4000, 250) if rnd.random() < sale_ratio else ''
+        vehicles.append({
+            'makeName': make, 'year': str(rnd.randrange(2012, 2026)), 'model': model,
+            'sub-model': trim, 'trim': trim, 'mileage': str(rnd.randrange(5000, 220000)),
+            'value': str(value), 'sale_value': str(sale), 'stock_number': 'S{:05d}'.format(i),
+            'engine': engine,
+        })
+    return vehicles
+
+
+def vdp_path(v):
+    return '/used/{}-{}-{}-{}.html'.format(v['year'], v['makeName'], v['model'].replace(' ', '-'), v['stock_number'])
+
+
+def render_price(v):
+    if v['sale_value']:
+        return ('<div class="price-block"><span class="price-label">Was</span>'
+                '<span class="price regular-price" style="text-decoration: line-through">'
+                '<s>${:,}</s></span><span class="price-label">Sale Price</span>'
+                '<span class="price sale-price">${:,}</span></div>').format(
+                    int(v['value']), int(v['sale_value']))
+    return ('<div class="price-block"><span class="price-label">Our Price</span>'
+            '<span class="price">${:,}</span></div>').format(int(v['value']))
+
+
+def render_card(v, lean=False):
+    """lean=True leaves out the odometer and engine, as some listing templates do."""
+    return (
+        '<div class="vehicle-card" data-vehicle-id="{stock}" data-stock-number="{stock}" '
+        'data-year="{year}" data-make="{make_l}" data-model="{model}">'
+        '<a class="vehicle-card__image" href="/used/{year}-{make}-{model_slug}-{stock}.html">'
+        '<img src="/photos/{stock}-1.jpg" alt="{year} {make} {model}" loading="lazy"></a>'
+        '<div class="vehicle-card__body"><h2 class="vehicle-title">'
+        '<a href="/used/{year}-{make}-{model_slug}-{stock}.html">{year} {make} {model} {trim}</a></h2>'
+        '<ul class="vehicle-specs">{specs}<li class="stock">Stock #: {stock}</li></ul>'
+        '{price}<a class="btn" href="/used/{stock}">View Details</a></div></div>\n'
+    ).format(stock=escape(v['stock_number']), year=v['year'], make=escape(v['makeName']),
+             make_l=escape(v['makeName'].lower()), model=escape(v['model']),
+             model_slug=escape(v['model'].replace(' ', '-')), trim=escape(v['trim']),
+             specs='' if lean else '<li class="odometer">{:,} km</li><li class="engine">{}</li>'.format(
+                 int(v['mileage']), escape(v['engine'])),
+             price=render_price(v))
+
+
+def render_page(vehicles, lean=False, total=None):
+    """total is the listing's size for the results count (default: this page's cards)."""
+    count = len(vehicles) if total is None else total
+    return (HEADER.format(count=count) + ''.join(render_card(v, lean) for v in vehicles)
+            + FOOTER.format(count=count))
+
+
+def synthetic_vin(v):
+    """Deterministic 17-character VIN (no I, O or Q) for a synthetic vehicle."""
+    alphabet = 'ABCDEFGHJKLMNPRSTUVWXYZ0123456789'
+    rnd = random.Random(v['stock_number'])
+    return '2T3' + ''.join(rnd.choice(alphabet) for _ in range(14))
+
+
+def render_vdp(v):
+    """Vehicle detail page: JSON-LD Car, spec list and price, inside the same site chrome."""
+    ld = {
+        '@context': 'https://schema.org', '@type': 'Car',
+        'name': '{} {} {} {}'.format(v['year'], v['makeName'], v['model'], v['trim']),
+        'brand': {'@type': 'Brand', 'name': v['makeName']}, 'model': v['model'],
+        'vehicleModelDate': v['year'], 'vehicleIdentificationNumber': synthetic_vin(v),
+        'mileageFromOdometer': {'@type': 'QuantitativeValue', 'value': int(v['mileage']), 'unitCode': 'KMT'},
+        'vehicleEngine': {'@type': 'EngineSpecification', 'name': v['engine']},
+        'offers': {'@type': 'Offer', 'priceCurrency': 'CAD',
+                   'price': int(v['sale_value'] or v['value'])},
+    }
+    specs = [('Stock #', v['stock_number']), ('VIN', synthetic_vin(v)), ('Trim', v['trim']),
+             ('Kilometres', '{:,} km'.format(int(v['mileage']))), ('Engine', v['engine'])]
+    return (HEADER.format(count=1).replace('Used Inventory |', '{} {} {} |'.format(
+                v['year'], escape(v['makeName']), escape(v['model'])))
+            + '<script type="application/ld+json">{}</script>'.format(json.dumps(ld))
+            + '<h1 class="vdp-title">{} {} {} {}</h1><dl class="vdp-specs">'.format(
+                v['year'], escape(v['makeName']), escape(v['model']), escape(v['trim']))
+            + ''.join('<dt>{}</dt><dd>{}</dd>'.format(escape(k), escape(val)) for k, val in specs)
+            + '</dl>' + render_price(v)
+            + FOOTER.format(count=1))
+
+
+def _content_date(data):
+    """A W3C date that moves whenever data does, as a CMS-generated sitemap's lastmod would."""
+    digest = hashlib.md5(json.dumps(data, sort_keys=True).encode('utf-8')).digest()
+    return (datetime.date(2026, 1, 1) + datetime.timedelta(days=digest[0] + digest[1] % 64)).isoformat()
+
+
+def vdp_lastmod(v):
+    return _content_date(v)
+
+
+def render_sitemaps(vehicles):
+    """{path: xml} for robots.txt-advertised /sitemap.xml: an index over a pages and an inventory sitemap."""
+    ns = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+    inventory = ''.join('<url><loc>{}</loc><lastmod>{}</lastmod></url>'.format(escape(vdp_path(v)), vdp_lastmod(v))
+                        for v in vehicles)
+    pages = ''.join('<url><loc>{}</loc></url>'.format(p) for p in ('/', '/inventory/used/', '/service/'))
+    return {
+        '/sitemap.xml': ('<?xml version="1.0" encoding="UTF-8"?><sitemapindex xmlns="{}">'
+                         '<sitemap><loc>/sitemap-pages.xml</loc><lastmod>2026-01-01</lastmod></sitemap>'
+                         '<sitemap><loc>/sitemap-inventory.xml</loc><lastmod>{}</lastmod></sitemap>'
+                         '</sitemapindex>').format(ns, _content_date(vehicles)),
+        '/sitemap-pages.xml': '<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="{}">{}</urlset>'.format(ns, pages),
+        '/sitemap-inventory.xml': '<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="{}">{}</urlset>'.format(
+            ns, inventory),
+    }
+
+
+def synthetic_page(n, seed=0, sale_ratio=0.33):
+    """Return (html, vehicles) for a page of n cards."""
+    vehicles = synthetic_vehicles(n, seed, sale_ratio)
+    return render_page(vehicles), vehicles
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 24
+    sys.stdout.write(synthetic_page(n)[0])
@@ -2,7 +2,13 @@
 """
 Red Deer Toyota Used Inventory Scraper
 Strategy 1: Hit the dealer's hidden JSON API (no Cloudflare on API endpoints)
-Strategy 2: Playwright headless browser fallback (works on residential IPs)
+Strategy 2: Fetch the results pages over plain HTTP (no browser)
+Strategy 3: Playwright headless browser fallback (works on residential IPs),
+            capturing the page's own inventory XHR or reading the DOM
+Optional:   the dealer's sitemap as a change feed for detail pages (TOYOTA_SITEMAP)
+The order is planned per dealer from past success rates and timings
+(strategy_planner.py); Chromium is only launched when the cheaper tiers fail.
+Parsed pages and cards are cached across runs by content hash (parse_cache.py).
 
 HOW TO FIND THE JSON API (one-time setup):
   1. Open Chrome and go to https://www.reddeertoyota.com/inventory/used/
@@ -11,28 +17,60 @@ HOW TO FIND THE JSON API (one-time setup):
   4. Copy that URL and set it as JSON_API_URL below (or set env var TOYOTA_API_URL)
 """
 
-import csv, time, re, logging, os, json
+import time, re, logging, os, sys, json, threading
 from datetime import datetime
+from urllib.parse import urljoin
+from xml.etree.ElementTree import ParseError
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 JSON_API_URL = os.environ.get("TOYOTA_API_URL", "")
 
+# Start the browser strategy once JSON discovery has run this many seconds without
+# success (negative = run the strategies strictly one after the other)
+HEDGE_AFTER_S = float(os.environ.get("TOYOTA_HEDGE_AFTER", "10"))
+
 import requests
+import bs4
 from bs4 import BeautifulSoup
 
-SESSION = requests.Session()
-SESSION.headers.update({
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
-    'Accept': 'application/json, text/html, */*',
-    'Accept-Language': 'en-US,en;q=0.9',
-    'X-Requested-With': 'XMLHttpRequest',
-    'Referer': 'https://www.reddeertoyota.com/inventory/used/',
-})
-
-BASE = "https://www.reddeertoyota.com"
-TARGET = "https://www.reddeertoyota.com/inventory/used/"
+from debug_artifacts import ArtifactRecorder
+from run_metrics import RunMetrics
+from profiling import PROFILER
+from dedup_index import DedupIndex
+from vehicle_record import Vehicle, as_vehicle
+from inventory_output import write_inventory, canonical_rows
+from inventory_index import write_index
+import inventory_history
+import crawl_frontier
+import vdp_enrichment
+import incremental
+import sitemap_discovery
+import parse_cache
+import vehicle_record
+from strategy_planner import REGISTRY, PLANNER
+
+ARTIFACTS = ArtifactRecorder.from_env()
+METRICS = RunMetrics.from_env()
+
+def make_session(referer):
+    session = requests.Session()
+    session.headers.update({
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
+        'Accept': 'application/json, text/html, */*',
+        'Accept-Language': 'en-US,en;q=0.9',
+        'X-Requested-With': 'XMLHttpRequest',
+        'Referer': referer,
+    })
+    return session
+
+
+# TOYOTA_BASE_URL points the scraper elsewhere, e.g. at mock_dealer.py on localhost
+BASE = os.environ.get("TOYOTA_BASE_URL", "https://www.reddeertoyota.com").rstrip('/')
+TARGET = BASE + "/inventory/used/"
+
+SESSION = make_session(TARGET)
 
 CAR_MAKES = {
     # ── Toyota ───────────────────────────────────────────────────────────
@@ -688,6 +726,105 @@ API_CANDIDATES = [
 ]
 
 
+# Global concurrency bounds (matter once several dealers are scraped at once, see multi_dealer.py)
+BROWSER_SLOTS = threading.BoundedSemaphore(int(os.environ.get("TOYOTA_MAX_BROWSERS", "2")))
+HTTP_SLOTS = threading.BoundedSemaphore(int(os.environ.get("TOYOTA_MAX_HTTP", "8")))
+# Minimum gap between JSON requests to the same host
+HOST_MIN_INTERVAL_S = float(os.environ.get("TOYOTA_HOST_INTERVAL", "0"))
+_HOST_STATE = {}
+_HOST_STATE_LOCK = threading.Lock()
+
+
+def polite_wait(url, interval=None):
+    """Block until interval (default HOST_MIN_INTERVAL_S) has passed since the last request to url's host."""
+    interval = HOST_MIN_INTERVAL_S if interval is None else interval
+    if interval <= 0:
+        return
+    host = requests.utils.urlparse(url).netloc
+    with _HOST_STATE_LOCK:
+        state = _HOST_STATE.setdefault(host, [threading.Lock(), 0.0])
+    with state[0]:
+        wait = state[1] + interval - time.time()
+        if wait > 0:
+            time.sleep(wait)
+        state[1] = time.time()
+
+
+class Site:
+    """Everything that ties a scrape to one dealer rooftop."""
+
+    def __init__(self, dealer_id, base, inventory_path='/inventory/used/', api_url='',
+                 api_candidates=None, name='', output=None, artifacts=None, session=None, metrics=None):
+        self.dealer_id = dealer_id
+        self.name = name or dealer_id
+        self.base = base.rstrip('/')
+        self.target = self.base + inventory_path
+        self.api_url = api_url
+        self.api_candidates = API_CANDIDATES if api_candidates is None else api_candidates
+        self.output = output
+        self.artifacts = artifacts or ArtifactRecorder.from_env()
+        self.session = session or make_session(self.target)
+        self.metrics = metrics or RunMetrics.from_env(dealer=dealer_id)
+
+    @classmethod
+    def from_config(cls, cfg, project_root=None):
+        output = cfg.get('output')
+        if output and project_root and not os.path.isabs(output):
+            output = os.path.join(project_root, output)
+        artifacts = ArtifactRecorder.from_env()
+        artifacts.root = os.path.join(artifacts.root, cfg['id'])
+        return cls(cfg['id'], cfg['base'], cfg.get('inventory_path', '/inventory/used/'),
+                   api_url=cfg.get('api_url', ''), api_candidates=cfg.get('api_candidates'),
+                   name=cfg.get('name', ''), output=output, artifacts=artifacts)
+
+
+DEFAULT_SITE = Site('reddeertoyota', BASE, '/inventory/used/', api_url=JSON_API_URL,
+                    name='Red Deer Toyota', artifacts=ARTIFACTS, session=SESSION, metrics=METRICS)
+
+# Card selector cascade — first selector that yields valid vehicles wins
+CARD_SELECTORS = [
+    "[data-vehicle-id]","[data-stock-number]","[data-vin]",
+    ".vehicle-card",".inventory-item",".vehicle-listing",
+    "article[class*='vehicle']","div[class*='vehicle']",
+    "li[class*='vehicle']",".vehicle","article","li[class*='item']",
+]
+
+# "dom" extracts card text inside the page; "html" pulls page.content() into BeautifulSoup
+EXTRACT_MODE = os.environ.get("TOYOTA_EXTRACT_MODE", "dom").lower()
+
+# Results pages walked per run
+MAX_PAGES = 10
+
+# Pause between results pages on the static (requests) tier
+STATIC_PAGE_DELAY_S = float(os.environ.get("TOYOTA_STATIC_DELAY", "0.5"))
+
+# Runs inside the page: returns [[text, {data-*}, first link], ...] for one selector.
+# Text nodes are joined with spaces (skipping script/style) to mirror
+# BeautifulSoup's get_text(separator=' ', strip=True).
+CARD_EXTRACT_JS = """
+(selector) => {
+    const skip = new Set(['SCRIPT', 'STYLE', 'NOSCRIPT', 'TEMPLATE']);
+    return Array.from(document.querySelectorAll(selector), (el) => {
+        const parts = [];
+        const walker = document.createTreeWalker(el, NodeFilter.SHOW_TEXT, {
+            acceptNode: (n) => (n.parentElement && skip.has(n.parentElement.tagName))
+                ? NodeFilter.FILTER_REJECT : NodeFilter.FILTER_ACCEPT,
+        });
+        for (let n = walker.nextNode(); n; n = walker.nextNode()) {
+            const t = n.nodeValue.trim();
+            if (t) parts.push(t);
+        }
+        const data = {};
+        for (const a of el.attributes) {
+            if (a.name.startsWith('data-')) data[a.name] = a.value;
+        }
+        const link = Array.from(el.querySelectorAll('a[href]'), (a) => a.getAttribute('href'))
+            .find((h) => !/^(#|javascript:|mailto:|tel:)/i.test(h.trim()));
+        return [parts.join(' '), data, link || ''];
+    });
+}
+"""
+
 # -----------------------------------------------------------------------
 # Helpers
 # -----------------------------------------------------------------------
@@ -748,8 +885,7 @@ def extract_prices_from_text(text):
 
 
 def vehicle_from_json(item):
-    v = {'makeName':'','year':'','model':'','sub-model':'','trim':'',
-         'mileage':'','value':'','sale_value':'','stock_number':'','engine':''}
+    v = Vehicle()
     field_map = {
         'makeName':    ['make','makeName','Make','manufacturer'],
         'year':        ['year','modelYear','Year','yr'],
@@ -767,121 +903,185 @@ def vehicle_from_json(item):
         for c in candidates:
             val = item.get(c) or item.get(c.lower()) or item.get(c.upper())
             if val:
-                v[our_key] = str(val).strip()
+                v[our_key] = val
                 break
-    if v['value'] and v['sale_value']:
-        try:
-            if int(re.sub(r'[^\d]','',v['sale_value'])) >= int(re.sub(r'[^\d]','',v['value'])):
-                v['sale_value'] = ''
-        except Exception:
-            pass
-    v['sub-model'] = v['trim']
+    if v.value is not None and v.sale_value is not None and v.sale_value >= v.value:
+        v.sale_value = None
+    v.sub_model = v.trim
+    for c in ['vdpUrl','detailUrl','detailsUrl','vehicleUrl','url','link']:
+        if isinstance(item.get(c), str) and item[c].strip():
+            v.detail_url = item[c].strip()
+            break
+    return v
+
+
+def card_link(hrefs):
+    """First href on a card that leads to another page (the detail page, on every template seen so far)."""
+    for href in hrefs:
+        href = (href or '').strip()
+        if href and not re.match(r'(#|javascript:|mailto:|tel:)', href, re.IGNORECASE):
+            return href
+    return ''
+
+
+def card_payload(element):
+    """(text, data-* attributes, link): everything parsing a card element reads."""
+    text = element.get_text(separator=' ', strip=True)
+    attrs = {k: v for k, v in element.attrs.items() if k.startswith('data-')}
+    return text, attrs, card_link(a.get('href') for a in element.find_all('a', href=True))
+
+
+def parse_card(text, attrs, link, idx=0):
+    v = parse_card_text(text, attrs, idx)
+    if link:
+        v.detail_url = link
     return v
 
 
 def parse_html_element(element, idx=0):
-    v = {'makeName':'','year':'','model':'','sub-model':'','trim':'',
-         'mileage':'','value':'','sale_value':'','stock_number':'','engine':''}
+    return parse_card(*card_payload(element), idx=idx)
+
+
+def parse_cards(payloads):
+    """Vehicles for [(text, attrs, link), ...] in order; cards parsed in an earlier run come from PARSE_CACHE."""
+    keys = [parse_cache.card_key(*p) for p in payloads]
+    cached = PARSE_CACHE.get('card', keys)
+    vehicles, fresh = [], {}
+    for idx, (key, payload) in enumerate(zip(keys, payloads)):
+        if key in cached:
+            v = Vehicle.from_dict(cached[key])
+        else:
+            v = parse_card(*payload, idx=idx)
+            fresh[key] = v
+        vehicles.append(v)
+    PARSE_CACHE.put('card', fresh)
+    if cached:
+        logger.info("Parse cache: {} of {} cards unchanged".format(len(payloads) - len(fresh), len(payloads)))
+    return vehicles
+
+
+# data-mileage="45,000", "45000 km", "45000.0"
+MILEAGE_ATTR_RE = re.compile(r'^(\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?\s*(?:km|kms|kilometers?|mi|miles?)?$', re.IGNORECASE)
+
+
+def parse_card_text(text, attrs=None, idx=0):
+    """Build a Vehicle from a card's flattened text plus its data-* attributes."""
+    v = Vehicle()
     try:
-        text = re.sub(r'\s+', ' ', element.get_text(separator=' ', strip=True))
+        text = re.sub(r'\s+', ' ', text).strip()
         m = re.search(r'\b(19[89]\d|20[0-2]\d)\b', text)
-        if m: v['year'] = m.group(1)
+        if m: v.year = int(m.group(1))
         make, model = extract_make_model(text)
-        if make: v['makeName'] = make
-        if model: v['model'] = model
+        if make: v.make = make
+        if model: v.model = model
         trim = extract_trim(text, model)
-        if trim: v['trim'] = trim; v['sub-model'] = trim
+        if trim: v.trim = v.sub_model = trim
         for pat in [r'Stock[#:\s]*([A-Z0-9]{3,15})\b', r'#\s*([A-Z0-9]{3,15})\b']:
             m2 = re.search(pat, text, re.IGNORECASE)
             if m2 and m2.group(1).isalnum() and len(m2.group(1)) >= 3:
-                v['stock_number'] = m2.group(1); break
+                v.stock_number = m2.group(1); break
         reg, sal = extract_prices_from_text(text)
-        if reg: v['value'] = str(reg)
-        if sal: v['sale_value'] = str(sal)
+        if reg: v.value = reg
+        if sal: v.sale_value = sal
         for pat in [r'(\d{1,3}(?:,\d{3})*)\s*(?:km|kilometers?)\b',
                     r'(\d{1,3}(?:,\d{3})*)\s*(?:miles?|mi)\b']:
             m3 = re.search(pat, text, re.IGNORECASE)
             if m3:
-                val = m3.group(1).replace(',','')
-                if 0 <= int(val) <= 500000: v['mileage'] = val; break
+                val = int(m3.group(1).replace(',',''))
+                if 0 <= val <= 500000: v.mileage = val; break
         for pat in [r'(\d\.\d+L\s*(?:V?\d+|I\d+))',r'(\d\.\d+L\s*Hybrid)',r'(\d\.\d+L\s*Turbo)']:
             m4 = re.search(pat, text, re.IGNORECASE)
-            if m4: v['engine'] = m4.group(1).strip(); break
+            if m4: v['engine'] = m4.group(1); break
+        for attr, val in (attrs or {}).items():
+            attr, val = attr.lower(), str(val).strip()
+            # Each attribute feeds one field only: data-model-year is a year, never a model
+            field = next((f for f in ('year', 'make', 'model', 'stock', 'mileage') if f in attr), None)
+            if field == 'year':
+                if v.year is None and re.match(r'^(19[89]\d|20[0-2]\d)$', val): v.year = int(val)
+            elif field == 'make':
+                if not v.make: v['makeName'] = val.title()
+            elif field == 'model':
+                if not v.model: v['model'] = val
+            elif field == 'stock':
+                if not v.stock_number and val.isalnum() and 3 <= len(val) <= 15: v.stock_number = val
+            elif field == 'mileage' and v.mileage is None:
+                m5 = MILEAGE_ATTR_RE.match(val)
+                km = int(m5.group(1).replace(',', '')) if m5 else None
+                if km is not None and km <= 500000: v.mileage = km
     except Exception as e:
         logger.debug("HTML parse error {}: {}".format(idx, e))
     return v
 
 
 def is_valid(v):
-    if not (v.get('year','').strip() and v.get('makeName','').strip()):
+    v = as_vehicle(v)
+    if v.year is None or not v.make:
         return False
-    extras = ['model','value','sale_value','stock_number','mileage']
-    return bool(v.get('model','').strip()) or sum(1 for f in extras if v.get(f,'').strip()) >= 2
+    return bool(v.model) or sum(1 for f in ('value', 'sale_value', 'stock_number', 'mileage') if v.has(f)) >= 2
+
 
+def is_enrichable(v):
+    """A card too thin for is_valid that its detail page could complete (TOYOTA_ENRICH)."""
+    v = as_vehicle(v)
+    return bool(v.year and v.make and v.detail_url)
 
-def completeness(v):
-    fields = ['stock_number', 'mileage', 'engine', 'trim', 'value', 'sale_value']
-    return sum(1 for f in fields if v.get(f, '').strip())
+
+def keep_card(v):
+    return is_valid(v) or (vdp_enrichment.enabled() and is_enrichable(v))
 
 
 def dedup(vehicles):
-    by_stock = {}
-    no_stock = []
-    for v in vehicles:
-        stock = v.get('stock_number', '').strip()
-        if stock:
-            if stock not in by_stock or completeness(v) > completeness(by_stock[stock]):
-                by_stock[stock] = v
-        else:
-            no_stock.append(v)
-    stocked = list(by_stock.values())
-    stocked_ymmp = set()
-    for v in stocked:
-        stocked_ymmp.add((v.get('year',''), v.get('makeName',''), v.get('model',''), v.get('value','')))
-    extra = []
-    seen_extra = set()
-    for v in no_stock:
-        ymmp = (v.get('year',''), v.get('makeName',''), v.get('model',''), v.get('value',''))
-        if ymmp in stocked_ymmp or ymmp in seen_extra:
-            continue
-        seen_extra.add(ymmp)
-        extra.append(v)
-    return stocked + extra
+    """Merge duplicates across strategies/pages field by field (see dedup_index.DedupIndex)."""
+    return DedupIndex(vehicles).vehicles()
 
 
 # -----------------------------------------------------------------------
 # Strategy 1: JSON API
 # -----------------------------------------------------------------------
 
-def try_json_api(url):
+def vehicles_from_payload(data):
+    """Valid vehicles from a decoded JSON inventory payload (a list, or a dict wrapping one)."""
+    if isinstance(data, dict):
+        for key in ['vehicles','inventory','listings','results','data',
+                    'items','records','vehicles_list','vehicleList']:
+            if key in data and isinstance(data[key], list):
+                data = data[key]
+                break
+        if isinstance(data, dict):
+            for v in data.values():
+                if isinstance(v, list) and len(v) > 0 and isinstance(v[0], dict):
+                    data = v
+                    break
+    if not isinstance(data, list) or len(data) == 0:
+        return []
+    vehicles = []
+    for item in data:
+        if not isinstance(item, dict):
+            continue
+        v = vehicle_from_json(item)
+        if is_valid(v):
+            vehicles.append(v)
+    return vehicles
+
+
+def try_json_api(url, site=None):
+    site = site or DEFAULT_SITE
     try:
-        resp = SESSION.get(url, timeout=15)
+        polite_wait(url)
+        with HTTP_SLOTS, site.metrics.span('json.request'):
+            resp = site.session.get(url, timeout=15)
+        site.metrics.count('http.requests')
+        site.metrics.count('http.bytes', len(resp.content))
         if resp.status_code != 200:
+            site.metrics.count('http.status.{}'.format(resp.status_code))
             return []
         ct = resp.headers.get('Content-Type','')
         if 'json' not in ct and not resp.text.strip().startswith(('{','[')):
             return []
-        data = resp.json()
-        if isinstance(data, dict):
-            for key in ['vehicles','inventory','listings','results','data',
-                        'items','records','vehicles_list','vehicleList']:
-                if key in data and isinstance(data[key], list):
-                    data = data[key]
-                    break
-            if isinstance(data, dict):
-                for v in data.values():
-                    if isinstance(v, list) and len(v) > 0 and isinstance(v[0], dict):
-                        data = v
-                        break
-        if not isinstance(data, list) or len(data) == 0:
+        with PROFILER.stage('parse'):
+            vehicles = vehicles_from_payload(resp.json())
+        if not vehicles:
             return []
-        vehicles = []
-        for item in data:
-            if not isinstance(item, dict):
-                continue
-            v = vehicle_from_json(item)
-            if is_valid(v):
-                vehicles.append(v)
         logger.info("JSON API hit: {} — {} vehicles".format(url, len(vehicles)))
         return vehicles
     except Exception as e:
@@ -889,17 +1089,32 @@ def try_json_api(url):
         return []
 
 
-def discover_and_scrape_json():
-    global JSON_API_URL
-    if JSON_API_URL:
-        vehicles = try_json_api(JSON_API_URL)
+def discover_and_scrape_json(cancel=None, site=None):
+    site = site or DEFAULT_SITE
+    with site.metrics.span('json.discovery'), PROFILER.stage('discovery', cpu=False):
+        return _discover_json(cancel, site)
+
+
+def _discover_json(cancel, site):
+    if site.api_url:
+        vehicles = try_json_api(site.api_url, site)
         if vehicles:
             return vehicles
         logger.warning("Configured JSON_API_URL returned no vehicles — trying auto-discovery")
-    logger.info("Auto-discovering dealer JSON API ({} candidates)...".format(len(API_CANDIDATES)))
-    for path in API_CANDIDATES:
-        url = BASE + path
-        vehicles = try_json_api(url)
+    learned = PLANNER.stats.get(site.dealer_id, 'json').get('api_url')
+    if learned and learned != site.api_url:
+        # Seen by the browser's XHR capture on an earlier run
+        vehicles = try_json_api(learned, site)
+        if vehicles:
+            return vehicles
+        logger.info("Learned JSON endpoint returned no vehicles: {}".format(learned))
+    logger.info("Auto-discovering dealer JSON API ({} candidates)...".format(len(site.api_candidates)))
+    for path in site.api_candidates:
+        if cancel is not None and cancel.is_set():
+            logger.info("JSON discovery cancelled — another strategy finished first")
+            return []
+        url = site.base + path
+        vehicles = try_json_api(url, site)
         if vehicles:
             logger.info("SUCCESS: API found at {}".format(url))
             logger.info("TIP: Set TOYOTA_API_URL={} to skip discovery next time".format(url))
@@ -909,72 +1124,264 @@ def discover_and_scrape_json():
 
 
 # -----------------------------------------------------------------------
-# Strategy 2: HTML scraping
+# Strategy 2: static HTML over requests (no browser)
 # -----------------------------------------------------------------------
 
-def scrape_html():
+STATIC_HEADERS = {'Accept': 'text/html,application/xhtml+xml,*/*;q=0.8', 'X-Requested-With': None}
+
+
+def static_warmup(site):
+    """Pick up whatever session cookie the homepage hands out, as the browser warmup does."""
+    if site.session.cookies:
+        return
+    try:
+        polite_wait(site.base)
+        with HTTP_SLOTS, site.metrics.span('static.request'):
+            site.session.get(site.base + "/", headers=STATIC_HEADERS, timeout=20)
+        site.metrics.count('http.requests')
+    except requests.RequestException as e:
+        logger.info("Static tier: homepage request failed ({}) — continuing".format(e))
+
+
+def reuse_saved_pages(listing, crawl, page_num, page_vehicles, tier):
+    """
+    Incremental early stop: when page_num matches the listing snapshot, the saved
+    vehicles of the pages after it (recorded in the crawl, if there is one) are
+    returned and pagination can stop. None means keep reading.
+    """
+    reused = listing.reuse_after(page_num, page_vehicles)
+    if reused is None:
+        return None
+    vehicles = []
+    for p, saved in reused:
+        if crawl:
+            crawl.record('html', p, saved)
+        vehicles.extend(saved)
+    if crawl:
+        crawl.skip_after('html', reused[-1][0] if reused else page_num)
+    logger.info("{}: page {} unchanged since the last run — reusing {} saved pages".format(
+        tier, page_num, len(reused)))
+    return vehicles
+
+
+def scrape_static(cancel=None, site=None, crawl=None, listing=None):
+    """
+    Fetch the results pages with plain requests and parse them with the same
+    selector cascade as the browser, the way api/scrape.py does. Returns
+    (vehicles, escalate_from): escalate_from is None when the listing was read
+    to its end, otherwise the first page the browser has to take over (blocked,
+    errored, or no cards before the first empty page, i.e. rendered client-side). With a
+    crawl, pages are claimed from the frontier and an escalated page is released
+    for the browser to claim. With a listing (incremental.IncrementalRun), pages
+    are checked against the last run's snapshot and reading stops at the first
+    unchanged one.
+    """
+    site = site or DEFAULT_SITE
+    cancelled = lambda: cancel is not None and cancel.is_set()
+    all_vehicles = []
+    escalate_from = None
+    headers = STATIC_HEADERS
+    static_warmup(site)
+
+    pages = crawl.tasks('html', cancelled) if crawl else range(1, MAX_PAGES + 1)
+    for task in pages:
+        page_num = task.page if crawl else task
+        if cancelled():
+            if crawl:
+                crawl.release(task)
+            escalate_from = page_num
+            break
+        url = "{}?page={}".format(site.target, page_num)
+        try:
+            polite_wait(url)
+            with HTTP_SLOTS, site.metrics.span('static.request'):
+                resp = site.session.get(url, headers=headers, timeout=20)
+            site.metrics.count('http.requests')
+            site.metrics.count('http.bytes', len(resp.content))
+        except requests.RequestException as e:
+            logger.info("Static tier: page {} failed ({}) — escalating".format(page_num, e))
+            if crawl:
+                crawl.release(task)
+            escalate_from = page_num
+            break
+
+        if resp.status_code == 404:
+            logger.info("Static tier: page {} returned 404 — end of listing".format(page_num))
+            if listing:
+                listing.ended(page_num)
+            if crawl:
+                crawl.complete(task, [])
+                crawl.skip_after('html', page_num)
+            break
+        if resp.status_code != 200:
+            site.metrics.count('http.status.{}'.format(resp.status_code))
+            logger.info("Static tier: page {} HTTP {} — escalating".format(page_num, resp.status_code))
+            if crawl:
+                crawl.release(task)
+            escalate_from = page_num
+            break
+
+        with site.metrics.span('parse.page'), PROFILER.stage('parse'):
+            page_vehicles = find_vehicles_in_html(resp.text)
+        site.metrics.count('pages')
+        site.metrics.count('cards', len(page_vehicles))
+        logger.info("Static tier: page {} — {} vehicles".format(page_num, len(page_vehicles)))
+
+        if not page_vehicles:
+            if not all_vehicles and not (crawl and crawl.vehicles('html')):
+                # No cards at all in the server-rendered HTML: the listing is built by
+                # JavaScript (or we were served a challenge page) — the browser decides
+                if crawl:
+                    crawl.release(task)
+                escalate_from = page_num
+                break
+            if listing:
+                listing.ended(page_num)
+            if crawl:
+                crawl.complete(task, [])
+                crawl.skip_after('html', page_num)
+            break
+
+        if crawl:
+            crawl.complete(task, page_vehicles)
+        all_vehicles.extend(page_vehicles)
+        if listing:
+            if page_num == 1 and listing.total is None:
+                listing.total = incremental.listing_total(resp.text)
+            reused = reuse_saved_pages(listing, crawl, page_num, page_vehicles, "Static tier")
+            if reused is not None:
+                site.metrics.count('incremental.reused_pages', listing.reused)
+                all_vehicles.extend(reused)
+                break
+        time.sleep(STATIC_PAGE_DELAY_S)
+
+    if escalate_from is not None:
+        logger.info("Static tier: pages from {} need the browser".format(escalate_from))
+    return (crawl.vehicles('html') if crawl else all_vehicles), escalate_from
+
+
+# -----------------------------------------------------------------------
+# Strategy 3: Playwright browser (DOM extraction, optional XHR capture)
+# -----------------------------------------------------------------------
+
+def launch_browser(pw, har_path=None):
+    """Launch headless Chromium and a stealth-configured context. Returns (browser, context)."""
+    browser = pw.chromium.launch(
+        headless=True,
+        args=[
+            "--no-sandbox",
+            "--disable-setuid-sandbox",
+            "--disable-blink-features=AutomationControlled",
+            "--disable-dev-shm-usage",
+            "--window-size=1366,768",
+        ],
+    )
+    context = browser.new_context(
+        user_agent=(
+            "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+            "AppleWebKit/537.36 (KHTML, like Gecko) "
+            "Chrome/131.0.0.0 Safari/537.36"
+        ),
+        viewport={"width": 1366, "height": 768},
+        locale="en-CA",
+        timezone_id="America/Edmonton",
+        java_script_enabled=True,
+        extra_http_headers={
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
+            "Accept-Language": "en-CA,en;q=0.9",
+            "Accept-Encoding": "gzip, deflate, br",
+            "DNT": "1",
+            "Upgrade-Insecure-Requests": "1",
+            "Sec-Fetch-Dest": "document",
+            "Sec-Fetch-Mode": "navigate",
+            "Sec-Fetch-Site": "none",
+            "Sec-Fetch-User": "?1",
+        },
+        **({"record_har_path": har_path} if har_path else {}),
+    )
+    context.add_init_script("""
+        Object.defineProperty(navigator, 'webdriver',           { get: () => undefined });
+        Object.defineProperty(navigator, 'plugins',             { get: () => [1,2,3,4,5] });
+        Object.defineProperty(navigator, 'languages',           { get: () => ['en-CA','en'] });
+        Object.defineProperty(navigator, 'platform',            { get: () => 'MacIntel' });
+        Object.defineProperty(navigator, 'hardwareConcurrency', { get: () => 8 });
+        window.chrome = { runtime: {} };
+    """)
+    return browser, context
+
+
+def scrape_html(context=None, warmup=True, cancel=None, site=None, crawl=None, first_page=1, xhr_hits=None,
+                listing=None):
     """
     Strategy 2: Playwright headless Chromium with homepage warmup.
     Visits homepage -> clicks into Used Inventory -> scrapes without re-navigating page 1.
+    Pass an already-open context (see scraper_service.py) to reuse a warm browser;
+    warmup=False then skips the homepage visit when the context holds session cookies.
+    HAR capture (TOYOTA_DEBUG_HAR) only applies to the cold path, where the context is ours.
+    If the cancel event is set, the scrape stops at the next step/page boundary and
+    returns what it has so far. With a crawl (crawl_frontier.Crawl), pages are claimed
+    from the frontier and the crawl's accumulated vehicles are returned; without
+    one, pagination starts at first_page (earlier pages came from the static tier).
+    Pass a list as xhr_hits to capture the JSON the inventory page loads itself:
+    when it covers the listing (capture_covers_listing) its vehicles are returned
+    without paginating and the endpoint is appended to the list. A listing (incremental.IncrementalRun) stops
+    pagination at the first page unchanged since the last run, as in scrape_static.
     Requires: pip install playwright && playwright install chromium
     """
+    if crawl and crawl.is_settled('html'):
+        return crawl.vehicles('html')
+
+    if context is not None:
+        page = context.new_page()
+        try:
+            with PROFILER.stage('browser', cpu=False):
+                return scrape_inventory_pages(page, warmup=warmup, cancel=cancel, site=site, crawl=crawl,
+                                              first_page=first_page, xhr_hits=xhr_hits, listing=listing)
+        finally:
+            page.close()
+
     try:
-        from playwright.sync_api import sync_playwright, TimeoutError as PWTimeout
+        from playwright.sync_api import sync_playwright
     except ImportError:
         logger.error("Playwright not installed. Run: pip install playwright && playwright install chromium")
         return []
 
-    all_vehicles = []
-    logger.info("Launching Playwright/Chromium...")
-
-    with sync_playwright() as pw:
-        browser = pw.chromium.launch(
-            headless=True,
-            args=[
-                "--no-sandbox",
-                "--disable-setuid-sandbox",
-                "--disable-blink-features=AutomationControlled",
-                "--disable-dev-shm-usage",
-                "--window-size=1366,768",
-            ],
-        )
-        context = browser.new_context(
-            user_agent=(
-                "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) "
-                "Chrome/131.0.0.0 Safari/537.36"
-            ),
-            viewport={"width": 1366, "height": 768},
-            locale="en-CA",
-            timezone_id="America/Edmonton",
-            java_script_enabled=True,
-            extra_http_headers={
-                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
-                "Accept-Language": "en-CA,en;q=0.9",
-                "Accept-Encoding": "gzip, deflate, br",
-                "DNT": "1",
-                "Upgrade-Insecure-Requests": "1",
-                "Sec-Fetch-Dest": "document",
-                "Sec-Fetch-Mode": "navigate",
-                "Sec-Fetch-Site": "none",
-                "Sec-Fetch-User": "?1",
-            },
-        )
-        context.add_init_script("""
-            Object.defineProperty(navigator, 'webdriver',           { get: () => undefined });
-            Object.defineProperty(navigator, 'plugins',             { get: () => [1,2,3,4,5] });
-            Object.defineProperty(navigator, 'languages',           { get: () => ['en-CA','en'] });
-            Object.defineProperty(navigator, 'platform',            { get: () => 'MacIntel' });
-            Object.defineProperty(navigator, 'hardwareConcurrency', { get: () => 8 });
-            window.chrome = { runtime: {} };
-        """)
+    site = site or DEFAULT_SITE
+    with BROWSER_SLOTS, PROFILER.stage('browser', cpu=False):
+        logger.info("Launching Playwright/Chromium...")
+        with sync_playwright() as pw:
+            with site.metrics.span('browser.launch'):
+                browser, context = launch_browser(pw, har_path=site.artifacts.har_path())
+            try:
+                return scrape_inventory_pages(context.new_page(), warmup=True, cancel=cancel,
+                                              site=site, crawl=crawl, first_page=first_page,
+                                              xhr_hits=xhr_hits, listing=listing)
+            finally:
+                context.close()  # flushes the HAR, if one is being recorded
+                browser.close()
 
-        page = context.new_page()
 
-        # Step 1: Visit homepage to get Cloudflare session cookie
+def scrape_inventory_pages(page, warmup=True, cancel=None, site=None, crawl=None, first_page=1, xhr_hits=None,
+                           listing=None):
+    """Drive one page through warmup, inventory navigation and pagination."""
+    from playwright.sync_api import TimeoutError as PWTimeout
+
+    site = site or DEFAULT_SITE
+
+    all_vehicles = []
+    cancelled = lambda: cancel is not None and cancel.is_set()
+    xhr_responses = []
+    if xhr_hits is not None:
+        # Only collect here; bodies are read once the inventory page has loaded
+        on_response = lambda r: xhr_responses.append(r) if r.request.resource_type in ('xhr', 'fetch') else None
+        page.on('response', on_response)
+
+    # Step 1: Visit homepage to get Cloudflare session cookie
+    t_step = time.perf_counter()
+    if warmup or not page.context.cookies(site.base):
         try:
             logger.info("Step 1: Loading homepage for Cloudflare session...")
-            resp = page.goto(BASE + "/", wait_until="networkidle", timeout=30000)
+            resp = page.goto(site.base + "/", wait_until="networkidle", timeout=30000)
             logger.info("Homepage status: {}".format(resp.status if resp else "?"))
             time.sleep(2)
             page.mouse.move(400, 300)
@@ -982,9 +1389,17 @@ def scrape_html():
             time.sleep(2)
         except Exception as e:
             logger.warning("Homepage warmup failed (continuing): {}".format(e))
+    else:
+        logger.info("Step 1: Warm context — skipping homepage warmup")
+    site.metrics.observe('browser.warmup', time.perf_counter() - t_step, t_step)
+
+    if cancelled():
+        return all_vehicles
+    t_step = time.perf_counter()
 
-        # Step 2: Click into Used Inventory via nav (most human-like)
-        reached_inventory = False
+    # Step 2: Click into Used Inventory via nav (most human-like)
+    reached_inventory = False
+    if warmup:
         try:
             logger.info("Step 2: Clicking into inventory via nav...")
             nav_selectors = [
@@ -1010,117 +1425,238 @@ def scrape_html():
         except Exception as e:
             logger.warning("Nav click failed: {}".format(e))
 
-        # Step 3: Fallback goto with Referer if click didn't work
-        if not reached_inventory:
-            logger.info("Step 3: goto with Referer header fallback...")
-            try:
-                resp = page.goto(TARGET, wait_until="domcontentloaded",
-                                 timeout=45000, referer=BASE + "/")
-                status = resp.status if resp else 0
-                logger.info("Inventory status (referer fallback): {}".format(status))
-                if status == 403:
-                    logger.error("403 blocked — verify runner is self-hosted with residential IP.")
-                    browser.close()
-                    return []
-                time.sleep(3)
-                reached_inventory = True
-            except Exception as e:
-                logger.error("goto with referer failed: {}".format(e))
-                browser.close()
+    # Step 3: Fallback goto with Referer if click didn't work
+    if not reached_inventory:
+        logger.info("Step 3: goto with Referer header fallback...")
+        try:
+            resp = page.goto(site.target, wait_until="domcontentloaded",
+                             timeout=45000, referer=site.base + "/")
+            status = resp.status if resp else 0
+            logger.info("Inventory status (referer fallback): {}".format(status))
+            if status == 403:
+                logger.error("403 blocked — verify runner is self-hosted with residential IP.")
+                site.artifacts.capture("blocked_403.html", page.content, failure=True)
                 return []
+            time.sleep(3)
+            reached_inventory = True
+        except Exception as e:
+            logger.error("goto with referer failed: {}".format(e))
+            return []
 
-        # Step 4: Paginate — page 1 is already loaded, don't re-navigate it
-        for page_num in range(1, 11):
-            try:
-                if page_num == 1:
-                    # Already on page 1 — just wait for content and read
-                    try:
-                        page.wait_for_selector(
-                            ", ".join([
-                                ".vehicle-card", ".inventory-item", ".vehicle-listing",
-                                "[data-vehicle-id]", "article", ".srp-list-item",
-                                ".inventory-list-item", "[class*='VehicleCard']",
-                            ]),
-                            timeout=20000,
-                        )
-                    except PWTimeout:
-                        logger.warning("Selector timeout page 1 — parsing anyway")
-                    time.sleep(2)
-                else:
-                    url = "{}?page={}".format(TARGET, page_num)
-                    logger.info("Navigating to page {}: {}".format(page_num, url))
-                    resp = page.goto(url, wait_until="domcontentloaded",
-                                     timeout=45000, referer=TARGET)
-                    status = resp.status if resp else 0
-                    logger.info("Page {} HTTP status: {}".format(page_num, status))
-                    if status == 403:
-                        logger.error("403 on page {} — stopping".format(page_num))
-                        break
-                    try:
-                        page.wait_for_selector(
-                            ", ".join([
-                                ".vehicle-card", ".inventory-item", ".vehicle-listing",
-                                "[data-vehicle-id]", "article", ".srp-list-item",
-                            ]),
-                            timeout=15000,
-                        )
-                    except PWTimeout:
-                        logger.warning("Selector timeout page {} — parsing anyway".format(page_num))
-                    time.sleep(2)
+    site.metrics.observe('browser.inventory_nav', time.perf_counter() - t_step, t_step)
+
+    if xhr_hits is not None:
+        page.remove_listener('response', on_response)
+        url, xhr_vehicles = captured_inventory(xhr_responses, site)
+        if xhr_vehicles and capture_covers_listing(page, xhr_vehicles):
+            logger.info("XHR capture: {} vehicles from {} — skipping pagination".format(len(xhr_vehicles), url))
+            xhr_hits.append(url)
+            if crawl:
+                crawl.record('json', 1, xhr_vehicles)
+            return xhr_vehicles
+        if not xhr_vehicles:
+            logger.info("XHR capture: no inventory JSON among {} requests — reading the DOM".format(
+                len(xhr_responses)))
+
+    # Step 4: Paginate — page 1 is already loaded, don't re-navigate it.
+    # With a crawl frontier, pages come from the crawl instead: a resumed run
+    # jumps straight to the first unfinished page, and several workers can
+    # share one crawl.
+    pages = crawl.tasks('html', cancelled) if crawl else range(first_page, MAX_PAGES + 1)
+    current = 1
+    for task in pages:
+        page_num = task.page if crawl else task
+        if cancelled():
+            logger.info("Browser scrape cancelled before page {}".format(page_num))
+            if crawl:
+                crawl.release(task)
+            break
+        try:
+            blocked, page_vehicles = read_inventory_page(page, page_num, site, navigate=page_num != current)
+            current = page_num
+        except PWTimeout:
+            logger.error("Timeout on page {}".format(page_num))
+            site.artifacts.capture("page{}_timeout.html".format(page_num), page.content, failure=True)
+            if crawl:
+                crawl.fail(task, "timeout")
+            break
+        except Exception as e:
+            logger.error("Error on page {}: {}".format(page_num, e))
+            site.artifacts.capture("page{}_error.html".format(page_num), page.content, failure=True)
+            if crawl:
+                crawl.fail(task, e)
+            break
+
+        if blocked:
+            if crawl:
+                crawl.fail(task, "403")
+            break
+        if crawl:
+            crawl.complete(task, page_vehicles)
+        if not page_vehicles:
+            logger.info("No vehicles on page {} — stopping pagination".format(page_num))
+            if page_num == 1:
+                site.artifacts.capture("page1_empty.html", page.content, failure=True)
+            elif listing:
+                listing.ended(page_num)
+            if not crawl:
+                break
+            crawl.skip_after('html', page_num)
+            continue
 
-                html = page.content()
+        all_vehicles.extend(page_vehicles)
+        if listing:
+            reused = reuse_saved_pages(listing, crawl, page_num, page_vehicles, "Browser")
+            if reused is not None:
+                site.metrics.count('incremental.reused_pages', listing.reused)
+                all_vehicles.extend(reused)
+                break
+        time.sleep(2)
 
-                if page_num == 1:
-                    with open("debug_page1.html", "w", encoding="utf-8") as f:
-                        f.write(html)
-                    logger.info("Saved debug_page1.html ({} bytes)".format(len(html)))
+    return crawl.vehicles('html') if crawl else all_vehicles
 
-                page_vehicles = find_vehicles_in_html(html)
-                logger.info("Page {} — {} vehicles extracted".format(page_num, len(page_vehicles)))
 
-                if not page_vehicles:
-                    logger.info("No vehicles on page {} — stopping pagination".format(page_num))
-                    break
+def captured_inventory(responses, site):
+    """(url, vehicles) for the captured JSON response holding the most vehicles."""
+    best_url, best = None, []
+    for resp in responses:
+        if 'json' not in (resp.headers.get('content-type') or ''):
+            continue
+        try:
+            with PROFILER.stage('parse'):
+                vehicles = vehicles_from_payload(resp.json())
+        except Exception:
+            continue  # body gone (redirect, aborted) or not JSON after all
+        site.metrics.count('browser.xhr_json')
+        if len(vehicles) > len(best):
+            best_url, best = resp.url, vehicles
+    return best_url, best
+
 
-                all_vehicles.extend(page_vehicles)
-                time.sleep(2)
+def capture_covers_listing(page, vehicles):
+    """
+    Whether captured JSON holds the whole listing rather than one page of it (a
+    paginated inventory XHR) or a widget's pick (featured vehicles). It must reach
+    the total the loaded page states; with no total, it must hold more vehicles
+    than page 1 shows, since a capture the size of one page cannot be told apart
+    from the first page of a paginated feed.
+    """
+    html = page.content()
+    total = incremental.listing_total(html)
+    with PROFILER.stage('parse'):
+        cards = len(find_vehicles_in_page(page) if EXTRACT_MODE == "dom" else find_vehicles_in_html(html))
+    if (len(vehicles) >= total) if total is not None else (len(vehicles) > cards):
+        return True
+    logger.info("XHR capture: {} vehicles, but the listing shows {} — reading the DOM".format(
+        len(vehicles), "{} in total".format(total) if total is not None else "{} on page 1".format(cards)))
+    return False
+
+
+def read_inventory_page(page, page_num, site, navigate=True):
+    """
+    Load (if navigate) and extract one results page. Returns (blocked, vehicles);
+    Playwright timeouts and errors propagate to the caller.
+    """
+    from playwright.sync_api import TimeoutError as PWTimeout
 
+    with site.metrics.span('browser.navigate'):
+        if not navigate:
+            # Already on this page — just wait for content and read
+            try:
+                page.wait_for_selector(
+                    ", ".join([
+                        ".vehicle-card", ".inventory-item", ".vehicle-listing",
+                        "[data-vehicle-id]", "article", ".srp-list-item",
+                        ".inventory-list-item", "[class*='VehicleCard']",
+                    ]),
+                    timeout=20000,
+                )
             except PWTimeout:
-                logger.error("Timeout on page {}".format(page_num))
-                break
-            except Exception as e:
-                logger.error("Error on page {}: {}".format(page_num, e))
-                break
+                logger.warning("Selector timeout page {} — parsing anyway".format(page_num))
+            time.sleep(2)
+        else:
+            url = "{}?page={}".format(site.target, page_num)
+            logger.info("Navigating to page {}: {}".format(page_num, url))
+            resp = page.goto(url, wait_until="domcontentloaded",
+                             timeout=45000, referer=site.target)
+            status = resp.status if resp else 0
+            logger.info("Page {} HTTP status: {}".format(page_num, status))
+            site.metrics.count('browser.navigations')
+            if resp is not None:
+                site.metrics.count('browser.bytes', int(resp.headers.get('content-length') or 0))
+            if status == 403:
+                site.metrics.count('browser.status.403')
+                logger.error("403 on page {} — stopping".format(page_num))
+                site.artifacts.capture("page{}_403.html".format(page_num), page.content, failure=True)
+                return True, []
+            try:
+                page.wait_for_selector(
+                    ", ".join([
+                        ".vehicle-card", ".inventory-item", ".vehicle-listing",
+                        "[data-vehicle-id]", "article", ".srp-list-item",
+                    ]),
+                    timeout=15000,
+                )
+            except PWTimeout:
+                logger.warning("Selector timeout page {} — parsing anyway".format(page_num))
+            time.sleep(2)
+
+    site.artifacts.capture("page{}.html".format(page_num), page.content)
+
+    with site.metrics.span('parse.page'), PROFILER.stage('parse'):
+        if EXTRACT_MODE == "dom":
+            page_vehicles = find_vehicles_in_page(page)
+        else:
+            page_vehicles = find_vehicles_in_html(page.content())
+    site.metrics.count('pages')
+    site.metrics.count('cards', len(page_vehicles))
+    logger.info("Page {} — {} vehicles extracted".format(page_num, len(page_vehicles)))
+    return False, page_vehicles
 
-        browser.close()
 
-    return all_vehicles
+def find_vehicles_in_page(page):
+    """
+    Run the selector cascade inside the browser and parse only the compact
+    card payloads, skipping the page.content() serialize/copy/reparse cycle.
+    Falls back to the full-HTML path when no selector yields vehicles.
+    """
+    for selector in CARD_SELECTORS:
+        cards = page.evaluate(CARD_EXTRACT_JS, selector)
+        if not cards: continue
+        vehicles = [v for v in parse_cards([(text, attrs, card_link([link])) for text, attrs, link in cards])
+                    if keep_card(v)]
+        if vehicles:
+            logger.info("Selector '{}' — {} vehicles (in-page)".format(selector, len(vehicles)))
+            return vehicles
+    logger.info("In-page extraction found nothing — falling back to full HTML parse")
+    return find_vehicles_in_html(page.content())
 
 
 def find_vehicles_in_html(html):
-    """Parse HTML string and return list of valid vehicle dicts."""
+    """
+    Parse HTML string and return the list of valid Vehicles. A page whose
+    content was parsed before (PARSE_CACHE) is not parsed again.
+    """
+    key = parse_cache.page_key(html)
+    cached = PARSE_CACHE.get('page', [key])
+    if cached:
+        vehicles = [Vehicle.from_dict(v) for v in cached[key]]
+        logger.info("Parse cache: page unchanged — {} vehicles".format(len(vehicles)))
+        return vehicles
+    vehicles = parse_vehicles_in_html(html)
+    PARSE_CACHE.put('page', {key: vehicles})
+    return vehicles
+
+
+def parse_vehicles_in_html(html):
     soup = BeautifulSoup(html, "html.parser")
-    selectors = [
-        "[data-vehicle-id]","[data-stock-number]","[data-vin]",
-        ".vehicle-card",".inventory-item",".vehicle-listing",
-        "article[class*='vehicle']","div[class*='vehicle']",
-        "li[class*='vehicle']",".vehicle","article","li[class*='item']",
-    ]
     vehicles, seen = [], set()
-    for selector in selectors:
+    for selector in CARD_SELECTORS:
         elements = soup.select(selector)
         if not elements: continue
-        count = 0
-        for idx, el in enumerate(elements):
-            eid = id(el)
-            if eid in seen: continue
-            v = parse_html_element(el, idx)
-            if is_valid(v):
-                vehicles.append(v)
-                seen.add(eid)
-                count += 1
-        if count:
-            logger.info("Selector '{}' — {} vehicles".format(selector, count))
+        vehicles = [v for v in parse_cards([card_payload(el) for el in elements]) if keep_card(v)]
+        if vehicles:
+            logger.info("Selector '{}' — {} vehicles".format(selector, len(vehicles)))
             return vehicles
     # Broad fallback
     for idx, div in enumerate(soup.find_all(["div","section","article","li"])):
@@ -1138,20 +1674,344 @@ def find_vehicles_in_html(html):
     return vehicles
 
 
+# Parsed pages and cards are reused across runs until any of this changes (see parse_cache.py)
+PARSER_VERSION = parse_cache.code_version(
+    parse_cache, vehicle_record, extract_make_model, extract_trim, extract_prices_from_text, card_link,
+    card_payload, parse_card, parse_card_text, parse_cards, parse_vehicles_in_html, is_valid, is_enrichable,
+    keep_card, CAR_MAKES, TRIM_PATTERNS, CARD_SELECTORS, CARD_EXTRACT_JS, MILEAGE_ATTR_RE.pattern,
+    vdp_enrichment.enabled(), bs4.__version__)
+PARSE_CACHE = parse_cache.ParseCache.from_env(PARSER_VERSION)
+
+
+# -----------------------------------------------------------------------
+# Enrichment: vehicle detail pages
+# -----------------------------------------------------------------------
+
+def get_detail_page(url, site, span):
+    """GET one detail page, TOYOTA_ENRICH_INTERVAL apart per host. Returns the response, or None on a network error."""
+    headers = dict(STATIC_HEADERS, Referer=site.target)
+    try:
+        with HTTP_SLOTS:
+            polite_wait(url, vdp_enrichment.INTERVAL_S)
+            with site.metrics.span(span):
+                resp = site.session.get(url, headers=headers, timeout=20)
+        site.metrics.count('http.requests')
+        site.metrics.count('http.bytes', len(resp.content))
+    except requests.RequestException as e:
+        logger.info("VDP {} failed: {}".format(url, e))
+        return None
+    return resp
+
+
+def fetch_vdp(url, site):
+    """One detail page -> a vdp_enrichment cache entry (status 'ok', 'empty', 'http_NNN' or 'error')."""
+    entry = {'url': url, 'fields': {}, 'status': 'error', 'fetched_at': time.time()}
+    resp = get_detail_page(url, site, 'enrich.request')
+    if resp is None:
+        return entry
+    if resp.status_code != 200:
+        entry['status'] = 'http_{}'.format(resp.status_code)
+        return entry
+    with PROFILER.stage('parse'):
+        entry['fields'] = vdp_enrichment.parse_vdp(resp.text)
+    entry['status'] = 'ok' if entry['fields'] else 'empty'
+    return entry
+
+
+def enrich_from_vdps(vehicles, site=None):
+    """
+    Fill missing fields from detail pages, in place. Cached results are applied
+    without a request; only vehicles the cache has nothing (usable) for are fetched,
+    TOYOTA_ENRICH_WORKERS at a time.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    site = site or DEFAULT_SITE
+    cache = vdp_enrichment.VdpCache.from_env()
+    keyed = [(vdp_enrichment.vehicle_key(v), v) for v in vehicles]
+    keys = [k for k, _ in keyed if k]
+    try:
+        entries = cache.lookup(site.dealer_id, keys)
+    except Exception as e:
+        logger.warning("VDP cache unavailable, fetching without it: {}".format(e))
+        entries = {}
+
+    now = time.time()
+    todo, from_cache, from_fetch = [], 0, 0
+    for key, v in keyed:
+        if not key or not vdp_enrichment.needs_fields(v):
+            continue
+        entry = entries.get(key)
+        if v.get('detail_url') and vdp_enrichment.due(entry, now, needs_price=not v.get('value')):
+            todo.append((key, v))
+        elif vdp_enrichment.apply(v, entry, now):
+            from_cache += 1
+            site.metrics.count('vdp.cached')
+    if len(todo) > vdp_enrichment.MAX_FETCHES:
+        logger.info("VDP: {} detail pages due, fetching {} this run".format(len(todo), vdp_enrichment.MAX_FETCHES))
+        todo = todo[:vdp_enrichment.MAX_FETCHES]
+
+    results = {}
+    if todo:
+        urls = [urljoin(site.target, v['detail_url']) for _, v in todo]
+        with ThreadPoolExecutor(max_workers=max(1, min(vdp_enrichment.WORKERS, len(todo))),
+                                thread_name_prefix='vdp') as pool:
+            for (key, v), entry in zip(todo, pool.map(lambda url: fetch_vdp(url, site), urls)):
+                entry = results[key] = vdp_enrichment.refetched(entries.get(key), entry)
+                site.metrics.count('vdp.fetched')
+                if vdp_enrichment.apply(v, entry, now):
+                    from_fetch += 1
+                    site.metrics.count('vdp.filled')
+    try:
+        cache.store(site.dealer_id, results, keys)
+    except Exception as e:
+        logger.warning("VDP cache not written: {}".format(e))
+    logger.info("VDP enrichment: {} vehicles filled from the cache, {} from {} detail pages fetched".format(
+        from_cache, from_fetch, len(results)))
+    return vehicles
+
+
+# -----------------------------------------------------------------------
+# Sitemap: detail pages as a change feed
+# -----------------------------------------------------------------------
+
+# Card-text fields first (same vocabulary as the listing tiers), then the VDP's own data for the blanks
+VDP_FIELDS = [('year', 'year'), ('makeName', 'make'), ('model', 'model'), ('trim', 'trim'),
+              ('stock_number', 'stock_number'), ('mileage', 'mileage'), ('engine', 'engine'), ('vin', 'vin')]
+
+
+def vehicle_from_vdp(html, url):
+    """A full vehicle record from one detail page: heading and price block like a card, specs from JSON-LD/spec rows."""
+    soup = BeautifulSoup(html, "html.parser")
+    try:
+        fields = vdp_enrichment.parse_vdp_soup(soup)
+        v = parse_card_text(vdp_enrichment.headline_text(soup))
+    finally:
+        soup.decompose()
+    for key, field in VDP_FIELDS:
+        if fields.get(field) and not v.get(key):
+            v[key] = fields[field]
+    if not v.sub_model:
+        v.sub_model = v.trim
+    if v.value is None and fields.get('price'):
+        v.value = fields['price']
+    v.detail_url = url
+    return v
+
+
+def sitemap_roots(site):
+    """TOYOTA_SITEMAP_URL, else the Sitemap: lines of robots.txt, else /sitemap.xml."""
+    if sitemap_discovery.SITEMAP_URLS:
+        return [urljoin(site.base + '/', u) for u in sitemap_discovery.SITEMAP_URLS]
+    try:
+        polite_wait(site.base)
+        with HTTP_SLOTS, site.metrics.span('sitemap.request'):
+            resp = site.session.get(site.base + '/robots.txt', headers=STATIC_HEADERS, timeout=20)
+        site.metrics.count('http.requests')
+        found = sitemap_discovery.robots_sitemaps(resp.text) if resp.status_code == 200 else []
+    except requests.RequestException as e:
+        logger.info("Sitemap: robots.txt failed ({})".format(e))
+        found = []
+    return [urljoin(site.base + '/', u) for u in found] or [site.base + '/sitemap.xml']
+
+
+def fetch_sitemap(url, site, prev=None):
+    """
+    One sitemap file, streamed and parsed as it arrives, sent with the validators
+    of the last read. Returns (status, entries, validators): entries lists
+    ('sitemap' | 'url', loc, lastmod) for child sitemaps and VDP URLs; status is
+    None on a network or XML error.
+    """
+    headers = {'Accept': 'application/xml,text/xml;q=0.9,*/*;q=0.8', 'X-Requested-With': None}
+    if prev and prev.get('etag'):
+        headers['If-None-Match'] = prev['etag']
+    if prev and prev.get('last_modified'):
+        headers['If-Modified-Since'] = prev['last_modified']
+    try:
+        polite_wait(url)
+        with HTTP_SLOTS, site.metrics.span('sitemap.request'):
+            resp = site.session.get(url, headers=headers, timeout=30, stream=True)
+            try:
+                if resp.status_code != 200:
+                    return resp.status_code, None, {}
+                resp.raw.decode_content = True
+                with PROFILER.stage('parse'):
+                    entries = [e for e in sitemap_discovery.iter_sitemap(resp.raw, url.endswith('.gz'))
+                               if e[0] == 'sitemap' or sitemap_discovery.is_vehicle_url(e[1])]
+                site.metrics.count('http.bytes', resp.raw.tell())
+            finally:
+                resp.close()
+        site.metrics.count('http.requests')
+    except (requests.RequestException, ParseError, OSError, EOFError) as e:
+        logger.info("Sitemap {} failed: {}".format(url, e))
+        return None, None, {}
+    return 200, entries, {'etag': resp.headers.get('ETag'), 'last_modified': resp.headers.get('Last-Modified')}
+
+
+def read_sitemaps(roots, state, site, cancel=None):
+    """
+    Walk the sitemap tree from roots. Files unchanged since the last run (same
+    lastmod in their index, or 304) are not re-read: their URLs come from state.
+    Returns (files, listed, ok): listed maps each VDP URL to (lastmod, source
+    file); ok is False when part of the tree could not be read.
+    """
+    files, listed, ok = {}, {}, True
+    queue = [(url, '', None) for url in roots]
+    while queue:
+        url, parent, lastmod = queue.pop(0)
+        if url in files:
+            continue
+        if len(files) >= sitemap_discovery.MAX_FILES or (cancel is not None and cancel.is_set()):
+            logger.info("Sitemap: stopped with {} files left unread".format(len(queue) + 1))
+            ok = False
+            break
+        prev = state.files.get(url)
+        if prev and lastmod and lastmod == prev['lastmod']:
+            status, entries, validators = 304, None, {}
+        else:
+            status, entries, validators = fetch_sitemap(url, site, prev)
+        if status != 200 and not (status == 304 and prev):
+            if status is not None:
+                logger.info("Sitemap {}: HTTP {}".format(url, status))
+            ok = False
+            if not prev:
+                continue
+            status = 304  # read what it listed last time, but the run stays incomplete
+        if status == 304:
+            site.metrics.count('sitemap.unchanged')
+            files[url] = dict(prev, parent=parent, lastmod=lastmod or prev['lastmod'])
+            if prev['kind'] == 'index':
+                queue.extend((child, url, child_lastmod) for child, child_lastmod in state.children(url))
+            else:
+                listed.update((u, (lm, url)) for u, lm in state.listed_in(url).items())
+            continue
+        kind = 'index' if any(e[0] == 'sitemap' for e in entries) else 'urlset'
+        files[url] = dict(validators, parent=parent, kind=kind, lastmod=lastmod)
+        for entry_kind, loc, entry_lastmod in entries:
+            if entry_kind == 'sitemap':
+                queue.append((urljoin(url, loc), url, entry_lastmod))
+            else:
+                listed[urljoin(url, loc)] = (entry_lastmod, url)
+    return files, listed, ok
+
+
+def fetch_sitemap_vdp(url, site, cancel=None):
+    """A detail page listed in the sitemap -> its vehicle record, or None (not fetched, failed or unparseable)."""
+    if cancel is not None and cancel.is_set():
+        return None
+    resp = get_detail_page(url, site, 'sitemap.vdp')
+    if resp is None or resp.status_code != 200:
+        return None
+    with PROFILER.stage('parse'):
+        v = vehicle_from_vdp(resp.text, url)
+    return v if is_valid(v) else None
+
+
+def scrape_sitemap(cancel=None, site=None):
+    """
+    Vehicles from the dealer's sitemap: VDP URLs are diffed against the last run,
+    only new or changed detail pages are fetched (TOYOTA_SITEMAP_WORKERS at a time)
+    and URLs that left the sitemap are marked sold. Returns (vehicles, complete).
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    site = site or DEFAULT_SITE
+    store = sitemap_discovery.SitemapStore.from_env()
+    try:
+        state = store.load(site.dealer_id)
+    except Exception as e:
+        logger.warning("Sitemap state unavailable, reading everything: {}".format(e))
+        state = sitemap_discovery.SitemapState()
+
+    files, listed, ok = read_sitemaps(sitemap_roots(site), state, site, cancel)
+    if not listed:
+        logger.info("Sitemap: no vehicle detail pages found in {} files".format(len(files)))
+        return [], False
+    due = state.due(listed)
+    complete = ok
+    if len(due) > sitemap_discovery.MAX_FETCHES:
+        logger.info("Sitemap: {} detail pages due, fetching {} this run".format(
+            len(due), sitemap_discovery.MAX_FETCHES))
+        due = due[:sitemap_discovery.MAX_FETCHES]
+        complete = False
+
+    fetched = {}
+    if due:
+        with ThreadPoolExecutor(max_workers=max(1, min(sitemap_discovery.WORKERS, len(due))),
+                                thread_name_prefix='sitemap') as pool:
+            for url, v in zip(due, pool.map(lambda url: fetch_sitemap_vdp(url, site, cancel), due)):
+                fetched[url] = v
+        site.metrics.count('sitemap.fetched', len(fetched))
+    # A partial walk says nothing about what left the lot
+    sold = state.vanished(listed) if ok else []
+    try:
+        store.save(site.dealer_id, files, listed, fetched, sold, prune=ok)
+    except Exception as e:
+        logger.warning("Sitemap state not written: {}".format(e))
+
+    vehicles, failed = [], 0
+    for url in listed:
+        v = fetched.get(url)
+        if v is None:
+            if url in fetched:
+                failed += 1
+            known = state.urls.get(url)
+            if not known or not known['vehicle']:
+                continue
+            v = Vehicle.from_dict(known['vehicle'])  # last good copy, if this fetch failed
+        vehicles.append(v)
+    if failed or len(vehicles) < len(listed):
+        complete = False
+    site.metrics.count('sitemap.sold', len(sold))
+    logger.info("Sitemap: {} vehicle URLs in {} files, {} detail pages fetched ({} failed), {} sold{}".format(
+        len(listed), len(files), len(fetched), failed, len(sold), "" if complete else " (incomplete)"))
+    return vehicles, complete
+
+
 # -----------------------------------------------------------------------
 # Main
 # -----------------------------------------------------------------------
 
 def save_csv(vehicles, path):
-    fields = ['makeName','year','model','sub-model','trim','mileage',
-              'value','sale_value','stock_number','engine']
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=fields)
-        writer.writeheader()
-        for v in vehicles:
-            writer.writerow({field: v.get(field,'') for field in fields})
-    logger.info("CSV saved: {} ({} rows)".format(path, len(vehicles)))
+    """Canonical, change-aware CSV write plus the hashed JSON index. Returns the delta."""
+    delta = write_inventory(vehicles, path)
+    write_index(canonical_rows(vehicles), os.path.dirname(path))
+    return delta
+
+
+def publish(vehicles, path, site=None):
+    """Write the CSV/index outputs, append the run to the history store, write the analytics report, render posters if enabled."""
+    site = site or DEFAULT_SITE
+    with site.metrics.span('save_csv'), PROFILER.stage('write'):
+        delta = save_csv(vehicles, path)
+    if inventory_history.HISTORY_DB.lower() != 'off':
+        try:
+            with site.metrics.span('history'), PROFILER.stage('write'):
+                inventory_history.record_run(vehicles, dealer=site.dealer_id)
+        except Exception as e:
+            logger.warning("History not recorded: {}".format(e))
+    if os.environ.get("TOYOTA_REPORT", "on").lower() not in ("0", "off", "false", "no"):
+        try:
+            import inventory_analytics
+            history = None if inventory_history.HISTORY_DB.lower() == 'off' else inventory_history.HISTORY_DB
+            with site.metrics.span('report'), PROFILER.stage('report'):
+                inventory_analytics.write_report(vehicles, path, dealer=site.dealer_id, history_path=history)
+        except ImportError:
+            logger.warning("Report skipped: numpy not installed. Run: pip install numpy")
+        except Exception as e:
+            logger.warning("Report not written: {}".format(e))
+    if os.environ.get("TOYOTA_POSTERS", "") == "1":
+        import poster_renderer
+        # Registry dealers keep their posters next to their own CSV, so one dealer never prunes another's
+        out_dir = os.path.join(os.path.dirname(site.output), 'posters') if site.output else poster_renderer.DEFAULT_OUT
+        with site.metrics.span('posters'):
+            poster_renderer.render_all(vehicles, out_dir)
+    return delta
+
+
+def finish_run(vehicles, site=None):
+    """Close the run's metrics record (TOYOTA_METRICS) once the outputs are written."""
+    (site or DEFAULT_SITE).metrics.end_run(ok=bool(vehicles))
 
 
 def print_results(vehicles):
@@ -1179,26 +2039,304 @@ def print_results(vehicles):
             v.get('sale_value','')[:11], v.get('stock_number','')[:9]))
 
 
-def main():
+def default_csv_path():
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.abspath(os.path.join(script_dir, '..', '..'))
+    return os.path.join(project_root, 'public', 'data', 'inventory.csv')
+
+
+def json_strategy(cancel=None, site=None, crawl=None):
+    """JSON discovery, reusing (and recording) the crawl's result when there is one."""
+    if crawl:
+        done = crawl.vehicles('json')
+        if done:
+            logger.info("Frontier: JSON result already recorded for this crawl ({} vehicles)".format(len(done)))
+            return done
+    vehicles = discover_and_scrape_json(cancel=cancel, site=site)
+    if crawl and vehicles:
+        crawl.record('json', 1, vehicles)
+    return vehicles
+
+
+class PlanRun:
+    """What the tiers of one run share: where the cheaper tiers left off and what the browser saw."""
+
+    def __init__(self, site, crawl=None, context=None, warmup=True):
+        self.site = site
+        self.crawl = crawl
+        self.context = context
+        self.warmup = warmup
+        self.first_page = 1    # first results page the cheaper tiers could not read
+        self.xhr_hits = None   # a list when browser_xhr is planned: endpoints XHR capture found
+        self.listing = None    # incremental.IncrementalRun when TOYOTA_INCREMENTAL is on
+
+
+@REGISTRY.register('json', cost_s=5, ok_rate=0.5)
+def json_tier(run, cancel):
+    """Dealer JSON API (configured, learned or discovered): the whole inventory in a few requests."""
+    vehicles = json_strategy(cancel=cancel, site=run.site, crawl=run.crawl)
+    return vehicles, bool(vehicles)
+
+
+def sitemap_tier(run, cancel):
+    """Dealer sitemap: only detail pages that are new or changed since the last run are fetched."""
+    if run.crawl:
+        done = run.crawl.vehicles('sitemap')
+        if done:
+            logger.info("Frontier: sitemap result already recorded for this crawl ({} vehicles)".format(len(done)))
+            return done, True
+    vehicles, complete = scrape_sitemap(cancel=cancel, site=run.site)
+    if run.crawl and complete:
+        run.crawl.record('sitemap', 1, vehicles)
+    return vehicles, complete
+
+
+# Opt-in: a dealer without VDPs in its sitemap would otherwise pay for the robots.txt/sitemap requests every run
+if sitemap_discovery.enabled():
+    REGISTRY.register('sitemap', cost_s=4, ok_rate=0.6)(sitemap_tier)
+
+
+@REGISTRY.register('static', cost_s=10, ok_rate=0.5)
+def static_tier(run, cancel):
+    """Results pages over plain HTTP; pages without cards are escalated to the browser."""
+    vehicles, escalate_from = scrape_static(cancel=cancel, site=run.site, crawl=run.crawl, listing=run.listing)
+    if escalate_from is not None:
+        run.first_page = escalate_from
+    return vehicles, bool(vehicles) and escalate_from is None
+
+
+@REGISTRY.register('browser_xhr', cost_s=40, ok_rate=0.3, browser=True)
+@REGISTRY.register('browser_dom', cost_s=75, ok_rate=0.9, browser=True)
+def browser_tier(run, cancel):
+    """Chromium: inventory JSON captured from the page's own requests, else the rendered DOM."""
+    vehicles = scrape_html(run.context, warmup=run.warmup, cancel=cancel, site=run.site, crawl=run.crawl,
+                           first_page=run.first_page, xhr_hits=run.xhr_hits, listing=run.listing)
+    if run.xhr_hits:
+        # Next run, the json tier tries this endpoint over plain HTTP before any browser
+        PLANNER.stats.note(run.site.dealer_id, 'json', api_url=run.xhr_hits[0])
+    return vehicles, bool(vehicles)
+
+
+def attempt_strategy(strategy, run, cancel):
+    """Run one step of the plan and fold its outcome into the planner's stats."""
+    site = run.site
+    name = 'browser' if strategy.browser else strategy.name
+    t0 = time.perf_counter()
+    vehicles, complete = [], False
+    try:
+        with site.metrics.span('strategy.{}'.format(name)):
+            vehicles, complete = strategy.fn(run, cancel)
+    except Exception as e:
+        logger.error("Strategy {} failed: {}".format(name, e))
+    elapsed = time.perf_counter() - t0
+    logger.info("Strategy {}: {} vehicles in {:.1f}s{}".format(
+        name, len(vehicles), elapsed, "" if complete else " (incomplete)"))
+    if cancel.is_set() and not complete:
+        return vehicles, complete  # stopped because another tier won: says nothing about this one
+    if strategy.browser:
+        # One Chromium session covers both browser tiers: XHR capture, then the DOM if that found nothing
+        if run.xhr_hits is not None:
+            PLANNER.record(site.dealer_id, 'browser_xhr', bool(run.xhr_hits), elapsed)
+        if not run.xhr_hits:
+            PLANNER.record(site.dealer_id, 'browser_dom', complete, elapsed)
+    else:
+        PLANNER.record(site.dealer_id, strategy.name, complete, elapsed)
+    return vehicles, complete
+
+
+def run_strategies_hedged(context=None, warmup=True, hedge_after=None, site=None, crawl=None, listing=None):
+    """
+    Run the strategy tiers in the planner's order (cheapest expected time to a
+    complete inventory first, see strategy_planner.py) until one completes.
+    HTTP tiers at the front of the plan run in a worker thread; the browser
+    starts when they finish without a complete result, or hedges them once
+    they have gone hedge_after seconds without one. Whichever completes first
+    cancels the other. Chromium starts at the first page the cheaper tiers
+    could not read, so it is launched only when it has work to do. Anything
+    several tiers produced is returned together for dedup to merge.
+    """
+    site = site or DEFAULT_SITE
+    hedge_after = HEDGE_AFTER_S if hedge_after is None else hedge_after
+    plan = PLANNER.plan(site.dealer_id)
+    logger.info("Strategy plan: {}".format(PLANNER.describe(site.dealer_id, plan)))
+    run = PlanRun(site, crawl, context, warmup)
+    run.listing = listing
+    if any(s.name == 'browser_xhr' for s in plan):
+        run.xhr_hits = []
+
+    # Both browser tiers are one step, placed where the first of them ranks
+    steps, browser_seen = [], False
+    for s in plan:
+        if s.browser:
+            if browser_seen:
+                continue
+            browser_seen = True
+        steps.append(s)
+    lead = []
+    for s in steps:
+        if s.browser or hedge_after < 0:
+            break
+        lead.append(s)
+    rest = steps[len(lead):]
+
+    results = []
+    lead_done, lead_won, rest_won = threading.Event(), threading.Event(), threading.Event()
+
+    def run_lead():
+        try:
+            for s in lead:
+                if rest_won.is_set():
+                    break
+                vehicles, complete = attempt_strategy(s, run, rest_won)
+                results.append(vehicles)
+                if complete:
+                    lead_won.set()
+                    break
+        finally:
+            lead_done.set()
+
+    worker = None
+    if lead:
+        worker = threading.Thread(target=run_lead, name='http-strategies', daemon=True)
+        worker.start()
+        lead_done.wait(hedge_after)
+        if rest and not lead_done.is_set():
+            logger.info("HTTP tiers still running after {:.0f}s — hedging with {}".format(
+                hedge_after, rest[0].name))
+
+    for s in rest:
+        if lead_won.is_set():
+            break
+        vehicles, complete = attempt_strategy(s, run, lead_won)
+        results.append(vehicles)
+        if complete:
+            rest_won.set()
+            break
+
+    if worker is not None:
+        worker.join(5 if rest_won.is_set() else None)
+    if crawl:
+        # Tiers sharing the frontier each return every page done so far; read the union once
+        return crawl.vehicles()
+    return [v for vehicles in results for v in vehicles]
+
+
+def preflight(site, listing, crawl=None):
+    """
+    Incremental runs: fetch results page 1 over plain HTTP and compare it with the
+    listing snapshot. Returns the saved vehicles when the listing is unchanged,
+    else None; a changed page 1 goes into the crawl so no tier fetches it again.
+    """
+    static_warmup(site)
+    url = "{}?page=1".format(site.target)
+    try:
+        polite_wait(url)
+        with HTTP_SLOTS, site.metrics.span('static.request'):
+            resp = site.session.get(url, headers=STATIC_HEADERS, timeout=20)
+        site.metrics.count('http.requests')
+        site.metrics.count('http.bytes', len(resp.content))
+    except requests.RequestException as e:
+        logger.info("Preflight: page 1 failed ({}) — full scrape".format(e))
+        return None
+    if resp.status_code != 200:
+        logger.info("Preflight: page 1 HTTP {} — full scrape".format(resp.status_code))
+        return None
+    listing.total = incremental.listing_total(resp.text)
+    with site.metrics.span('parse.page'), PROFILER.stage('parse'):
+        page_vehicles = find_vehicles_in_html(resp.text)
+    saved = listing.unchanged(page_vehicles)
+    if saved is not None:
+        logger.info("Preflight: listing unchanged ({} cards on page 1, total {}) — reusing {} saved vehicles".format(
+            len(page_vehicles), listing.total, len(saved)))
+        return saved
+    logger.info("Preflight: listing changed or snapshot stale ({} cards on page 1, total {})".format(
+        len(page_vehicles), listing.total))
+    if crawl and page_vehicles:
+        crawl.record('html', 1, page_vehicles)
+    return None
+
+
+def run_scrape(context=None, warmup=True, site=None):
+    """
+    Planned strategy tiers (JSON, static HTML, browser), then dedup. Returns unique vehicles.
+    Work is tracked in the crawl frontier (TOYOTA_FRONTIER_DB): the crawl is closed
+    once JSON succeeds or every page is settled, otherwise the next run resumes it.
+    With TOYOTA_INCREMENTAL=on, a preflight request on page 1 can settle the run
+    from the listing snapshot, and the HTML tiers stop at the first unchanged page.
+    """
+    site = site or DEFAULT_SITE
+    site.artifacts.begin_run()
+    site.metrics.begin_run()
+    vehicles = []
+    crawl = None
+    if crawl_frontier.enabled():
+        try:
+            crawl = crawl_frontier.open_crawl(site.dealer_id, seed={'html': range(1, MAX_PAGES + 1)})
+        except Exception as e:
+            logger.warning("Crawl frontier unavailable, scraping without it: {}".format(e))
+    listing = saved = None
+    if incremental.enabled():
+        listing = incremental.IncrementalRun.load(site.dealer_id, max_pages=MAX_PAGES)
+        # Snapshots come from the HTML tiers; a dealer served by its JSON API never has one
+        if listing.previous:
+            with site.metrics.span('preflight'):
+                saved = preflight(site, listing, crawl)
+    try:
+        if saved is not None:
+            site.metrics.count('incremental.unchanged')
+            site.metrics.count('incremental.reused_pages', listing.reused)
+            vehicles = saved
+        else:
+            with site.metrics.span('strategies'):
+                vehicles = run_strategies_hedged(context, warmup=warmup, site=site, crawl=crawl, listing=listing)
+        if crawl and (saved is not None or crawl.vehicles('json') or crawl.vehicles('sitemap')
+                      or crawl.is_settled('html')):
+            crawl.finish()
+        elif crawl:
+            logger.info("Frontier: crawl {} left open for the next run ({})".format(crawl.id, crawl.summary()))
+        if listing and listing.save():
+            logger.info("Incremental: listing snapshot saved ({} pages)".format(len(listing.pages)))
+        site.metrics.count('vehicles.raw', len(vehicles))
+        with site.metrics.span('dedup'), PROFILER.stage('dedup'):
+            vehicles = dedup(vehicles)
+        if vdp_enrichment.enabled():
+            with site.metrics.span('enrich'):
+                vehicles = [v for v in enrich_from_vdps(vehicles, site) if is_valid(v)]
+        site.metrics.count('vehicles', len(vehicles))
+        logger.info("FINAL: {} unique vehicles".format(len(vehicles)))
+        return vehicles
+    finally:
+        site.artifacts.end_run(ok=bool(vehicles), vehicles=len(vehicles))
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if '--profile' in argv:
+        # --profile [cpu,cprofile,mem]; same as TOYOTA_PROFILE
+        i = argv.index('--profile')
+        PROFILER.set_modes(argv[i + 1] if i + 1 < len(argv) and not argv[i + 1].startswith('-') else 'cpu,mem')
+    PROFILER.start()
+    try:
+        return _main()
+    finally:
+        PROFILER.stop()
+
+
+def _main():
     logger.info("="*80)
     logger.info("RED DEER TOYOTA SCRAPER")
     logger.info("="*80)
-    vehicles = discover_and_scrape_json()
-    if not vehicles:
-        vehicles = scrape_html()
-    vehicles = dedup(vehicles)
-    logger.info("FINAL: {} unique vehicles".format(len(vehicles)))
+    vehicles = run_scrape()
     print_results(vehicles)
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    project_root = os.path.abspath(os.path.join(script_dir, '..', '..'))
-    csv_path = os.path.join(project_root, 'public', 'data', 'inventory.csv')
+    csv_path = default_csv_path()
     if vehicles:
-        save_csv(vehicles, csv_path)
+        publish(vehicles, csv_path)
         print("\nCSV created: {}".format(csv_path))
     else:
         print("\nNo vehicles found.")
         if os.path.exists(csv_path):
             os.remove(csv_path)
+    finish_run(vehicles)
     return 0 if vehicles else 1
 
 
@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+Vehicle detail page (VDP) enrichment with a per-stock cache (SQLite).
+
+Listing cards often leave out the engine, VIN, odometer or trim. After dedup,
+vehicles that are missing one of those and carry a detail_url get their VDP
+fetched, parsed and merged back in (blanks only; the card wins conflicts).
+Whatever a VDP yields is cached by (dealer, stock number), so each vehicle's
+detail page is fetched once during its stay on the lot rather than every run.
+
+Stable facts (VIN, engine, trim, model, odometer) are reused for as long as the
+stock number is listed. A price read from a VDP is only applied while it is
+younger than TOYOTA_ENRICH_PRICE_TTL; after that, a vehicle whose card still
+has no price gets its VDP fetched again. A failed fetch is retried after the
+same delay. Entries not seen for TOYOTA_ENRICH_FORGET_DAYS are dropped.
+
+  TOYOTA_ENRICH              off (default) | on
+  TOYOTA_ENRICH_DB           cache path (default ~/.local/share/red-deer-toyota/vdp_cache.sqlite,
+                             "off" fetches every run without caching)
+  TOYOTA_ENRICH_WORKERS      concurrent detail fetches per run (default 4, also bounded by TOYOTA_MAX_HTTP)
+  TOYOTA_ENRICH_MAX          detail fetches per run (default 60); the rest wait for the next run
+  TOYOTA_ENRICH_INTERVAL     minimum seconds between detail fetches to one host (default 0.5)
+  TOYOTA_ENRICH_PRICE_TTL    hours (default 24)
+  TOYOTA_ENRICH_FORGET_DAYS  days (default 30)
+
+  python3 src/script/vdp_enrichment.py stats [dealer]
+  python3 src/script/vdp_enrichment.py parse page.html
+"""
+
+import os, re, sys, json, time, sqlite3, logging
+
+from bs4 import BeautifulSoup
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB = os.path.join(os.path.expanduser("~"), ".local", "share", "red-deer-toyota",
+                          "vdp_cache.sqlite")
+ENRICH = os.environ.get("TOYOTA_ENRICH", "off").lower() in ("1", "on", "true", "yes")
+ENRICH_DB = os.environ.get("TOYOTA_ENRICH_DB", DEFAULT_DB)
+WORKERS = int(os.environ.get("TOYOTA_ENRICH_WORKERS", "4"))
+MAX_FETCHES = int(os.environ.get("TOYOTA_ENRICH_MAX", "60"))
+INTERVAL_S = float(os.environ.get("TOYOTA_ENRICH_INTERVAL", "0.5"))
+PRICE_TTL_S = float(os.environ.get("TOYOTA_ENRICH_PRICE_TTL", "24")) * 3600
+FORGET_S = float(os.environ.get("TOYOTA_ENRICH_FORGET_DAYS", "30")) * 86400
+
+# Fields a VDP is fetched for; prices alone never trigger a fetch
+WANTED_FIELDS = ['engine', 'mileage', 'trim', 'model', 'value']
+STABLE_FIELDS = ['vin', 'engine', 'trim', 'model', 'mileage']
+
+VIN_RE = re.compile(r'\b([A-HJ-NPR-Z0-9]{17})\b')
+ENGINE_RE = re.compile(r'(\d\.\d+\s*L[\w\s\-/]{0,30})', re.IGNORECASE)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS vdp (
+    dealer      TEXT NOT NULL,
+    key         TEXT NOT NULL,
+    url         TEXT,
+    fields      TEXT NOT NULL DEFAULT '{}',
+    status      TEXT NOT NULL,
+    fetched_at  REAL NOT NULL,
+    last_seen   REAL NOT NULL,
+    PRIMARY KEY (dealer, key)
+);
+CREATE INDEX IF NOT EXISTS vdp_last_seen ON vdp (last_seen);
+"""
+
+# Spec labels on detail pages -> our fields
+SPEC_LABELS = [
+    ('vin', ['vin', 'vehicle identification number']),
+    ('stock_number', ['stock', 'stock #', 'stock number', 'stock no']),
+    ('mileage', ['kilometres', 'kilometers', 'mileage', 'odometer', 'km']),
+    ('engine', ['engine', 'engine description', 'motor']),
+    ('trim', ['trim', 'trim level']),
+    ('model', ['model']),
+]
+
+
+def enabled():
+    return ENRICH
+
+
+def _get(v, field):
+    return str(v.get(field, '') or '').strip()
+
+
+def vehicle_key(v):
+    """Cache key: the stock number, or the detail URL for cards without one."""
+    stock = _get(v, 'stock_number').upper()
+    if stock:
+        return stock
+    url = _get(v, 'detail_url')
+    return 'url:' + url if url else None
+
+
+def needs_fields(v):
+    return any(not _get(v, f) for f in WANTED_FIELDS)
+
+
+def due(entry, now=None, needs_price=False):
+    """
+    Whether a vehicle with this cache entry (None = never fetched) should be fetched
+    now. A good entry is fetched again only for a vehicle whose card has no price,
+    once the entry's price is too old to apply.
+    """
+    if entry is None:
+        return True
+    now = time.time() if now is None else now
+    if entry['status'] != 'ok' or needs_price:
+        return now - entry['fetched_at'] > PRICE_TTL_S
+    return False
+
+
+def refetched(old, entry):
+    """
+    The entry to keep after fetching a vehicle again: a failed refetch of a good
+    entry keeps its stable facts (without the stale price) and waits out the TTL.
+    """
+    if entry['status'] == 'ok' or not old or old['status'] != 'ok':
+        return entry
+    fields = {f: old['fields'][f] for f in STABLE_FIELDS if old['fields'].get(f)}
+    return dict(old, fields=fields, fetched_at=entry['fetched_at'])
+
+
+def apply(v, entry, now=None):
+    """Fill v's blanks from a cached VDP entry. Returns the names of the fields filled."""
+    if not entry or entry['status'] != 'ok':
+        return []
+    now = time.time() if now is None else now
+    fields = entry['fields']
+    filled = []
+    for f in STABLE_FIELDS:
+        if not _get(v, f) and fields.get(f):
+            v[f] = fields[f]
+            filled.append(f)
+    if 'trim' in filled and not _get(v, 'sub-model'):
+        v['sub-model'] = v['trim']
+    price = fields.get('price')
+    if price and now - entry['fetched_at'] <= PRICE_TTL_S:
+        value = re.sub(r'[^\d]', '', _get(v, 'value'))
+        if not value:
+            v['value'], v['sale_value'] = str(price), ''
+            filled.append('value')
+        elif not _get(v, 'sale_value') and int(price) < int(value):
+            # Card shows one price, the VDP offer is lower: the card price is the regular one
+            v['sale_value'] = str(price)
+            filled.append('sale_value')
+    return filled
+
+
+class VdpCache:
+    def __init__(self, path):
+        self.path = None if not path or path.lower() == 'off' else path
+
+    @classmethod
+    def from_env(cls):
+        return cls(ENRICH_DB)
+
+    def connect(self):
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        return conn
+
+    def lookup(self, dealer, keys):
+        """{key: {'url', 'fields', 'status', 'fetched_at'}} for the keys that are cached."""
+        if not self.path or not keys:
+            return {}
+        out = {}
+        conn = self.connect()
+        try:
+            keys = list(keys)
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows = conn.execute(
+                    "SELECT key, url, fields, status, fetched_at FROM vdp WHERE dealer = ? AND key IN ({})"
+                    .format(",".join("?" * len(chunk))), [dealer] + chunk)
+                for key, url, fields, status, fetched_at in rows:
+                    out[key] = {'url': url, 'fields': json.loads(fields), 'status': status,
+                                'fetched_at': fetched_at}
+        finally:
+            conn.close()
+        return out
+
+    def store(self, dealer, results, seen_keys):
+        """Write fetch results {key: entry} and mark every key listed this run as seen, in one transaction."""
+        if not self.path:
+            return
+        now = time.time()
+        conn = self.connect()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO vdp (dealer, key, url, fields, status, fetched_at, last_seen)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(dealer, k, e['url'], json.dumps(e['fields'], sort_keys=True), e['status'],
+                      e['fetched_at'], now) for k, e in results.items()])
+                conn.executemany("UPDATE vdp SET last_seen = ? WHERE dealer = ? AND key = ?",
+                                 [(now, dealer, k) for k in seen_keys if k not in results])
+                gone = conn.execute("DELETE FROM vdp WHERE last_seen < ?", (now - FORGET_S,)).rowcount
+            if gone:
+                logger.info("VDP cache: forgot {} vehicles no longer listed".format(gone))
+        finally:
+            conn.close()
+
+    def stats(self, dealer=None):
+        if not self.path or not os.path.exists(self.path):
+            return []
+        conn = self.connect()
+        try:
+            sql = "SELECT dealer, status, COUNT(*), MIN(fetched_at), MAX(fetched_at) FROM vdp"
+            args = ()
+            if dealer:
+                sql += " WHERE dealer = ?"
+                args = (dealer,)
+            return conn.execute(sql + " GROUP BY dealer, status ORDER BY dealer, status", args).fetchall()
+        finally:
+            conn.close()
+
+
+# -----------------------------------------------------------------------
+# Detail page parsing
+# -----------------------------------------------------------------------
+
+def _ld_vehicle(data):
+    """The first Car/Vehicle/Product node in a decoded JSON-LD block (lists and @graph included)."""
+    nodes = data if isinstance(data, list) else [data]
+    for node in nodes:
+        if not isinstance(node, dict):
+            continue
+        if '@graph' in node:
+            found = _ld_vehicle(node['@graph'])
+            if found:
+                return found
+        kind = node.get('@type')
+        kinds = kind if isinstance(kind, list) else [kind]
+        if any(k in ('Car', 'Vehicle', 'Product', 'MotorVehicle') for k in kinds):
+            return node
+    return None
+
+
+def _name(value):
+    if isinstance(value, dict):
+        value = value.get('name') or value.get('value') or ''
+    return str(value or '').strip()
+
+
+def _digits(value):
+    return re.sub(r'[^\d]', '', _name(value))
+
+
+def parse_ld(node):
+    out = {}
+    vin = _name(node.get('vehicleIdentificationNumber')).upper()
+    if VIN_RE.fullmatch(vin):
+        out['vin'] = vin
+    km = _digits(node.get('mileageFromOdometer'))
+    if km and int(km) <= 500000:
+        out['mileage'] = km
+    engine = node.get('vehicleEngine')
+    if isinstance(engine, list):
+        engine = engine[0] if engine else ''
+    if _name(engine):
+        out['engine'] = _name(engine)
+    for field, key in [('model', 'model'), ('trim', 'vehicleConfiguration'), ('stock_number', 'sku')]:
+        if _name(node.get(key)):
+            out[field] = _name(node.get(key))
+    make = _name(node.get('brand') or node.get('manufacturer'))
+    if make:
+        out['make'] = make
+    year = _digits(node.get('vehicleModelDate') or node.get('modelDate') or node.get('productionDate'))[:4]
+    if re.fullmatch(r'(19[89]\d|20[0-2]\d)', year):
+        out['year'] = year
+    offers = node.get('offers')
+    if isinstance(offers, list):
+        offers = offers[0] if offers else None
+    if isinstance(offers, dict):
+        price = _digits(offers.get('price') or offers.get('lowPrice'))
+        if price and 3000 <= int(price) <= 300000:
+            out['price'] = int(price)
+    return out
+
+
+def _spec_pairs(soup):
+    """(label, value) pairs from dt/dd lists, two-cell table rows and "Label: value" list items."""
+    for dt in soup.find_all('dt'):
+        dd = dt.find_next_sibling('dd')
+        if dd is not None:
+            yield dt.get_text(' ', strip=True), dd.get_text(' ', strip=True)
+    for tr in soup.find_all('tr'):
+        cells = tr.find_all(['th', 'td'], recursive=False)
+        if len(cells) == 2:
+            yield cells[0].get_text(' ', strip=True), cells[1].get_text(' ', strip=True)
+    for li in soup.find_all('li'):
+        label, sep, value = li.get_text(' ', strip=True).partition(':')
+        if sep and len(label) <= 30:
+            yield label, value.strip()
+
+
+def parse_specs(soup):
+    out = {}
+    for label, value in _spec_pairs(soup):
+        label = label.strip().rstrip(':').strip().lower()
+        if not value:
+            continue
+        for field, names in SPEC_LABELS:
+            if field in out or label not in names:
+                continue
+            if field == 'vin':
+                m = VIN_RE.search(value.upper())
+                if m:
+                    out['vin'] = m.group(1)
+            elif field == 'mileage':
+                km = re.sub(r'[^\d]', '', value.split('km')[0])
+                if km and int(km) <= 500000:
+                    out['mileage'] = km
+            elif field == 'engine':
+                m = ENGINE_RE.search(value)
+                out['engine'] = (m.group(1) if m else value).strip()
+            else:
+                out[field] = value
+            break
+    return out
+
+
+def headline_text(soup):
+    """The page's title heading and first price block: the part of a VDP that reads like a listing card."""
+    parts = []
+    h1 = soup.find('h1')
+    if h1 is not None:
+        parts.append(h1.get_text(' ', strip=True))
+    price = soup.find(class_=re.compile(r'price', re.IGNORECASE))
+    if price is not None:
+        parts.append(price.get_text(' ', strip=True))
+    return ' '.join(parts)
+
+
+def parse_vdp(html):
+    """
+    Fields found on one detail page: JSON-LD first, then labelled spec rows.
+    Free text is not scanned, since "similar vehicles" strips would leak other cars' specs.
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    try:
+        return parse_vdp_soup(soup)
+    finally:
+        soup.decompose()
+
+
+def parse_vdp_soup(soup):
+    out = {}
+    for script in soup.find_all('script', type='application/ld+json'):
+        try:
+            node = _ld_vehicle(json.loads(script.string or ''))
+        except ValueError:
+            continue
+        if node:
+            out = parse_ld(node)
+            break
+    for field, value in parse_specs(soup).items():
+        out.setdefault(field, value)
+    return out
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['parse'] and len(argv) > 1:
+        with open(argv[1], encoding='utf-8', errors='replace') as f:
+            print(json.dumps(parse_vdp(f.read()), indent=2, sort_keys=True))
+        return 0
+    if argv[:1] == ['stats']:
+        print("{:<16} {:<8} {:>7}  {:<16} {}".format('dealer', 'status', 'entries', 'oldest fetch', 'newest fetch'))
+        for dealer, status, n, oldest, newest in VdpCache.from_env().stats(argv[1] if len(argv) > 1 else None):
+            print("{:<16} {:<8} {:>7}  {:<16} {}".format(
+                dealer, status, n, time.strftime('%Y-%m-%d %H:%M', time.localtime(oldest)),
+                time.strftime('%Y-%m-%d %H:%M', time.localtime(newest))))
+        return 0
+    print(__doc__.strip().splitlines()[-2].strip())
+    print(__doc__.strip().splitlines()[-1].strip())
+    return 2
+
+
+if __name__ == "__main__":
+    exit(main())
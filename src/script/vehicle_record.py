@@ -0,0 +1,200 @@
+"""
+Compact vehicle record.
+
+A Vehicle keeps the inventory fields in __slots__ instead of a ten-key dict.
+year, mileage, value and sale_value are ints (None when unknown), and the
+short vocabulary fields (make, model, trim, engine) are interned, so a lot
+full of Camrys holds one 'Camry' string. Code that needs numbers reads the
+attributes (v.value, v.mileage) and never re-parses text.
+
+Item access keeps the old dict shape for the CSV writer, the history store and
+anything else written against dicts: v['value'] is '34995' (or ''), assigning
+a string parses it, and get/keys/items/copy/update behave like the dict they
+replace. dict(v) gives the plain dict back (the crawl frontier stores that).
+Keys outside the known fields go to a small overflow dict.
+"""
+
+import re, sys
+
+# dict key -> slot, in the order the scraper has always written them
+KEYS = {
+    'makeName': 'make', 'year': 'year', 'model': 'model', 'sub-model': 'sub_model',
+    'trim': 'trim', 'mileage': 'mileage', 'value': 'value', 'sale_value': 'sale_value',
+    'stock_number': 'stock_number', 'engine': 'engine',
+}
+# Present only once set, like the keys the parsers add to some records
+OPTIONAL_KEYS = {'vin': 'vin', 'detail_url': 'detail_url'}
+INT_SLOTS = frozenset(['year', 'mileage', 'value', 'sale_value'])
+INTERNED_SLOTS = frozenset(['make', 'model', 'sub_model', 'trim', 'engine'])
+COMPLETENESS_SLOTS = ('stock_number', 'mileage', 'engine', 'trim', 'value', 'sale_value')
+
+_SLOT_OF = dict(KEYS, **OPTIONAL_KEYS)
+_NUMBER_RE = re.compile(r'^\d+(?:\.\d+)?$')
+
+
+def to_int(val):
+    """34995, '34,995', '$34,995.00', 34995.0 -> 34995; '' / None / no digits -> None."""
+    if val is None or isinstance(val, bool):
+        return None
+    if isinstance(val, int):
+        return val
+    if isinstance(val, float):
+        return int(val)
+    s = re.sub(r'[\s$,]', '', str(val))
+    if _NUMBER_RE.match(s):
+        return int(float(s)) if '.' in s else int(s)
+    digits = re.sub(r'[^\d]', '', s)
+    return int(digits) if digits else None
+
+
+def _text(val):
+    return '' if val is None else str(val).strip()
+
+
+class Vehicle:
+    __slots__ = ('make', 'year', 'model', 'sub_model', 'trim', 'mileage', 'value', 'sale_value',
+                 'stock_number', 'engine', 'vin', 'detail_url', 'extra')
+
+    def __init__(self):
+        self.make = self.model = self.sub_model = self.trim = self.stock_number = self.engine = ''
+        self.year = self.mileage = self.value = self.sale_value = None
+        self.vin = self.detail_url = None
+        self.extra = None
+
+    @classmethod
+    def from_dict(cls, d):
+        v = cls()
+        for k, val in d.items():
+            v[k] = val
+        return v
+
+    def set_text(self, slot, val):
+        val = _text(val)
+        setattr(self, slot, sys.intern(val) if slot in INTERNED_SLOTS and val else val)
+
+    # -- typed helpers ---------------------------------------------------------
+
+    def has(self, slot):
+        val = getattr(self, slot)
+        return val is not None and val != ''
+
+    def completeness(self):
+        return sum(1 for s in COMPLETENESS_SLOTS if self.has(s))
+
+    def fill_from(self, other):
+        """Copy other's values into this record's blank fields."""
+        for slot in Vehicle.__slots__[:-1]:
+            if not self.has(slot) and other.has(slot):
+                setattr(self, slot, getattr(other, slot))
+        if other.extra:
+            for k, val in other.extra.items():
+                if not _text(self.get(k)) and _text(val):
+                    self[k] = val
+
+    # -- dict interface --------------------------------------------------------
+
+    def __getitem__(self, key):
+        slot = _SLOT_OF.get(key)
+        if slot is None:
+            if self.extra is None:
+                raise KeyError(key)
+            return self.extra[key]
+        val = getattr(self, slot)
+        if val is None:
+            if key in OPTIONAL_KEYS:
+                raise KeyError(key)
+            return ''
+        return str(val) if slot in INT_SLOTS else val
+
+    def __setitem__(self, key, val):
+        slot = _SLOT_OF.get(key)
+        if slot is None:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = val
+        elif slot in INT_SLOTS:
+            setattr(self, slot, to_int(val))
+        elif key in OPTIONAL_KEYS:
+            setattr(self, slot, _text(val) or None)
+        else:
+            self.set_text(slot, val)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        slot = _SLOT_OF.get(key)
+        if slot is None:
+            del self.extra[key]
+        elif slot in INT_SLOTS or key in OPTIONAL_KEYS:
+            setattr(self, slot, None)
+        else:
+            setattr(self, slot, '')
+
+    def __contains__(self, key):
+        if key in KEYS:
+            return True
+        if key in OPTIONAL_KEYS:
+            return getattr(self, OPTIONAL_KEYS[key]) is not None
+        return bool(self.extra) and key in self.extra
+
+    def keys(self):
+        keys = list(KEYS)
+        keys.extend(k for k, slot in OPTIONAL_KEYS.items() if getattr(self, slot) is not None)
+        if self.extra:
+            keys.extend(self.extra)
+        return keys
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def values(self):
+        return [self[k] for k in self.keys()]
+
+    def items(self):
+        return [(k, self[k]) for k in self.keys()]
+
+    def update(self, other=(), **kw):
+        for k, val in (other.items() if hasattr(other, 'items') else other):
+            self[k] = val
+        for k, val in kw.items():
+            self[k] = val
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def copy(self):
+        v = Vehicle.__new__(Vehicle)
+        for slot in Vehicle.__slots__:
+            setattr(v, slot, getattr(self, slot))
+        if self.extra is not None:
+            v.extra = dict(self.extra)
+        return v
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __eq__(self, other):
+        if isinstance(other, (Vehicle, dict)):
+            return self.to_dict() == dict(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'Vehicle({!r})'.format(self.to_dict())
+
+
+def as_vehicle(v):
+    """v itself when it is already a Vehicle, else a Vehicle built from the dict."""
+    return v if isinstance(v, Vehicle) else Vehicle.from_dict(v)